@@ -0,0 +1,569 @@
+import argparse
+import asyncio
+import copy
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from engine import (
+    MODEL_LABELS,
+    apply_scores_to_message,
+    begin_rerun_memo,
+    get_blind_order_for_qid,
+    get_profile,
+    get_schema,
+    get_teacher_annotation_readonly,
+    is_question_scored,
+    preassign_blind_maps,
+    ranks_unique_in_scores,
+    responses_index,
+    schema_mismatch,
+    score_filled,
+    stage_status_table,
+    use_profile,
+    write_jsonl_atomic,
+)
+from history import append_entries, history_path, make_entry, schema_fp, teacher_scores
+from jsonl_io import append_quarantine, read_jsonl_tolerant, resolve_data_path
+
+
+# =========================
+# 全局配置
+# =========================
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_PAGE_SIZE = 50
+MAX_BATCH = 1000
+MAX_BODY_BYTES = 32 * 1024 * 1024
+KEEPALIVE_TIMEOUT = 30
+
+# 设置后所有请求需携带 Authorization: Bearer <token>
+API_TOKEN_ENV = "AGQ_API_TOKEN"
+
+# teacher_id 会拼进文件名，只允许字母数字、下划线和连字符
+TEACHER_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, errors: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.errors = errors or []
+
+
+# =========================
+# 数据文件（与界面共用同一批 data_*.jsonl）
+# =========================
+class AnnotationStore:
+    # 每个数据文件一把锁，读写都在锁内完成；解析、评分与序列化放到线程中执行，不阻塞事件循环。
+    # 文件被界面或其他工具改写后（mtime / 大小变化）自动重新加载
+    def __init__(self, data_dir: str = "."):
+        self.data_dir = data_dir
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._cache: Dict[str, Tuple[Tuple[int, int], List[Dict[str, Any]]]] = {}
+
+    def path_for(self, teacher_id: str) -> str:
+        return resolve_data_path(os.path.join(self.data_dir, get_profile()["data_file_template"].format(teacher_id=teacher_id)))
+
+    def lock_for(self, path: str) -> asyncio.Lock:
+        return self._locks.setdefault(path, asyncio.Lock())
+
+    @staticmethod
+    def _stamp(path: str) -> Tuple[int, int]:
+        st_ = os.stat(path)
+        return st_.st_mtime_ns, st_.st_size
+
+    def load(self, path: str, teacher_id: str) -> List[Dict[str, Any]]:
+        if not os.path.exists(path):
+            raise ApiError(404, f"未找到编号 {teacher_id} 对应的数据文件：{os.path.basename(path)}")
+
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == self._stamp(path):
+            return cached[1]
+
+        # 与界面一致：坏行先移入隔离文件再改写数据文件；首次加载时写入盲评顺序，保证接口与界面看到的 A/B/C 相同
+        data, bad = read_jsonl_tolerant(path)
+        if bad:
+            append_quarantine(path, bad)
+        if preassign_blind_maps(data, teacher_id) or bad:
+            write_jsonl_atomic(path, data)
+        self._cache[path] = (self._stamp(path), data)
+        return data
+
+    def save(self, path: str, data: List[Dict[str, Any]]):
+        write_jsonl_atomic(path, data)
+        self._cache[path] = (self._stamp(path), data)
+
+
+# =========================
+# 业务逻辑（在线程中执行，持有对应文件的锁）
+# =========================
+def question_view(message: Dict[str, Any], teacher_id: str, include_text: bool = True) -> Dict[str, Any]:
+    qid = message.get("q_id", "")
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=False)
+    rindex = responses_index(message)
+    scores = get_teacher_annotation_readonly(message, teacher_id).get("scores") or {}
+    statuses = stage_status_table(message, teacher_id, order)
+
+    responses = []
+    for label, rid in zip(MODEL_LABELS, order):
+        if not rid or rid not in rindex:
+            continue
+        status = statuses[rid]
+        r = {
+            "label": label,
+            "response_id": rid,
+            "scores": scores.get(rid, {}),
+            "failed_group": status["failed_group"],
+            "skip_groups": list(status["skip_groups"]),
+        }
+        if include_text:
+            r["text"] = rindex[rid].get("text", "")
+        responses.append(r)
+
+    # 评分来自其他评测配置时一律视为未完成，客户端据 schema_mismatch 提示迁移或重评
+    mismatch = schema_mismatch(message, teacher_id)
+    view = {
+        "q_id": qid,
+        "scored": not mismatch and is_question_scored(message, teacher_id),
+        "schema_mismatch": mismatch,
+        "responses": responses,
+    }
+    if include_text:
+        view["user_req"] = message.get("user_req", {})
+    return view
+
+
+def fetch_questions(data: List[Dict[str, Any]], teacher_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    q_ids = params.get("q_ids") or []
+    if not isinstance(q_ids, list) or not all(isinstance(q, str) for q in q_ids):
+        raise ApiError(400, "q_ids 必须是字符串数组")
+    include_text = bool(params.get("include_text", True))
+
+    if q_ids:
+        if len(q_ids) > MAX_BATCH:
+            raise ApiError(400, f"单次最多查询 {MAX_BATCH} 道题目")
+        by_qid = {item.get("q_id", ""): item for item in data}
+        missing = [q for q in q_ids if q not in by_qid]
+        items = [by_qid[q] for q in q_ids if q in by_qid]
+        return {
+            "questions": [question_view(it, teacher_id, include_text) for it in items],
+            "missing": missing,
+        }
+
+    offset = max(0, int(params.get("offset", 0)))
+    limit = max(1, min(int(params.get("limit", DEFAULT_PAGE_SIZE)), MAX_BATCH))
+    items = data
+    if params.get("unscored"):
+        items = [it for it in data if not is_question_scored(it, teacher_id)]
+    return {
+        "total": len(items),
+        "offset": offset,
+        "questions": [question_view(it, teacher_id, include_text) for it in items[offset:offset + limit]],
+    }
+
+
+def parse_entries(message: Dict[str, Any], teacher_id: str, scores: Any) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    # 校验一道题的提交内容，返回 (rid -> 分数 key/值, 错误列表)；回答可用 response_id 或盲评标签（模型 A/B/C）指定
+    if not isinstance(scores, dict) or not scores:
+        return {}, ["scores 必须是非空对象"]
+
+    qid = message.get("q_id", "")
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=False)
+    rindex = responses_index(message)
+    by_label = {lbl: rid for lbl, rid in zip(MODEL_LABELS, order) if rid and rid in rindex}
+    allowed_rids = set(by_label.values())
+
+    schema = get_schema()
+    subdim_opts = {}
+    comment_keys = set()
+    for g in schema["groups"]:
+        for sub in g["subdims"]:
+            subdim_opts[f"{g['name']}_{sub['name']}_score"] = sub.get("options", [0, 1, 2])
+        if g.get("need_comment", False):
+            comment_keys.add(f"{g['name']}_comment")
+    rank_key = f"{schema['rank']['name']}_score"
+    rank_opts = [str(o) for o in schema["rank"]["options"]]
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    errors: List[str] = []
+    for ref, values in scores.items():
+        rid = by_label.get(ref, ref)
+        if rid not in allowed_rids:
+            errors.append(f"{ref}：不是本题盲评顺序中的回答")
+            continue
+        if not isinstance(values, dict):
+            errors.append(f"{ref}：分数必须是对象")
+            continue
+
+        entry = {}
+        for key, v in values.items():
+            if key in subdim_opts:
+                # -1 由阶段规则自动写入，不接受直接提交
+                if isinstance(v, bool) or v in (-1, "-1") or not score_filled(v, subdim_opts[key]):
+                    errors.append(f"{ref}.{key}：取值无效（{v!r}）")
+                    continue
+            elif key in comment_keys:
+                if not isinstance(v, str):
+                    errors.append(f"{ref}.{key}：评语必须是字符串")
+                    continue
+            elif key == rank_key:
+                v = str(v)
+                if v not in rank_opts:
+                    errors.append(f"{ref}.{key}：排名须为 {rank_opts} 之一")
+                    continue
+            else:
+                errors.append(f"{ref}.{key}：未知的分数字段")
+                continue
+            entry[key] = v
+        entries[rid] = entry
+    return entries, errors
+
+
+def submit_scores(
+    store: AnnotationStore,
+    path: str,
+    data: List[Dict[str, Any]],
+    teacher_id: str,
+    items: List[Dict[str, Any]],
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    # 整批校验通过后才写回：先在副本上套用评分并检查排名，任一题失败则整批拒绝，文件保持不变
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, "items 必须是非空数组")
+    if len(items) > MAX_BATCH:
+        raise ApiError(400, f"单次最多提交 {MAX_BATCH} 道题目")
+
+    profile = get_profile()
+    qid_to_index = {item.get("q_id", f"id_{i}"): i for i, item in enumerate(data)}
+    staged: Dict[int, Dict[str, Any]] = {}
+    errors: List[Dict[str, Any]] = []
+
+    for item in items:
+        qid = item.get("q_id") if isinstance(item, dict) else None
+        idx = qid_to_index.get(qid)
+        if idx is None:
+            errors.append({"q_id": qid, "errors": ["未找到题目"]})
+            continue
+
+        # 只复制 annotations，回答文本等只读字段与原数据共享
+        work = staged.get(idx)
+        if work is None:
+            work = dict(data[idx])
+            work["annotations"] = copy.deepcopy(data[idx].get("annotations") or {})
+
+        entries, errs = parse_entries(work, teacher_id, item.get("scores"))
+        if not errs:
+            apply_scores_to_message(work, teacher_id, entries)
+            if profile["enforce_unique_ranks"] and not ranks_unique_in_scores(work, teacher_id):
+                errs.append("排名存在重复")
+        if errs:
+            errors.append({"q_id": qid, "errors": errs})
+            continue
+        staged[idx] = work
+
+    if errors:
+        raise ApiError(422, "提交内容校验失败，未写入任何评分", errors)
+
+    if not dry_run:
+        history = [
+            make_entry("api", work, teacher_id, teacher_scores(data[idx], teacher_id), schema_fp(data[idx], teacher_id))
+            for idx, work in staged.items()
+        ]
+        for idx, work in staged.items():
+            data[idx] = work
+        store.save(path, data)
+        append_entries(history_path(path), [e for e in history if e])
+
+    return {
+        "saved": 0 if dry_run else len(staged),
+        "dry_run": dry_run,
+        "results": [
+            {"q_id": work.get("q_id", ""), "scored": is_question_scored(work, teacher_id)}
+            for work in staged.values()
+        ],
+        "ts": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def progress_of(data: List[Dict[str, Any]], teacher_id: str, list_unscored: bool = False) -> Dict[str, Any]:
+    # 指纹不一致只比较一个字符串，先于逐字段的完成判定
+    mismatched = [schema_mismatch(it, teacher_id) for it in data]
+    unscored = [it.get("q_id", "") for it, m in zip(data, mismatched) if m or not is_question_scored(it, teacher_id)]
+    total = len(data)
+    done = total - len(unscored)
+    out = {
+        "teacher_id": teacher_id,
+        "total": total,
+        "done": done,
+        "rate": round(done / total, 4) if total else 0.0,
+        "schema_fp": get_profile()["fingerprint"],
+        "schema_mismatch": sum(mismatched),
+    }
+    if list_unscored:
+        out["unscored"] = unscored
+    return out
+
+
+# =========================
+# 路由
+# =========================
+def _teacher_id(raw: str) -> str:
+    if not TEACHER_ID_RE.match(raw or ""):
+        raise ApiError(400, f"非法的身份编号：{raw!r}")
+    return raw.upper()
+
+
+def _flag(v: Any) -> bool:
+    if isinstance(v, str):
+        return v.lower() not in ("", "0", "false", "no")
+    return bool(v)
+
+
+def _json(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+async def _with_data(store: AnnotationStore, teacher_id: str, fn, encode: bool = True):
+    # 取得文件锁后把加载、处理与序列化一起放进线程（线程继承当前评测配置）；
+    # 每个请求一份单次缓存，相当于界面的一次重跑
+    path = store.path_for(teacher_id)
+    async with store.lock_for(path):
+        def work():
+            begin_rerun_memo()
+            result = fn(path, store.load(path, teacher_id))
+            return _json({"ok": True, **result}) if encode else result
+
+        return await asyncio.to_thread(work)
+
+
+async def route(store: AnnotationStore, method: str, path: str, query: Dict[str, List[str]], body: Any) -> bytes:
+    parts = [p for p in path.split("/") if p]
+    params = {k: v[-1] for k, v in query.items()}
+
+    if parts == ["api", "health"]:
+        return _json({"ok": True, "profile": get_profile()["name"]})
+
+    # GET /api/progress?teacher_id=A&teacher_id=B
+    if parts == ["api", "progress"]:
+        if method != "GET":
+            raise ApiError(405, "仅支持 GET")
+        teacher_ids = [_teacher_id(t) for raw in query.get("teacher_id", []) for t in raw.split(",") if t]
+        if not teacher_ids:
+            raise ApiError(400, "缺少 teacher_id")
+        list_unscored = _flag(params.get("list_unscored", ""))
+        out = []
+        for tid in teacher_ids:
+            try:
+                out.append(await _with_data(store, tid, lambda p, data, tid=tid: progress_of(data, tid, list_unscored), encode=False))
+            except ApiError as e:
+                out.append({"teacher_id": tid, "error": e.message})
+        return _json({"ok": True, "teachers": out})
+
+    if len(parts) == 4 and parts[:2] == ["api", "teachers"]:
+        tid = _teacher_id(parts[2])
+
+        # GET /api/teachers/<tid>/questions?offset=&limit=&unscored=1&q_id=...
+        # POST 同一路径，参数放在 JSON 中（大批量 q_ids 时使用）
+        if parts[3] == "questions":
+            if method == "GET":
+                req = dict(params)
+                req["q_ids"] = [q for raw in query.get("q_id", []) for q in raw.split(",") if q]
+            elif method == "POST":
+                req = body if isinstance(body, dict) else {}
+            else:
+                raise ApiError(405, "仅支持 GET / POST")
+            try:
+                req["offset"] = int(req.get("offset", 0))
+                req["limit"] = int(req.get("limit", DEFAULT_PAGE_SIZE))
+            except (TypeError, ValueError):
+                raise ApiError(400, "offset / limit 必须是整数")
+            req["unscored"] = _flag(req.get("unscored", False))
+            req["include_text"] = _flag(req.get("include_text", True))
+            return await _with_data(store, tid, lambda p, data: fetch_questions(data, tid, req))
+
+        # POST /api/teachers/<tid>/scores  {"items": [{"q_id": ..., "scores": {rid 或 "模型 A": {...}}}], "dry_run": false}
+        if parts[3] == "scores":
+            if method != "POST":
+                raise ApiError(405, "仅支持 POST")
+            if not isinstance(body, dict):
+                raise ApiError(400, "请求体必须是 JSON 对象")
+            dry_run = _flag(body.get("dry_run", False))
+            return await _with_data(
+                store, tid, lambda p, data: submit_scores(store, p, data, tid, body.get("items"), dry_run)
+            )
+
+        # GET /api/teachers/<tid>/progress
+        if parts[3] == "progress":
+            list_unscored = _flag(params.get("list_unscored", ""))
+            return await _with_data(store, tid, lambda p, data: progress_of(data, tid, list_unscored))
+
+    raise ApiError(404, f"未知的接口：{method} {path}")
+
+
+# =========================
+# HTTP/1.1（keep-alive，每个连接一个协程）
+# =========================
+def _response(status: int, body: bytes, keep_alive: bool) -> bytes:
+    head = [
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+
+def _error_body(e: ApiError) -> bytes:
+    payload = {"ok": False, "error": e.message}
+    if e.errors:
+        payload["errors"] = e.errors
+    return _json(payload)
+
+
+async def handle_request(
+    store: AnnotationStore,
+    default_profile: Optional[str],
+    method: str,
+    target: str,
+    headers: Dict[str, str],
+    raw_body: bytes,
+) -> Tuple[int, bytes]:
+    try:
+        token = os.environ.get(API_TOKEN_ENV, "")
+        if token and headers.get("authorization", "") != f"Bearer {token}":
+            raise ApiError(401, "未授权")
+
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        body = None
+        if raw_body:
+            try:
+                body = json.loads(raw_body.decode("utf-8"))
+            except Exception as e:
+                raise ApiError(400, f"请求体不是合法 JSON：{str(e)}")
+
+        # 可按请求切换评测配置（?profile=<名称>），与界面的 URL 参数一致
+        profile_name = (query.get("profile") or [default_profile])[-1]
+        try:
+            get_profile(profile_name)
+        except KeyError as e:
+            raise ApiError(400, str(e.args[0]) if e.args else "未知的评测配置")
+        with use_profile(profile_name):
+            return 200, await route(store, method, url.path, query, body)
+    except ApiError as e:
+        return e.status, _error_body(e)
+    except Exception as e:
+        return 500, _error_body(ApiError(500, f"服务内部错误：{str(e)}"))
+
+
+async def handle_connection(store: AnnotationStore, default_profile: Optional[str], reader, writer):
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            if not line.strip():
+                break
+            try:
+                method, target, version = line.decode("latin-1").split()
+            except ValueError:
+                writer.write(_response(400, _error_body(ApiError(400, "请求行格式错误")), False))
+                break
+
+            headers: Dict[str, str] = {}
+            while True:
+                h = await reader.readline()
+                if h in (b"\r\n", b"\n", b""):
+                    break
+                k, _, v = h.decode("latin-1").partition(":")
+                headers[k.strip().lower()] = v.strip()
+
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            if "chunked" in headers.get("transfer-encoding", "").lower():
+                writer.write(_response(411, _error_body(ApiError(411, "请使用 Content-Length 发送请求体")), False))
+                break
+            # 长度无法解析时请求体的边界未知，回复 400 后关闭本连接（服务继续处理其他连接）
+            raw_length = headers.get("content-length") or "0"
+            try:
+                length = int(raw_length)
+            except ValueError:
+                length = -1
+            if length < 0:
+                writer.write(_response(400, _error_body(ApiError(400, f"Content-Length 无效：{raw_length}")), False))
+                break
+            if length > MAX_BODY_BYTES:
+                writer.write(_response(413, _error_body(ApiError(413, "请求体过大")), False))
+                break
+            raw_body = await reader.readexactly(length) if length else b""
+
+            status, body = await handle_request(store, default_profile, method.upper(), target, headers, raw_body)
+            writer.write(_response(status, body, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def serve(host: str, port: int, data_dir: str = ".", profile: Optional[str] = None, ready=None):
+    store = AnnotationStore(data_dir)
+    server = await asyncio.start_server(
+        lambda r, w: handle_connection(store, profile, r, w), host, port
+    )
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="评分数据的本地 REST/JSON 接口（批量查询题目、批量提交评分、查询进度）。")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data-dir", default=".", help="data_*.jsonl 所在目录")
+    parser.add_argument("--profile", default=None, help="评测配置名称（profiles.json，默认使用其默认配置）")
+    args = parser.parse_args(argv)
+
+    try:
+        name = get_profile(args.profile)["name"]
+    except Exception as e:
+        print(f"❌ 加载评测配置失败：{str(e)}", file=sys.stderr)
+        return 1
+
+    def ready(server):
+        print(f"✅ 接口已启动：http://{args.host}:{args.port}（评测配置 {name}，数据目录 {os.path.abspath(args.data_dir)}）", file=sys.stderr)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.data_dir, args.profile, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import argparse
+import sys
+from typing import List, Optional
+
+from engine import preassign_blind_maps, write_jsonl_atomic
+from merge_annotations import DATA_FILE_GLOB, find_data_files, iter_jsonl, teacher_id_from_path
+
+
+# =========================
+# 入库时批量预分配盲评顺序
+# =========================
+def assign_file(path: str, teacher_id: Optional[str] = None, dry_run: bool = False) -> int:
+    teacher_id = (teacher_id or teacher_id_from_path(path)).upper()
+    data = list(iter_jsonl(path))
+    changed = preassign_blind_maps(data, teacher_id)
+    if changed and not dry_run:
+        write_jsonl_atomic(path, data)
+    return changed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="为教师数据文件预先写入平衡拉丁方盲评顺序（blind_map）。")
+    parser.add_argument("inputs", nargs="*", help=f"输入文件（默认：当前目录下的 {DATA_FILE_GLOB}，含 .gz / .zst 压缩文件）")
+    parser.add_argument("--teacher-id", default=None, help="覆盖由文件名推断的教师编号（仅单文件时使用）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写回文件")
+    args = parser.parse_args(argv)
+
+    paths = args.inputs or find_data_files()
+    if not paths:
+        print("❌ 未找到任何教师数据文件。", file=sys.stderr)
+        return 1
+    if args.teacher_id and len(paths) > 1:
+        print("❌ --teacher-id 只能与单个输入文件一起使用。", file=sys.stderr)
+        return 1
+
+    for path in paths:
+        changed = assign_file(path, teacher_id=args.teacher_id, dry_run=args.dry_run)
+        print(f"✅ {path}: 新分配 {changed} 条盲评顺序")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
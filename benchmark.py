@@ -0,0 +1,381 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import streamlit as st
+
+import engine
+import jsonl_io
+from merge_annotations import teacher_id_from_path
+from synthetic_data import generate_file
+from validate_data import validate_file
+
+
+# =========================
+# 全局配置
+# =========================
+DEFAULT_REPEAT = 3
+APPLY_SAMPLE = 2000
+
+# 基准测试在 bare 模式下调用 Streamlit，屏蔽“缺少 ScriptRunContext”之类的告警
+for _name in list(logging.root.manager.loggerDict):
+    if _name.startswith("streamlit"):
+        logging.getLogger(_name).setLevel(logging.ERROR)
+
+
+# =========================
+# 基准项
+# =========================
+# 每个基准项接收上下文，返回 (待计时的无参函数, 处理的条目数)
+BENCHMARKS: Dict[str, Callable[[Dict[str, Any]], Tuple[Callable[[], Any], int]]] = {}
+
+
+def benchmark(name: str):
+    def deco(fn):
+        BENCHMARKS[name] = fn
+        return fn
+
+    return deco
+
+
+@benchmark("read_jsonl_cold")
+def bench_read_cold(ctx):
+    path = ctx["path"]
+    mtime = engine.get_file_mtime(path)
+    return (lambda: engine.read_jsonl_cached.__wrapped__(path, mtime)), len(ctx["items"])
+
+
+# 并行分块解析（至少 2 个进程；单核机器上体现的是进程池的额外开销）。
+# 回传整块题目时父进程反序列化的耗时约为 json.loads 的 70%，加速上限有限；
+# 在子进程内归约（只回传条数 / 校验问题）时才能随核数加速，与对应的单进程项对比
+def count_chunk(items, linenos):
+    return len(items)
+
+
+@benchmark("read_jsonl_parallel")
+def bench_read_parallel(ctx):
+    path = ctx["path"]
+    workers = max(2, os.cpu_count() or 1)
+    return (lambda: jsonl_io.read_jsonl_parallel(path, workers=workers)), len(ctx["items"])
+
+
+@benchmark("count_jsonl_parallel")
+def bench_count_parallel(ctx):
+    path = ctx["path"]
+    workers = max(2, os.cpu_count() or 1)
+    return (lambda: sum(n for n, _, _ in jsonl_io.map_jsonl_chunks(path, count_chunk, workers=workers))), len(ctx["items"])
+
+
+@benchmark("validate_file")
+def bench_validate(ctx):
+    path = ctx["path"]
+    return (lambda: validate_file(path, workers=1)), len(ctx["items"])
+
+
+@benchmark("validate_file_parallel")
+def bench_validate_parallel(ctx):
+    path = ctx["path"]
+    workers = max(2, os.cpu_count() or 1)
+    return (lambda: validate_file(path, workers=workers)), len(ctx["items"])
+
+
+@benchmark("read_jsonl_cached")
+def bench_read_cached(ctx):
+    path = ctx["path"]
+    mtime = engine.get_file_mtime(path)
+    engine.read_jsonl_cached(path, mtime)
+    return (lambda: engine.read_jsonl_cached(path, mtime)), len(ctx["items"])
+
+
+@benchmark("write_jsonl_atomic")
+def bench_write(ctx):
+    out = os.path.join(ctx["tmp_dir"], "bench_write.jsonl")
+    items = ctx["items"]
+    return (lambda: engine.write_jsonl_atomic(out, items)), len(items)
+
+
+# 压缩数据文件：与未压缩的 read_jsonl_cold / write_jsonl_atomic 对比加载与保存耗时；
+# 未安装 zstandard 时不注册 .zst 项
+def _compressed_copy(ctx, suffix: str) -> str:
+    path = os.path.join(ctx["tmp_dir"], "bench_read.jsonl" + suffix)
+    if not os.path.exists(path):
+        engine.write_jsonl_atomic(path, ctx["items"])
+        ctx["compressed_bytes"][suffix] = os.path.getsize(path)
+    return path
+
+
+def bench_read_compressed(ctx, suffix: str):
+    path = _compressed_copy(ctx, suffix)
+    mtime = engine.get_file_mtime(path)
+    return (lambda: engine.read_jsonl_cached.__wrapped__(path, mtime)), len(ctx["items"])
+
+
+def bench_write_compressed(ctx, suffix: str):
+    out = os.path.join(ctx["tmp_dir"], "bench_write.jsonl" + suffix)
+    items = ctx["items"]
+    return (lambda: engine.write_jsonl_atomic(out, items)), len(items)
+
+
+for _suffix, _kind in jsonl_io.COMPRESSION_SUFFIXES.items():
+    if _kind == "zstd" and jsonl_io.zstandard is None:
+        continue
+    benchmark(f"read_jsonl_cold_{_suffix[1:]}")(lambda ctx, suffix=_suffix: bench_read_compressed(ctx, suffix))
+    benchmark(f"write_jsonl_atomic_{_suffix[1:]}")(lambda ctx, suffix=_suffix: bench_write_compressed(ctx, suffix))
+
+
+@benchmark("is_question_scored_all")
+def bench_is_scored(ctx):
+    items = ctx["items"]
+    teacher_id = ctx["teacher_id"]
+
+    def run():
+        # 与应用内一次重跑一致：先重置单次重跑缓存
+        engine.begin_rerun_memo()
+        return sum(1 for it in items if engine.is_question_scored(it, teacher_id))
+
+    return run, len(items)
+
+
+@benchmark("build_work_queues")
+def bench_work_queues(ctx):
+    items = ctx["items"]
+    teacher_id = ctx["teacher_id"]
+
+    def run():
+        engine.begin_rerun_memo()
+        return engine.build_work_queues(items, teacher_id)
+
+    return run, len(items)
+
+
+@benchmark("split_qa")
+def bench_split_qa(ctx):
+    texts = ctx["texts"]
+    return (lambda: [engine.split_qa(t) for t in texts]), len(texts)
+
+
+@benchmark("latex_to_markdown")
+def bench_latex(ctx):
+    sections = [s for t in ctx["texts"] for s in engine.split_qa(t).values() if s]
+    return (lambda: [engine.latex_to_markdown(s) for s in sections]), len(sections)
+
+
+@benchmark("subdim_expected_scalar")
+def bench_expected_scalar(ctx):
+    from score_codec import subdim_columns
+
+    columns = subdim_columns()
+    rows = [ms for it in ctx["items"] for t in (it.get("annotations") or {}).values() for ms in (t.get("scores") or {}).values()]
+
+    def run():
+        return [
+            engine.subdim_expected(ms.get(key), opts) if ms.get(key) not in (None, "", -1, "-1") else None
+            for ms in rows
+            for key, opts in columns
+        ]
+
+    return run, len(rows)
+
+
+@benchmark("subdim_expected_array")
+def bench_expected_array(ctx):
+    from score_codec import expected_matrix
+
+    items = ctx["items"]
+    n_rows = sum(len(t.get("scores") or {}) for it in items for t in (it.get("annotations") or {}).values())
+    return (lambda: expected_matrix(items)), n_rows
+
+
+@benchmark("apply_scoring_form_to_message")
+def bench_apply(ctx):
+    teacher_id = ctx["teacher_id"]
+    sample = ctx["items"][:APPLY_SAMPLE]
+    st.session_state.teacher_id = teacher_id
+
+    # 按已有分数填充控件 key，模拟提交表单时的会话状态
+    for it in sample:
+        qid = it.get("q_id", "")
+        scores = engine.get_teacher_annotation_readonly(it, teacher_id).get("scores") or {}
+        for rid in engine.responses_index(it):
+            ms = scores.get(rid, {})
+            for group in engine.get_schema()["groups"]:
+                gname = group["name"]
+                for sub in group["subdims"]:
+                    opts = sub.get("options", [0, 1, 2])
+                    wkey = f"{qid}_{engine.safe_key(gname)}_{engine.safe_key(sub['name'])}_{rid}"
+                    prev = ms.get(f"{gname}_{sub['name']}_score", "")
+                    st.session_state[f"{wkey}_mean"] = engine.expected_from_prev(prev if prev not in (-1, "-1") else "", opts)
+
+    def run():
+        for it in sample:
+            engine.apply_scoring_form_to_message(it)
+
+    return run, len(sample)
+
+
+@benchmark("search_index_build")
+def bench_search_build(ctx):
+    from search_index import build_index
+
+    items = ctx["items"]
+    return (lambda: build_index(items)), len(items)
+
+
+@benchmark("search_query")
+def bench_search_query(ctx):
+    from search_index import build_index, search
+
+    items = ctx["items"]
+    index = build_index(items)
+    queries = ["单选题", "type:填空题", "化学 反应", "氧化还原", "约束:难度"]
+
+    def run():
+        # 每次清空结果缓存，计的是实际查询耗时
+        for q in queries:
+            index["results"].clear()
+            search(index, items, q)
+
+    return run, len(queries)
+
+
+# =========================
+# 运行 / 对比
+# =========================
+def _git_rev() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        return out.stdout.strip()
+    except Exception:
+        return ""
+
+
+def run_benchmarks(path: str, repeat: int = DEFAULT_REPEAT, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    items, _ = engine.read_jsonl_cached.__wrapped__(path, engine.get_file_mtime(path))
+    teacher_id = teacher_id_from_path(path).upper()
+    texts = [r.get("text", "") for it in items for r in (it.get("responses") or [])]
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="agq_bench_") as tmp_dir:
+        ctx = {
+            "path": path,
+            "items": items,
+            "teacher_id": teacher_id,
+            "texts": texts,
+            "tmp_dir": tmp_dir,
+            "compressed_bytes": {},
+        }
+        for name, make in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            fn, n_items = make(ctx)
+            runs = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn()
+                runs.append(time.perf_counter() - t0)
+            best = min(runs)
+            results.append({
+                "name": name,
+                "items": n_items,
+                "repeat": repeat,
+                "best_s": round(best, 6),
+                "median_s": round(statistics.median(runs), 6),
+                "per_item_us": round(best / n_items * 1e6, 3) if n_items else None,
+            })
+            print(f"  {name:<32}{best * 1000:>12.2f} ms  ({n_items} items)", file=sys.stderr)
+
+    return {
+        "meta": {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "data_file": os.path.basename(path),
+            "data_bytes": os.path.getsize(path),
+            "compressed_bytes": ctx["compressed_bytes"],
+            "questions": len(items),
+        },
+        "results": results,
+    }
+
+
+def compare_results(base: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    base_by_name = {r["name"]: r for r in base["results"]}
+    out = []
+    for r in new["results"]:
+        b = base_by_name.get(r["name"])
+        if not b:
+            continue
+        ratio = r["best_s"] / b["best_s"] if b["best_s"] else None
+        out.append({"name": r["name"], "base_s": b["best_s"], "new_s": r["best_s"], "ratio": ratio})
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="评分系统核心函数基准测试。")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="运行基准测试")
+    p_run.add_argument("--data", default="", help="已有的 data_*.jsonl；不指定则生成合成数据")
+    p_run.add_argument("-n", "--questions", type=int, default=10000, help="合成数据的题目数")
+    p_run.add_argument("--seed", type=int, default=0)
+    p_run.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    p_run.add_argument("--profile", default=None, help="评测配置名称（profiles.json，默认使用其默认配置）")
+    p_run.add_argument("--only", nargs="*", default=None, choices=sorted(BENCHMARKS), help="只运行指定基准项")
+    p_run.add_argument("-o", "--out", default="", help="结果 JSON 输出路径（默认打印到标准输出）")
+
+    p_cmp = sub.add_parser("compare", help="对比两次运行结果")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("new")
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "compare":
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, "r", encoding="utf-8") as f:
+            new = json.load(f)
+        print(f"{'benchmark':<32}{'base(ms)':>12}{'new(ms)':>12}{'ratio':>10}")
+        for r in compare_results(base, new):
+            ratio = f"{r['ratio']:.2f}x" if r["ratio"] is not None else "-"
+            print(f"{r['name']:<32}{r['base_s'] * 1000:>12.2f}{r['new_s'] * 1000:>12.2f}{ratio:>10}")
+        return 0
+
+    with engine.use_profile(args.profile), tempfile.TemporaryDirectory(prefix="agq_bench_data_") as data_dir:
+        path = args.data
+        if not path:
+            path = os.path.join(data_dir, "data_BENCH.jsonl")
+            print(f"⏳ 生成 {args.questions} 道合成题目 ...", file=sys.stderr)
+            generate_file(path, args.questions, "BENCH", seed=args.seed)
+
+        print(f"⏳ 基准测试：{path}", file=sys.stderr)
+        report = run_benchmarks(path, repeat=args.repeat, only=args.only)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"✅ 结果已写入 {args.out}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import atexit
+import copy
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+
+# =========================
+# 全局配置
+# =========================
+# 草稿与数据文件放在一起：data_T001.jsonl -> data_T001.jsonl.drafts.json
+DRAFT_FILE_SUFFIX = ".drafts.json"
+FLUSH_TIMEOUT = 5.0
+
+
+def draft_path(data_path: str) -> str:
+    return data_path + DRAFT_FILE_SUFFIX
+
+
+def load_drafts(path: str) -> Dict[str, Any]:
+    # 文件内容为 {q_id: {"ts", "values": {控件 key: 值}}}；缺失或损坏时视为没有草稿
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            drafts = json.load(f)
+    except Exception:
+        return {}
+    return drafts if isinstance(drafts, dict) else {}
+
+
+def write_drafts_atomic(path: str, drafts: Dict[str, Any]):
+    if not drafts:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(drafts, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# =========================
+# 后台写入
+# =========================
+class DraftWriter:
+    # 重跑线程只登记最新快照（加锁后 O(1) 返回，不做文件 I/O），由后台线程合并写盘；
+    # 同一文件在一次写入前的多次登记合并为一次写入
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._drafts: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+        self._writing = False
+        self.last_error: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="agq-draft-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _loaded(self, path: str) -> Dict[str, Any]:
+        if path not in self._drafts:
+            self._drafts[path] = load_drafts(path)
+        return self._drafts[path]
+
+    def load(self, path: str) -> Dict[str, Any]:
+        # 返回磁盘内容叠加尚未写出的登记（副本）
+        with self._lock:
+            drafts = dict(self._loaded(path))
+            for qid, draft in self._pending.get(path, {}).items():
+                if draft is None:
+                    drafts.pop(qid, None)
+                else:
+                    drafts[qid] = draft
+            return copy.deepcopy(drafts)
+
+    def put(self, path: str, qid: str, draft: Optional[Dict[str, Any]]):
+        # draft 为 None 表示丢弃该题草稿
+        with self._lock:
+            self._pending.setdefault(path, {})[qid] = draft
+            self._wake.notify_all()
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT) -> bool:
+        with self._lock:
+            return self._wake.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wake.wait_for(lambda: self._pending)
+                batch, self._pending = self._pending, {}
+                self._writing = True
+                # 合并到内存副本；没有实际变化的文件不写
+                changed = {}
+                for path, updates in batch.items():
+                    drafts = self._loaded(path)
+                    dirty = False
+                    for qid, draft in updates.items():
+                        if draft is None:
+                            dirty |= drafts.pop(qid, None) is not None
+                        else:
+                            drafts[qid] = draft
+                            dirty = True
+                    if dirty:
+                        changed[path] = copy.deepcopy(drafts)
+
+            error = None
+            for path, drafts in changed.items():
+                try:
+                    write_drafts_atomic(path, drafts)
+                except Exception as e:
+                    error = f"{path}: {str(e)}"
+
+            with self._lock:
+                self.last_error = error
+                self._writing = False
+                self._wake.notify_all()
@@ -0,0 +1,2376 @@
+import streamlit as st
+import contextvars
+import json
+import re
+from datetime import datetime
+import base64
+import random
+import hashlib
+import os
+import threading
+from array import array
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from instrumentation import (
+    begin_rerun,
+    enabled_by_env,
+    end_rerun,
+    metrics_log_path,
+    span,
+    summarize_spans,
+    timed,
+)
+from drafts import DraftWriter, draft_path
+from history import append_entries, history_path, make_entry, schema_fp, scores_snapshot, undo_last, undo_target
+from jsonl_io import append_quarantine, compression_of, open_text, read_jsonl_parallel, resolve_data_path
+from schemas import SCHEMA_FP_FIELD, SCHEMAS, annotation_fingerprint, schema_fingerprint
+from search_index import build_index, content_signature, search
+
+
+# =========================
+# 全局配置
+# =========================
+MODEL_LABELS = ["模型 A", "模型 B", "模型 C"]
+PANEL_HEIGHT = 720
+
+PROB_STEP = 0.05
+PROB_TOL = 1e-6
+PROB_ROUND = 2
+
+# 二级维度分数的存储形式：probs 概率字典（默认，兼容旧数据）；array 按选项升序的概率数组；
+# mean 仅存期望分（mean_to_probs 可确定性还原）。读取时三种形式均可识别，按需解码
+SCORE_ENCODINGS = ["probs", "array", "mean"]
+
+DATA_FILE_TEMPLATE = "data_{teacher_id}.jsonl"
+USER_QUESTION_FIELD = "user_designed_question"
+
+# precheck.py 写入每个回答的规则预检结果：{"version", "suggestions": {分数 key: {"value", "evidence"}}}
+PRECHECK_FIELD = "precheck"
+
+# 会话状态中最多保留多少道题目的控件值（未保存的题目不会被清理）
+SESSION_QID_CAPACITY = 8
+SESSION_VISITED_KEY = "_visited_qids"
+SESSION_DIRTY_KEY = "_dirty_qids"
+
+# 工作队列（按教师增量维护，见 build_work_queues）
+SESSION_QUEUES_KEY = "_work_queues"
+QUEUE_SESSION_KEY = "_work_queue"
+QUEUE_ALL = "all"
+
+# 未保存评分的草稿（与数据文件放在一起，见 drafts.py）
+SESSION_DRAFTS_KEY = "_drafts"
+SESSION_DRAFTS_PATH_KEY = "_drafts_path"
+
+# 侧边栏跳转列表：每次重跑只向浏览器发送一页题目 ID
+JUMP_PAGE_SIZE = 20
+JUMP_PAGE_KEY = "_jump_page"
+JUMP_QUERY_KEY = "_jump_query"
+
+# 性能调试（可通过环境变量 AGQ_PROFILE=1 或侧边栏开关启用）
+PROFILE_SESSION_KEY = "_profile_enabled"
+LAST_RERUN_TIMING_KEY = "_last_rerun_timing"
+
+# 评测配置（原 app*.py 各变体），一个服务可按 ?profile=<名称> 同时承载全部变体
+PROFILES_ENV = "AGQ_PROFILES"
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles.json")
+PROFILE_QUERY_PARAM = "profile"
+
+# 阶段失败规则见 STAGE_RULES：any_subdim_zero 任一二级维度为 0；group_total_zero 一级维度总分为 0；none 不分阶段
+STAGE_ORDINALS = ["第一", "第二", "第三", "第四", "第五", "第六"]
+AUTO_SKIP_COMMENT = "阶段跳过，记为-1"
+
+
+# =========================
+# 评测配置（profile）
+# =========================
+_active_profile: contextvars.ContextVar = contextvars.ContextVar("agq_active_profile", default=None)
+_profiles_cache: Dict[str, Any] = {}
+
+
+def profiles_path() -> str:
+    return os.environ.get(PROFILES_ENV, "") or PROFILES_FILE
+
+
+def _resolve_profile_config(name: str, raw: Dict[str, Any], seen: tuple = ()) -> Dict[str, Any]:
+    if name not in raw:
+        raise KeyError(f"未知的评测配置：{name}")
+    if name in seen:
+        raise ValueError(f"评测配置存在循环继承：{' → '.join(seen + (name,))}")
+
+    cfg = dict(raw[name])
+    parent = cfg.pop("extends", None)
+    if parent:
+        merged = _resolve_profile_config(parent, raw, seen + (name,))
+        merged.update(cfg)
+        cfg = merged
+    return cfg
+
+
+def build_profile(name: str, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    schema_name = cfg.get("schema", "staged")
+    base = SCHEMAS.get(schema_name)
+    if base is None:
+        raise ValueError(f"评测配置 {name} 引用了未知的 SCHEMA：{schema_name}")
+
+    by_name = {g["name"]: g for g in base["groups"]}
+    order = cfg.get("group_order") or list(by_name)
+    if sorted(order) != sorted(by_name):
+        raise ValueError(f"评测配置 {name} 的 group_order 与 SCHEMA {schema_name} 的维度不一致")
+
+    group_desc = cfg.get("group_desc") or {}
+    groups = [dict(by_name[gname], desc=group_desc.get(gname, by_name[gname].get("desc", ""))) for gname in order]
+
+    score_encoding = cfg.get("score_encoding", "probs")
+    if score_encoding not in SCORE_ENCODINGS:
+        raise ValueError(f"评测配置 {name} 的 score_encoding 无效：{score_encoding}")
+
+    stage_rule = cfg.get("stage_rule", "none")
+    if stage_rule not in STAGE_RULES:
+        raise ValueError(f"评测配置 {name} 的 stage_rule 无效：{stage_rule}")
+
+    stages = []
+    if stage_rule != "none":
+        for stage in cfg.get("stages") or []:
+            names = [stage["group"]] + list(stage.get("skip_groups") or [])
+            unknown = [n for n in names if n not in by_name]
+            if unknown:
+                raise ValueError(f"评测配置 {name} 的阶段引用了未知维度：{unknown}")
+            stages.append({"group": stage["group"], "skip_groups": list(stage.get("skip_groups") or [])})
+
+    return {
+        "name": name,
+        "title": cfg.get("title", "题目评测系统"),
+        "subject": cfg.get("subject", ""),
+        "schema": {"groups": groups, "rank": dict(base["rank"])},
+        "stage_rule": stage_rule,
+        "stages": stages,
+        "compiled_stages": compile_stages(stage_rule, stages, groups),
+        "fingerprint": schema_fingerprint(groups, base["rank"], stage_rule, stages),
+        "enforce_unique_ranks": bool(cfg.get("enforce_unique_ranks", True)),
+        "bordered_panels": bool(cfg.get("bordered_panels", False)),
+        "require_scored_to_navigate": bool(cfg.get("require_scored_to_navigate", False)),
+        "score_encoding": score_encoding,
+        "data_file_template": cfg.get("data_file_template", DATA_FILE_TEMPLATE),
+    }
+
+
+def load_profiles(path: Optional[str] = None) -> Dict[str, Any]:
+    # 按文件修改时间缓存；profiles.json 改动后下一次重跑即生效
+    path = path or profiles_path()
+    mtime = get_file_mtime(path)
+    cached = _profiles_cache.get(path)
+    if cached is not None and cached["mtime"] == mtime:
+        return cached
+
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    raw_profiles = raw.get("profiles") or {}
+    profiles = {name: build_profile(name, _resolve_profile_config(name, raw_profiles)) for name in raw_profiles}
+    if not profiles:
+        raise ValueError(f"评测配置文件中没有任何配置：{path}")
+
+    default = raw.get("default") or next(iter(profiles))
+    if default not in profiles:
+        raise KeyError(f"默认评测配置不存在：{default}")
+
+    loaded = {"mtime": mtime, "default": default, "profiles": profiles}
+    _profiles_cache[path] = loaded
+    return loaded
+
+
+def get_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    if name is None:
+        active = _active_profile.get()
+        if active is not None:
+            return active
+
+    loaded = load_profiles()
+    name = name or loaded["default"]
+    if name not in loaded["profiles"]:
+        raise KeyError(f"未知的评测配置：{name}")
+    return loaded["profiles"][name]
+
+
+def profiles_by_fingerprint() -> Dict[str, List[str]]:
+    # SCHEMA 指纹 -> 使用该 SCHEMA 的评测配置名（如 app / appc1 / appm1 / appp1 共用一个指纹）
+    out: Dict[str, List[str]] = {}
+    for name, profile in load_profiles()["profiles"].items():
+        out.setdefault(profile["fingerprint"], []).append(name)
+    return out
+
+
+def describe_fingerprint(fp: str) -> str:
+    names = profiles_by_fingerprint().get(fp)
+    return f"{fp}（{' / '.join(names)}）" if names else f"{fp}（未知配置）"
+
+
+def set_active_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    profile = get_profile(name)
+    _active_profile.set(profile)
+    return profile
+
+
+@contextmanager
+def use_profile(name: Optional[str] = None):
+    # 供离线工具临时切换评测配置
+    token = _active_profile.set(get_profile(name))
+    try:
+        yield _active_profile.get()
+    finally:
+        _active_profile.reset(token)
+
+
+def get_schema() -> Dict[str, Any]:
+    return get_profile()["schema"]
+
+
+# =========================
+# 通用工具
+# =========================
+def safe_key(s: str) -> str:
+    return re.sub(r"[^0-9a-zA-Z\u4e00-\u9fff]+", "_", str(s))
+
+
+def format_inline_value(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, list):
+        return "、".join([str(x) for x in v])
+    if isinstance(v, dict):
+        return json.dumps(v, ensure_ascii=False)
+    return str(v)
+
+
+def get_file_mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except Exception:
+        return 0.0
+
+
+@st.cache_data(show_spinner=False)
+def read_jsonl_cached(path: str, mtime: float) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # 返回 (题目列表, 坏行列表)：单行损坏（如进程崩溃留下的半行）不再导致整个文件无法打开，
+    # 坏行由 main 移入隔离文件。单进程按 8MB 分块流式解析（回传整块题目时进程池没有收益，见 jsonl_io.parallel_workers）；.jsonl.gz / .jsonl.zst 边解压边逐行解析
+    return read_jsonl_parallel(path)
+
+
+@st.cache_resource(show_spinner=False)
+def _search_index_registry() -> Dict[str, Any]:
+    # 各会话共享：path -> {"mtime", "index"}；索引只读，构建时加锁避免重复构建
+    return {"lock": threading.Lock(), "entries": {}}
+
+
+def get_search_index(path: str, mtime: float, data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # 按文件修改时间缓存；文件变化后先比较内容签名，仅保存评分（题干与回答不变）时直接复用旧索引
+    registry = _search_index_registry()
+    entry = registry["entries"].get(path)
+    if entry is not None and entry["mtime"] == mtime:
+        return entry["index"]
+
+    with registry["lock"]:
+        entry = registry["entries"].get(path)
+        if entry is not None and entry["mtime"] == mtime:
+            return entry["index"]
+        signature = content_signature(data)
+        if entry is not None and entry["index"]["signature"] == signature:
+            index = entry["index"]
+        else:
+            index = build_index(data, signature)
+        registry["entries"][path] = {"mtime": mtime, "index": index}
+        return index
+
+
+def write_jsonl_atomic(path: str, items: List[Dict[str, Any]]):
+    dir_name = os.path.dirname(path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+
+    # 压缩格式由目标文件后缀决定，边序列化边压缩写入临时文件
+    tmp = path + ".tmp"
+    with open_text(tmp, "w", compression=compression_of(path)) as f:
+        for it in items:
+            f.write(json.dumps(it, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+def build_grid(minv: float, maxv: float, step: float):
+    n = int(round((maxv - minv) / step))
+    return [round(minv + i * step, PROB_ROUND) for i in range(n + 1)]
+
+
+LATEX_SPLIT_RE = re.compile(r"(\$\$.*?\$\$|\$.*?\$)", re.DOTALL)
+
+
+def latex_to_markdown(text: str) -> str:
+    if not text:
+        return ""
+    t = text.replace("\r\n", "\n")
+    t = t.replace(r"\[", "$$").replace(r"\]", "$$")
+    t = t.replace(r"\(", "$").replace(r"\)", "$")
+
+    parts = LATEX_SPLIT_RE.split(t)
+
+    out = []
+    for part in parts:
+        if not part:
+            continue
+        if LATEX_SPLIT_RE.fullmatch(part):
+            out.append(part)
+        else:
+            out.append(part.replace("\n", "  \n"))
+    return "".join(out)
+
+
+@timed()
+def render_latex_textblock(text: str):
+    st.markdown(latex_to_markdown(text), unsafe_allow_html=False)
+
+
+def strip_section_tags(s: str) -> str:
+    if not s:
+        return ""
+    t = s.strip()
+    t = re.sub(r"</\s*(题目|解析|答案)\s*>", "", t)
+    t = re.sub(r"<\s*(题目|解析|答案)\s*>", "", t)
+    t = re.sub(r"[【\[]\s*(题目|解析|答案)\s*[】\]]", "", t)
+    t = re.sub(r"^\s*(题目|解析|答案)\s*[:：]\s*", "", t)
+    return t.strip()
+
+
+def split_qa(text: str):
+    t = (text or "").replace("\r\n", "\n")
+    markers = [
+        ("题目", [r"<题目>", r"【题目】", r"题目[:：]"]),
+        ("解析", [r"<解析>", r"【解析】", r"解析[:：]"]),
+        ("答案", [r"<答案>", r"【答案】", r"答案[:：]"]),
+    ]
+    hits = []
+    for name, pats in markers:
+        for p in pats:
+            m = re.search(p, t)
+            if m:
+                hits.append((m.start(), m.end(), name))
+                break
+    hits.sort(key=lambda x: x[0])
+
+    if not hits:
+        return {"题目": strip_section_tags(t), "解析": "", "答案": ""}
+
+    out = {"题目": "", "解析": "", "答案": ""}
+    for idx, (s, e, name) in enumerate(hits):
+        content_start = e
+        content_end = hits[idx + 1][0] if idx + 1 < len(hits) else len(t)
+        out[name] = strip_section_tags(t[content_start:content_end])
+    return out
+
+
+# =========================
+# 概率/期望分工具
+# =========================
+def normalize_prob_dict(prob_dict, opts):
+    keys = [str(o) for o in opts]
+    vals = []
+    for k in keys:
+        try:
+            vals.append(float(prob_dict.get(k, 0.0)))
+        except Exception:
+            vals.append(0.0)
+
+    s = sum(vals)
+    if s <= PROB_TOL:
+        vals = [1.0 / len(keys)] * len(keys)
+    else:
+        vals = [v / s for v in vals]
+
+    out = {k: round(v, PROB_ROUND) for k, v in zip(keys, vals)}
+    total = sum(out.values())
+    diff = round(1.0 - total, PROB_ROUND)
+    out[keys[-1]] = round(out[keys[-1]] + diff, PROB_ROUND)
+
+    for k in keys:
+        out[k] = min(1.0, max(0.0, out[k]))
+    return out
+
+
+def mean_to_probs(opts, mean_value: float):
+    opts = sorted(opts)
+    e = float(mean_value)
+
+    if len(opts) == 2:
+        a, b = opts[0], opts[1]
+        if abs(b - a) < 1e-9:
+            probs = {str(a): 1.0, str(b): 0.0}
+        else:
+            pb = (e - a) / (b - a)
+            pb = max(0.0, min(1.0, pb))
+            pa = 1.0 - pb
+            probs = {str(a): pa, str(b): pb}
+        return normalize_prob_dict(probs, opts)
+
+    if e <= 1.0:
+        p0 = 1.0 - e
+        p1 = e
+        p2 = 0.0
+    else:
+        p0 = 0.0
+        p1 = 2.0 - e
+        p2 = e - 1.0
+
+    return normalize_prob_dict({"0": p0, "1": p1, "2": p2}, [0, 1, 2])
+
+
+def expected_from_probs(probs: dict, opts):
+    if not isinstance(probs, dict):
+        return None
+    s = 0.0
+    for o in sorted(opts):
+        s += float(o) * float(probs.get(str(o), 0.0))
+    return float(s)
+
+
+def subdim_expected(v, opts) -> Optional[float]:
+    # 识别三种存储形式：概率字典 / 按选项升序的概率数组 / 期望分本身；-1 由调用方处理
+    if isinstance(v, dict):
+        return expected_from_probs(v, opts)
+    if isinstance(v, list):
+        if len(v) != len(opts):
+            return None
+        try:
+            return float(sum(float(o) * float(p) for o, p in zip(sorted(opts), v)))
+        except Exception:
+            return None
+    if v is None or v == "" or isinstance(v, bool):
+        return None
+    try:
+        return float(v)
+    except Exception:
+        return None
+
+
+def encode_subdim_score(opts, mean_value: float, encoding: Optional[str] = None):
+    encoding = encoding or get_profile()["score_encoding"]
+    if encoding == "mean":
+        return round(float(mean_value), PROB_ROUND)
+
+    probs = mean_to_probs(opts, mean_value)
+    if encoding == "array":
+        return [probs[str(o)] for o in sorted(opts)]
+    return probs
+
+
+def decode_subdim_score(v, opts):
+    # 还原为概率字典；-1、空值及无法识别的值原样返回
+    if isinstance(v, dict) or v == -1 or v == "-1":
+        return v
+    if isinstance(v, list):
+        if len(v) != len(opts):
+            return v
+        return {str(o): float(p) for o, p in zip(sorted(opts), v)}
+    ev = subdim_expected(v, opts)
+    if ev is None:
+        return v
+    return mean_to_probs(opts, ev)
+
+
+def recode_message_scores(message: Dict[str, Any], encoding: str) -> int:
+    # 将所有教师标注中的二级维度分数转换为指定存储形式，返回改动的条目数
+    subdims = [
+        (f"{g['name']}_{sub['name']}_score", sub.get("options", [0, 1, 2]))
+        for g in get_schema()["groups"]
+        for sub in g["subdims"]
+    ]
+    changed = 0
+    for t_ann in (message.get("annotations") or {}).values():
+        for ms in (t_ann.get("scores") or {}).values():
+            for key, opts in subdims:
+                v = ms.get(key)
+                if v is None or v == "" or v == -1 or v == "-1":
+                    continue
+                ev = subdim_expected(v, opts)
+                if ev is None:
+                    continue
+                if encoding == "probs":
+                    nv = decode_subdim_score(v, opts)
+                elif encoding == "array":
+                    probs = decode_subdim_score(v, opts)
+                    nv = [probs.get(str(o), 0.0) for o in sorted(opts)]
+                else:
+                    nv = round(ev, PROB_ROUND)
+                if nv != v:
+                    ms[key] = nv
+                    changed += 1
+    return changed
+
+
+def expected_from_prev(prev, opts):
+    if isinstance(prev, (dict, list)):
+        v = subdim_expected(prev, opts)
+        return float(v) if v is not None else float(min(opts))
+    if prev is None or prev == "":
+        return float(min(opts))
+    try:
+        v = float(prev)
+        return float(max(min(v, max(opts)), min(opts)))
+    except Exception:
+        return float(min(opts))
+
+
+def get_subdim_expected_score(ms: Dict[str, Any], group_name: str, sub_name: str, opts):
+    v = ms.get(f"{group_name}_{sub_name}_score")
+
+    if v == -1 or v == "-1":
+        return -1.0
+
+    return subdim_expected(v, opts)
+
+
+def stage_failed_by_any_zero(ms: Dict[str, Any], group: Dict[str, Any]) -> bool:
+    if not group:
+        return False
+
+    for sub in group["subdims"]:
+        sname = sub["name"]
+        opts = sub.get("options", [0, 1, 2])
+        ev = get_subdim_expected_score(ms, group["name"], sname, opts)
+        if ev is not None and abs(ev - 0.0) <= 1e-9:
+            return True
+    return False
+
+
+# =========================
+# 阶段失败规则（声明式注册，按配置编译为谓词）
+# =========================
+# name -> {"compile": group -> (ms -> bool), "cond": 界面提示用语, "reason": 跳过原因用语}
+STAGE_RULES: Dict[str, Dict[str, Any]] = {}
+
+
+def stage_rule(name: str, cond: str = "", reason: str = ""):
+    def deco(fn):
+        STAGE_RULES[name] = {"compile": fn, "cond": cond, "reason": reason}
+        return fn
+
+    return deco
+
+
+@stage_rule("any_subdim_zero", cond="任一二级维度得分为 0", reason="存在二级维度得分为 0")
+def _compile_any_subdim_zero(group: Dict[str, Any]) -> Callable[[Dict[str, Any]], bool]:
+    # 预先展开 key 与选项权重，判断时不再拼接字符串、排序选项；语义同 stage_failed_by_any_zero
+    checks = []
+    for sub in group["subdims"]:
+        opts = sorted(sub.get("options", [0, 1, 2]))
+        checks.append((f"{group['name']}_{sub['name']}_score", [(str(o), float(o)) for o in opts]))
+
+    def failed(ms: Dict[str, Any]) -> bool:
+        for key, weights in checks:
+            v = ms.get(key)
+            if isinstance(v, dict):
+                ev = 0.0
+                for k, w in weights:
+                    ev += w * float(v.get(k, 0.0))
+            elif isinstance(v, list):
+                if len(v) != len(weights):
+                    continue
+                ev = 0.0
+                for (_, w), p in zip(weights, v):
+                    ev += w * float(p)
+            elif v is None or v == "" or v == -1 or v == "-1":
+                continue
+            else:
+                try:
+                    ev = float(v)
+                except Exception:
+                    continue
+            if abs(ev) <= 1e-9:
+                return True
+        return False
+
+    return failed
+
+
+@stage_rule("group_total_zero", cond="总分为 0", reason="总分为 0")
+def _compile_group_total_zero(group: Dict[str, Any]) -> Callable[[Dict[str, Any]], bool]:
+    key = f"{group['name']}_score"
+    return lambda ms: ms.get(key, None) == 0
+
+
+@stage_rule("none")
+def _compile_never(group: Dict[str, Any]) -> Callable[[Dict[str, Any]], bool]:
+    return lambda ms: False
+
+
+# 未触发任何阶段失败时的状态（各处共享，只读）
+STAGE_OK = {
+    "failed_stage": None,
+    "failed_group": None,
+    "skip_groups": (),
+    "skip_rank": False,
+    "reason": "",
+    "skip_comment": "",
+}
+
+
+def compile_stages(rule: str, stages: List[Dict[str, Any]], groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if rule not in STAGE_RULES:
+        raise ValueError(f"未知的阶段失败规则：{rule}")
+
+    conf = STAGE_RULES[rule]
+    by_name = {g["name"]: g for g in groups}
+    compiled = []
+    for i, stage in enumerate(stages):
+        group = by_name[stage["group"]]
+        compiled.append({
+            "group": group,
+            "failed": conf["compile"](group),
+            # 阶段失败时的状态与跳过原因在编译期一次生成（只读）
+            "status": {
+                "failed_stage": i,
+                "failed_group": group["name"],
+                "skip_groups": tuple(stage["skip_groups"]),
+                "skip_rank": True,
+                "reason": f"{group['name']} {conf['reason']}，{_stage_skip_target(i)}自动跳过并记为 -1。",
+                "skip_comment": f"因{group['name']}{conf['reason'].replace(' ', '')}，自动跳过并记为-1",
+            },
+        })
+    return compiled
+
+
+# =========================
+# 单次重跑内缓存
+# =========================
+# 每次重跑开始时由 run_app 重置；离线工具默认为 None，即不缓存（可自行调用 begin_rerun_memo）
+_rerun_memo: contextvars.ContextVar = contextvars.ContextVar("agq_rerun_memo", default=None)
+
+
+def begin_rerun_memo():
+    _rerun_memo.set({})
+
+
+# =========================
+# responses / annotations 操作
+# =========================
+def message_index(message: Dict[str, Any]) -> Dict[str, Any]:
+    # 每题的 response_id 映射、已有回答集合与盲评顺序；在单次重跑内缓存，
+    # responses 列表被替换或增删时自动重建（原地修改单个回答后请调用 invalidate_message_index）
+    responses = message.get("responses") or []
+    memo = _rerun_memo.get()
+    memo_key = ("message_index", id(message))
+    if memo is not None:
+        entry = memo.get(memo_key)
+        if (
+            entry is not None
+            and entry["message"] is message
+            and entry["responses"] is responses
+            and entry["n"] == len(responses)
+        ):
+            return entry
+
+    rindex = {}
+    for r in responses:
+        rid = r.get("response_id")
+        if rid:
+            rindex[rid] = r
+
+    entry = {
+        "message": message,
+        "responses": responses,
+        "n": len(responses),
+        "rindex": rindex,
+        # 键视图即可做 O(1) 成员判断，无需另建集合
+        "present": rindex.keys(),
+        # teacher_id -> (blind_map 对象, 顺序, 是否已写入)
+        "orders": {},
+    }
+    if memo is not None:
+        memo[memo_key] = entry
+    return entry
+
+
+def invalidate_message_index(message: Dict[str, Any]):
+    memo = _rerun_memo.get()
+    if memo:
+        memo.pop(("message_index", id(message)), None)
+
+
+def responses_index(message: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    # 返回缓存的映射，调用方只读
+    return message_index(message)["rindex"]
+
+
+def get_precheck_suggestion(response: Dict[str, Any], score_key: str) -> Optional[Dict[str, Any]]:
+    pc = response.get(PRECHECK_FIELD)
+    if not isinstance(pc, dict):
+        return None
+    s = (pc.get("suggestions") or {}).get(score_key)
+    return s if isinstance(s, dict) and "value" in s else None
+
+
+def ensure_teacher_annotation(message: Dict[str, Any], teacher_id: str) -> Dict[str, Any]:
+    ann = message.setdefault("annotations", {})
+    t_ann = ann.setdefault(teacher_id, {})
+    t_ann.setdefault("blind_map", {})
+    t_ann.setdefault("scores", {})
+    return t_ann
+
+
+def get_teacher_annotation_readonly(message: Dict[str, Any], teacher_id: str) -> Dict[str, Any]:
+    ann = message.get("annotations")
+    if not isinstance(ann, dict):
+        return {}
+    t_ann = ann.get(teacher_id)
+    return t_ann if isinstance(t_ann, dict) else {}
+
+
+def schema_mismatch(message: Dict[str, Any], teacher_id: str) -> bool:
+    # 该教师的评分带有其他 SCHEMA 的指纹；没有指纹的旧数据按当前配置处理
+    fp = annotation_fingerprint(get_teacher_annotation_readonly(message, teacher_id))
+    return bool(fp) and fp != get_profile()["fingerprint"]
+
+
+def schema_counts(data: List[Dict[str, Any]], teacher_id: str) -> Dict[str, int]:
+    # 各 SCHEMA 指纹的题目数（"" 为没有指纹的旧数据）；只比较字符串，代价与逐字段检查无关
+    counts: Dict[str, int] = {}
+    for item in data:
+        fp = annotation_fingerprint(get_teacher_annotation_readonly(item, teacher_id))
+        counts[fp] = counts.get(fp, 0) + 1
+    return counts
+
+
+def deterministic_pick_three(response_ids: List[str], seed_text: str) -> List[Optional[str]]:
+    ids = list(response_ids)
+    seed = int(hashlib.md5(seed_text.encode("utf-8")).hexdigest()[:8], 16)
+    rnd = random.Random(seed)
+    rnd.shuffle(ids)
+    ids = ids[:3]
+    while len(ids) < 3:
+        ids.append(None)
+    return ids
+
+
+def balanced_latin_square(n: int) -> List[List[int]]:
+    # Williams 设计：首行 0, 1, n-1, 2, n-2, ...，其余行逐行 +1 取模；
+    # n 为奇数时再追加各行的逆序，保证每个模型在每一列出现次数相同
+    first = [0]
+    lo, hi = 1, n - 1
+    for j in range(1, n):
+        if j % 2 == 1:
+            first.append(lo)
+            lo += 1
+        else:
+            first.append(hi)
+            hi -= 1
+
+    rows = [[(x + i) % n for x in first] for i in range(n)]
+    if n % 2 == 1:
+        rows += [list(reversed(r)) for r in rows]
+    return rows
+
+
+def latin_square_order(response_ids: List[str], row: List[int]) -> List[Optional[str]]:
+    ids: List[Optional[str]] = sorted(response_ids)
+    ids += [None] * (len(row) - len(ids))
+    return [ids[j] for j in row][: len(MODEL_LABELS)]
+
+
+def read_saved_blind_order(message: Dict[str, Any], teacher_id: str) -> Optional[List[Optional[str]]]:
+    t_ann = get_teacher_annotation_readonly(message, teacher_id)
+    blind_map = t_ann.get("blind_map")
+    if not isinstance(blind_map, dict) or not all(lbl in blind_map for lbl in MODEL_LABELS):
+        return None
+
+    rid_set = message_index(message)["present"]
+    saved = [blind_map.get(lbl) for lbl in MODEL_LABELS]
+    if all((rid is None) or (rid in rid_set) for rid in saved):
+        return saved
+    return None
+
+
+def preassign_blind_maps(data: List[Dict[str, Any]], teacher_id: str) -> int:
+    # 入库时一次性写入全部盲评顺序；已有合法 blind_map 的题目保持不变（避免打乱已评分数据）。
+    # 每题在平衡拉丁方的各行中选择使“模型 × 列”累计次数最均衡的一行，
+    # 不同题目的模型组合不同，因此按 model_id 而不是按位置计数。
+    offset = int(hashlib.md5(teacher_id.encode("utf-8")).hexdigest()[:8], 16)
+    counts: Dict[tuple, int] = {}
+    pending = []
+
+    for i, item in enumerate(data):
+        rindex = responses_index(item)
+        saved = read_saved_blind_order(item, teacher_id)
+        if saved is None:
+            pending.append((i, item, rindex))
+            continue
+        for col, rid in enumerate(saved):
+            if rid:
+                mkey = (rindex[rid].get("model_id") or rid, col)
+                counts[mkey] = counts.get(mkey, 0) + 1
+
+    for i, item, rindex in pending:
+        rids = list(rindex.keys())
+        square = balanced_latin_square(max(len(rids), len(MODEL_LABELS)))
+        start = (offset + i) % len(square)
+
+        best_order, best_cost = None, None
+        for k in range(len(square)):
+            order = latin_square_order(rids, square[(start + k) % len(square)])
+            cost = sum(
+                counts.get((rindex[rid].get("model_id") or rid, col), 0)
+                for col, rid in enumerate(order) if rid
+            )
+            if best_cost is None or cost < best_cost:
+                best_order, best_cost = order, cost
+
+        for col, rid in enumerate(best_order):
+            if rid:
+                mkey = (rindex[rid].get("model_id") or rid, col)
+                counts[mkey] = counts.get(mkey, 0) + 1
+
+        t_ann = ensure_teacher_annotation(item, teacher_id)
+        t_ann["blind_map"] = {lbl: rid for lbl, rid in zip(MODEL_LABELS, best_order)}
+    return len(pending)
+
+
+def get_blind_order_for_qid(
+    message: Dict[str, Any],
+    qid: str,
+    teacher_id: Optional[str] = None,
+    persist: bool = True,
+) -> List[Optional[str]]:
+    if teacher_id is None:
+        teacher_id = st.session_state.teacher_id
+
+    # blind_map 只会被整体替换（preassign / 下方写入），按对象身份判断缓存是否有效
+    idx = message_index(message)
+    blind_map = get_teacher_annotation_readonly(message, teacher_id).get("blind_map")
+    cached = idx["orders"].get(teacher_id)
+    if cached is not None and cached[0] is blind_map and (cached[2] or not persist):
+        return list(cached[1])
+
+    saved = read_saved_blind_order(message, teacher_id)
+    if saved is not None:
+        idx["orders"][teacher_id] = (blind_map, saved, True)
+        return list(saved)
+
+    # 未经 preassign_blind_maps 预分配的题目，退回旧的哈希洗牌顺序
+    picked = deterministic_pick_three(list(idx["rindex"].keys()), seed_text=f"{teacher_id}::{qid}::blind")
+    if persist:
+        t_ann = ensure_teacher_annotation(message, teacher_id)
+        t_ann["blind_map"] = {lbl: rid for lbl, rid in zip(MODEL_LABELS, picked)}
+        idx["orders"][teacher_id] = (t_ann["blind_map"], picked, True)
+    else:
+        idx["orders"][teacher_id] = (blind_map, picked, False)
+    return list(picked)
+
+
+def get_group_by_name(name: str):
+    for g in get_schema()["groups"]:
+        if g["name"] == name:
+            return g
+    return None
+
+
+def set_group_skipped(scores_root: Dict[str, Any], rid: str, group: Dict[str, Any], reason: str = AUTO_SKIP_COMMENT):
+    gname = group["name"]
+    scores_root.setdefault(rid, {})
+
+    for sub in group["subdims"]:
+        sname = sub["name"]
+        scores_root[rid][f"{gname}_{sname}_score"] = -1
+
+    scores_root[rid][f"{gname}_score"] = -1
+
+    if group.get("need_comment", False):
+        ck = f"{gname}_comment"
+        old = scores_root[rid].get(ck, "")
+        if old is None or str(old).strip() == "":
+            scores_root[rid][ck] = reason
+
+
+def set_rank_skipped(scores_root: Dict[str, Any], rid: str):
+    rank_name = get_schema()["rank"]["name"]
+    scores_root.setdefault(rid, {})
+    scores_root[rid][f"{rank_name}_score"] = "-1"
+
+
+def clear_stale_skips(ms: Dict[str, Any], status: Dict[str, Any], rank_key: str):
+    # 按当前阶段状态不应跳过的维度：清除 -1 与自动跳过评语，留待重新评分；阶段未终止时排名的 -1 一并清除
+    for group in get_schema()["groups"]:
+        gname = group["name"]
+        if gname in status["skip_groups"]:
+            continue
+        for key in [f"{gname}_{sub['name']}_score" for sub in group["subdims"]] + [f"{gname}_score"]:
+            if ms.get(key) in (-1, "-1"):
+                del ms[key]
+        ck = f"{gname}_comment"
+        if is_auto_skip_comment(ms.get(ck)):
+            del ms[ck]
+    if status["failed_group"] is None and ms.get(rank_key) in (-1, "-1"):
+        del ms[rank_key]
+
+
+def ranks_unique_for_current(message: Dict[str, Any], teacher_id: str) -> bool:
+    qid = message.get("q_id", "")
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=False)
+    rindex = responses_index(message)
+
+    rank_name = get_schema()["rank"]["name"]
+    statuses = stage_status_table(message, teacher_id, order, live=True)
+    vals = []
+
+    for rid in order:
+        if not rid or rid not in rindex:
+            continue
+
+        if is_rank_skipped_for_status(statuses[rid]):
+            continue
+
+        wkey = f"{qid}_{safe_key(rank_name)}_{rid}"
+        val = st.session_state.get(wkey, "未评分")
+        if val not in [None, "", "未评分"]:
+            vals.append(val)
+
+    return len(vals) == len(set(vals))
+
+
+def ranks_unique_in_scores(message: Dict[str, Any], teacher_id: str) -> bool:
+    # 与 ranks_unique_for_current 相同的判定，但基于已写入 message 的分数（供 api_server 使用）
+    qid = message.get("q_id", "")
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=False)
+    rindex = responses_index(message)
+    scores = get_teacher_annotation_readonly(message, teacher_id).get("scores") or {}
+
+    rank_key = f"{get_schema()['rank']['name']}_score"
+    vals = []
+    for rid in order:
+        if not rid or rid not in rindex:
+            continue
+        ms = scores.get(rid, {})
+        if is_rank_skipped_for_status(evaluate_stage_status(ms)):
+            continue
+        val = ms.get(rank_key, "未评分")
+        if val not in [None, "", "未评分"]:
+            vals.append(val)
+
+    return len(vals) == len(set(vals))
+
+
+# =========================
+# 完成判定
+# =========================
+def score_filled(v, opts):
+    if v == -1 or v == "-1":
+        return True
+
+    if v is None or v == "":
+        return False
+
+    if isinstance(v, dict):
+        keys = [str(o) for o in opts]
+        if not all(k in v for k in keys):
+            return False
+        try:
+            vals = [float(v[k]) for k in keys]
+        except Exception:
+            return False
+        if any((x < -PROB_TOL) or (x > 1 + PROB_TOL) for x in vals):
+            return False
+        return abs(sum(vals) - 1.0) <= 0.03
+
+    if isinstance(v, list):
+        if len(v) != len(opts):
+            return False
+        try:
+            vals = [float(x) for x in v]
+        except Exception:
+            return False
+        if any((x < -PROB_TOL) or (x > 1 + PROB_TOL) for x in vals):
+            return False
+        return abs(sum(vals) - 1.0) <= 0.03
+
+    if v in opts:
+        return True
+
+    # mean 存储形式：期望分落在选项范围内即视为已填写
+    ev = subdim_expected(v, opts)
+    return ev is not None and min(opts) - PROB_TOL <= ev <= max(opts) + PROB_TOL
+
+
+def group_filled(ms: Dict[str, Any], group: Dict[str, Any]) -> bool:
+    gname = group["name"]
+    for sub in group["subdims"]:
+        opts = sub.get("options", [0, 1, 2])
+        if not score_filled(ms.get(f"{gname}_{sub['name']}_score"), opts):
+            return False
+
+    if group.get("need_comment", False):
+        c = ms.get(f"{gname}_comment")
+        if c is None or str(c).strip() == "":
+            return False
+    return True
+
+
+def is_question_scored(message: Dict[str, Any], teacher_id: str) -> bool:
+    qid = message.get("q_id", "")
+    t_ann = get_teacher_annotation_readonly(message, teacher_id)
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=False)
+    rindex = responses_index(message)
+    required_rids = [rid for rid in order if rid and rid in rindex]
+
+    profile = get_profile()
+    rank_key = f"{profile['schema']['rank']['name']}_score"
+    scores = t_ann.get("scores") or {}
+
+    for rid in required_rids:
+        ms = scores.get(rid, {})
+
+        # 按阶段顺序检查：阶段维度必须先评完，才能判断是否终止
+        skipped: tuple = ()
+        skip_rank = False
+        for stage in profile["compiled_stages"]:
+            if not group_filled(ms, stage["group"]):
+                return False
+            if stage["failed"](ms):
+                skipped = stage["status"]["skip_groups"]
+                skip_rank = True
+                break
+
+        for g in profile["schema"]["groups"]:
+            if g["name"] in skipped:
+                if ms.get(f"{g['name']}_score") != -1:
+                    return False
+            elif not group_filled(ms, g):
+                return False
+
+        rank = ms.get(rank_key)
+        if skip_rank:
+            if rank not in [-1, "-1"]:
+                return False
+        elif rank in [None, "", "未评分", -1, "-1"]:
+            return False
+
+    return True
+
+
+# =========================
+# 阶段状态判断（用于界面显示）
+# =========================
+def _stage_ordinal(i: int) -> str:
+    return STAGE_ORDINALS[i] if i < len(STAGE_ORDINALS) else f"第{i + 1}"
+
+
+def _stage_skip_target(i: int) -> str:
+    # 与原三阶段文案一致：第一阶段终止跳过“后续维度”，第二阶段终止跳过“第三阶段维度”
+    return "后续维度" if i == 0 else f"{_stage_ordinal(i + 1)}阶段维度"
+
+
+def evaluate_stage_status(ms: Dict[str, Any]) -> Dict[str, Any]:
+    # 返回的状态字典由编译期生成、各处共享，调用方不要修改
+    for stage in get_profile()["compiled_stages"]:
+        if stage["failed"](ms):
+            return stage["status"]
+    return STAGE_OK
+
+
+def get_stage_status_for_rid(message: Dict[str, Any], rid: str, teacher_id: str):
+    t_ann = get_teacher_annotation_readonly(message, teacher_id)
+    scores = t_ann.get("scores") or {}
+    return evaluate_stage_status(scores.get(rid, {}))
+
+
+# =========================
+# 阶段状态表（单次重跑内缓存）
+# =========================
+def invalidate_stage_status(qid: str):
+    memo = _rerun_memo.get()
+    if not memo:
+        return
+    for key in [k for k in memo if k[0] == "stage_status" and k[1] == qid]:
+        del memo[key]
+
+
+def live_stage_scores(qid: str, rid: str, ms: Dict[str, Any]) -> Dict[str, Any]:
+    # 用会话中的控件值覆盖阶段维度的已保存分数，使跳过提示不必等到保存后才更新
+    live = None
+    for stage in get_profile()["compiled_stages"]:
+        group = stage["group"]
+        gname = group["name"]
+        sub_means = []
+        for sub in group["subdims"]:
+            mean_key = f"{qid}_{safe_key(gname)}_{safe_key(sub['name'])}_{rid}_mean"
+            v = st.session_state[mean_key] if mean_key in st.session_state else draft_default(qid, mean_key, None)
+            if v is None:
+                break
+            sub_means.append((sub["name"], float(v)))
+        else:
+            if not sub_means:
+                continue
+            if live is None:
+                live = dict(ms)
+            # 规则谓词对数值与概率分布一视同仁，这里直接写入期望值
+            for sname, mean in sub_means:
+                live[f"{gname}_{sname}_score"] = mean
+            live[f"{gname}_score"] = round(sum(m for _, m in sub_means) / len(sub_means), 2)
+    return ms if live is None else live
+
+
+def stage_status_table(
+    message: Dict[str, Any],
+    teacher_id: str,
+    order: Optional[List[Optional[str]]] = None,
+    live: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    # 每个回答每次重跑只判定一次，供评分区渲染、排名校验等共用；
+    # live=True 时按当前控件值判定（表单提交后、写回 data 之前）
+    qid = message.get("q_id", "")
+    memo = _rerun_memo.get()
+    memo_key = ("stage_status", qid, teacher_id, live)
+    if memo is not None and memo_key in memo:
+        return memo[memo_key]
+
+    if order is None:
+        order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=False)
+    scores = get_teacher_annotation_readonly(message, teacher_id).get("scores") or {}
+
+    table = {}
+    for rid in order:
+        if not rid:
+            continue
+        ms = scores.get(rid, {})
+        if live:
+            ms = live_stage_scores(qid, rid, ms)
+        table[rid] = evaluate_stage_status(ms)
+
+    if memo is not None:
+        memo[memo_key] = table
+    return table
+
+
+def is_group_skipped_for_rid(group_name: str, status: Dict[str, Any]) -> bool:
+    return group_name in status["skip_groups"]
+
+
+def is_rank_skipped_for_status(status: Dict[str, Any]) -> bool:
+    return status["skip_rank"]
+
+
+def is_auto_skip_comment(c: Any) -> bool:
+    return isinstance(c, str) and (
+        c == AUTO_SKIP_COMMENT
+        or (c.startswith("因") and c.endswith("自动跳过并记为-1"))
+    )
+
+
+def stage_rule_summary() -> str:
+    profile = get_profile()
+    stages = profile["stages"]
+    if not stages:
+        return ""
+
+    cond = STAGE_RULES[profile["stage_rule"]]["cond"]
+    parts = []
+    for i in range(len(stages)):
+        parts.append(f"若{_stage_ordinal(i)}阶段{cond}，则{_stage_skip_target(i)}自动记为 -1")
+    order = " → ".join([s["group"] for s in stages] + ["其余维度"])
+    return f"评测顺序：{order}。" + "；".join(parts) + "。"
+
+
+# =========================
+# 工作队列（未完成 / 阶段终止 / 缺少评语 / 排名冲突）
+# =========================
+def work_queue_defs() -> List[Tuple[str, str]]:
+    # (队列名, 显示名)；阶段终止队列随评测配置的阶段生成
+    profile = get_profile()
+    defs = [(QUEUE_ALL, "全部题目"), ("unscored", "未完成"), ("scored", "已完成")]
+    for i, stage in enumerate(profile["compiled_stages"]):
+        defs.append((f"stage{i + 1}_failed", f"{_stage_ordinal(i)}阶段终止（{stage['group']['name']}）"))
+    if any(g.get("need_comment", False) for g in profile["schema"]["groups"]):
+        defs.append(("missing_comment", "缺少评语"))
+    defs.append(("rank_conflict", "排名冲突"))
+    defs.append(("schema_mismatch", "SCHEMA 不一致"))
+    return defs
+
+
+def question_queue_flags(message: Dict[str, Any], teacher_id: str) -> frozenset:
+    # 单题所属的队列；完成与阶段判定直接复用 is_question_scored / get_stage_status_for_rid
+    if schema_mismatch(message, teacher_id):
+        # 评分来自其他评测配置：不做逐字段判定，整题计为未完成（需迁移或重评）
+        return frozenset({"unscored", "schema_mismatch"})
+    flags = {"scored" if is_question_scored(message, teacher_id) else "unscored"}
+    qid = message.get("q_id", "")
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=False)
+    rindex = responses_index(message)
+    scores = get_teacher_annotation_readonly(message, teacher_id).get("scores") or {}
+    comment_groups = [g for g in get_schema()["groups"] if g.get("need_comment", False)]
+
+    for rid in order:
+        if not rid or rid not in rindex:
+            continue
+        status = get_stage_status_for_rid(message, rid, teacher_id)
+        if status["failed_stage"] is not None:
+            flags.add(f"stage{status['failed_stage'] + 1}_failed")
+
+        # 缺少评语：该维度分数已填齐，但评语为空（已跳过的维度不计）
+        ms = scores.get(rid) or {}
+        for g in comment_groups:
+            gname = g["name"]
+            if is_group_skipped_for_rid(gname, status) or str(ms.get(f"{gname}_comment") or "").strip():
+                continue
+            if all(score_filled(ms.get(f"{gname}_{sub['name']}_score"), sub.get("options", [0, 1, 2])) for sub in g["subdims"]):
+                flags.add("missing_comment")
+                break
+
+    if not ranks_unique_in_scores(message, teacher_id):
+        flags.add("rank_conflict")
+    return frozenset(flags)
+
+
+def build_work_queues(data: List[Dict[str, Any]], teacher_id: str) -> Dict[str, Any]:
+    # 每个队列保存 next[i] / prev[i]：下标 i 之后 / 之前最近的成员（无则为 -1），
+    # 当前题目不在队列中时也能 O(1) 找到上一条 / 下一条
+    flags = [question_queue_flags(item, teacher_id) for item in data]
+    n = len(data)
+    qids = [item.get("q_id", f"id_{i}") for i, item in enumerate(data)]
+    wq: Dict[str, Any] = {
+        "n": n,
+        # 题目 ID 索引随队列一起缓存，保存评分不会改变，无需每次重跑重建
+        "qids": qids,
+        "qid_to_index": {qid: i for i, qid in enumerate(qids)},
+        "flags": flags,
+        # 加载时的 SCHEMA 指纹分布，用于提示混合 SCHEMA 的文件
+        "schemas": schema_counts(data, teacher_id),
+        "counts": {},
+        "next": {},
+        "prev": {},
+    }
+    for name, _ in work_queue_defs():
+        if name == QUEUE_ALL:
+            continue
+        nxt = array("l", [-1]) * n
+        prv = array("l", [-1]) * n
+        last = -1
+        for i in range(n - 1, -1, -1):
+            nxt[i] = last
+            if name in flags[i]:
+                last = i
+        last = -1
+        count = 0
+        for i in range(n):
+            prv[i] = last
+            if name in flags[i]:
+                last = i
+                count += 1
+        wq["next"][name] = nxt
+        wq["prev"][name] = prv
+        wq["counts"][name] = count
+    wq["counts"][QUEUE_ALL] = n
+    return wq
+
+
+def update_work_queues(wq: Dict[str, Any], idx: int, new_flags: frozenset):
+    # 单题成员变化时只修补相邻两个成员之间的链接，代价与间隔成正比
+    old_flags = wq["flags"][idx]
+    wq["flags"][idx] = new_flags
+    for name in old_flags ^ new_flags:
+        if name not in wq["next"]:
+            continue
+        flags = wq["flags"]
+        nxt, prv = wq["next"][name], wq["prev"][name]
+        added = name in new_flags
+        wq["counts"][name] += 1 if added else -1
+
+        target = idx if added else nxt[idx]
+        j = idx - 1
+        while j >= 0:
+            nxt[j] = target
+            if name in flags[j]:
+                break
+            j -= 1
+
+        target = idx if added else prv[idx]
+        j = idx + 1
+        while j < wq["n"]:
+            prv[j] = target
+            if name in flags[j]:
+                break
+            j += 1
+
+
+def in_work_queue(wq: Dict[str, Any], queue: str, idx: int) -> bool:
+    return queue == QUEUE_ALL or queue in wq["flags"][idx]
+
+
+def work_queue_neighbors(wq: Dict[str, Any], queue: str, idx: int) -> Tuple[int, int]:
+    # 返回 (上一条, 下一条) 的题目下标，无则为 -1
+    if queue == QUEUE_ALL or queue not in wq["next"]:
+        return (idx - 1, idx + 1 if idx + 1 < wq["n"] else -1)
+    return wq["prev"][queue][idx], wq["next"][queue][idx]
+
+
+def work_queue_first(wq: Dict[str, Any], queue: str) -> int:
+    if not wq["n"]:
+        return -1
+    return 0 if in_work_queue(wq, queue, 0) else work_queue_neighbors(wq, queue, 0)[1]
+
+
+def get_work_queues(file_path: str, mtime: float, data: List[Dict[str, Any]], teacher_id: str) -> Dict[str, Any]:
+    # 会话内缓存；文件被其他会话或工具改写（mtime 变化）时整体重建，本会话保存后由 refresh_work_queue 增量更新
+    key = (file_path, get_profile()["name"], teacher_id)
+    cached = st.session_state.get(SESSION_QUEUES_KEY)
+    if cached is not None and cached["key"] == key and cached["mtime"] == mtime and cached["wq"]["n"] == len(data):
+        return cached["wq"]
+
+    with span("build_work_queues", n=len(data)):
+        wq = build_work_queues(data, teacher_id)
+    st.session_state[SESSION_QUEUES_KEY] = {"key": key, "mtime": mtime, "wq": wq}
+    return wq
+
+
+def refresh_work_queue(file_path: str, message: Dict[str, Any], idx: int, teacher_id: str):
+    # 本会话写回文件后调用：只重算当前题目，并记录新的 mtime，避免下一次重跑整体重建
+    cached = st.session_state.get(SESSION_QUEUES_KEY)
+    if cached is None or cached["key"] != (file_path, get_profile()["name"], teacher_id):
+        return
+    update_work_queues(cached["wq"], idx, question_queue_flags(message, teacher_id))
+    cached["mtime"] = get_file_mtime(file_path)
+
+
+# =========================
+# 提交评分到 message
+# =========================
+def apply_scores_to_message(message: Dict[str, Any], teacher_id: str, entries: Dict[str, Dict[str, Any]]):
+    # 评分写回的核心逻辑，界面与 api_server 共用。entries 为 rid -> {分数 key: 值}：
+    # 二级维度可为期望分或概率分布（按当前存储形式编码），另含评语与排名；
+    # 未提供的 key 保留原值。写入后重算一级维度均分，并按阶段规则补写 -1；
+    # 不再终止的阶段之后遗留的 -1 与自动跳过评语一并清除（只提交前序阶段的局部更新也能恢复）
+    qid = message.get("q_id", "")
+    t_ann = ensure_teacher_annotation(message, teacher_id)
+    scores_root = t_ann.setdefault("scores", {})
+    t_ann[SCHEMA_FP_FIELD] = get_profile()["fingerprint"]
+
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=True)
+    rindex = responses_index(message)
+
+    rank_key = f"{get_schema()['rank']['name']}_score"
+
+    for rid in order:
+        if not rid or rid not in rindex or rid not in entries:
+            continue
+        entry = entries[rid]
+        ms = scores_root.setdefault(rid, {})
+
+        for group in get_schema()["groups"]:
+            gname = group["name"]
+            sub_means = []
+            for sub in group["subdims"]:
+                opts = sub.get("options", [0, 1, 2])
+                sub_key = f"{gname}_{sub['name']}_score"
+                if sub_key in entry:
+                    ms[sub_key] = encode_subdim_score(opts, subdim_expected(entry[sub_key], opts))
+                ev = subdim_expected(ms.get(sub_key), opts)
+                # -1 为阶段跳过的标记，不计入均分
+                if ev is not None and ev != -1:
+                    sub_means.append(ev)
+            if sub_means:
+                ms[f"{gname}_score"] = round(sum(sub_means) / len(sub_means), 2)
+
+            ck = f"{gname}_comment"
+            if group.get("need_comment", False) and ck in entry:
+                ms[ck] = entry[ck]
+
+        if rank_key in entry:
+            ms[rank_key] = entry[rank_key]
+
+    for rid in order:
+        if not rid or rid not in rindex:
+            continue
+
+        status = evaluate_stage_status(scores_root.setdefault(rid, {}))
+        clear_stale_skips(scores_root[rid], status, rank_key)
+        if status["failed_group"] is None:
+            continue
+
+        for gname in status["skip_groups"]:
+            g = get_group_by_name(gname)
+            if g:
+                set_group_skipped(scores_root, rid, g, reason=status["skip_comment"])
+        set_rank_skipped(scores_root, rid)
+
+    invalidate_stage_status(qid)
+
+
+@timed()
+def apply_scoring_form_to_message(message: Dict[str, Any]):
+    # 从会话中的控件值收集本题评分，再交给 apply_scores_to_message 写回
+    teacher_id = st.session_state.teacher_id
+    qid = message.get("q_id", "")
+
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=True)
+    rindex = responses_index(message)
+
+    rank_name = get_schema()["rank"]["name"]
+
+    entries = {}
+    for rid in order:
+        if not rid or rid not in rindex:
+            continue
+        entry = {}
+        for group in get_schema()["groups"]:
+            gname = group["name"]
+            for sub in group["subdims"]:
+                sname = sub["name"]
+                opts = sub.get("options", [0, 1, 2])
+                mean_key = f"{qid}_{safe_key(gname)}_{safe_key(sname)}_{rid}_mean"
+                entry[f"{gname}_{sname}_score"] = float(st.session_state.get(mean_key, min(opts)))
+            if group.get("need_comment", False):
+                entry[f"{gname}_comment"] = st.session_state.get(f"{qid}_{safe_key(gname)}_comment_{rid}", "")
+        entry[f"{rank_name}_score"] = st.session_state.get(f"{qid}_{safe_key(rank_name)}_{rid}", "未评分")
+        entries[rid] = entry
+
+    apply_scores_to_message(message, teacher_id, entries)
+
+
+# =========================
+# 内容展示区
+# =========================
+@timed()
+def render_outputs(message: Dict[str, Any]):
+    qid = message.get("q_id", "")
+    teacher_id = st.session_state.teacher_id
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=False)
+    rindex = responses_index(message)
+
+    expand_all = st.checkbox("🔽 展开全部（题目/解析/答案）", value=False, key=f"expandall_{safe_key(qid)}")
+
+    c1, c2, c3 = st.columns(3)
+    cols = [c1, c2, c3]
+    for i, rid in enumerate(order):
+        with cols[i]:
+            st.markdown(f"###### 🤖 {MODEL_LABELS[i]}")
+            if not rid or rid not in rindex:
+                st.warning("⚠️ 该列没有模型输出。")
+                continue
+
+            text = rindex[rid].get("text", "")
+            sections = split_qa(text)
+
+            with st.expander("📝 题目", expanded=True):
+                if sections["题目"].strip():
+                    render_latex_textblock(sections["题目"])
+                else:
+                    st.info("未检测到题目段")
+
+            with st.expander("🧠 解析", expanded=expand_all):
+                if sections["解析"].strip():
+                    render_latex_textblock(sections["解析"])
+                else:
+                    st.info("未检测到解析段")
+
+            with st.expander("✅ 答案", expanded=expand_all):
+                if sections["答案"].strip():
+                    render_latex_textblock(sections["答案"])
+                else:
+                    st.info("未检测到答案段")
+
+
+# =========================
+# 评分区
+# =========================
+@timed()
+def render_scoring_form(message: Dict[str, Any], prev_idx: int, next_idx: int):
+    teacher_id = st.session_state.teacher_id
+    qid = message.get("q_id", "")
+
+    t_ann = get_teacher_annotation_readonly(message, teacher_id)
+    scores_root = t_ann.get("scores") or {}
+
+    order = get_blind_order_for_qid(message, qid, teacher_id=teacher_id, persist=False)
+    rindex = responses_index(message)
+    statuses = stage_status_table(message, teacher_id, order, live=True)
+
+    rank_conf = get_schema()["rank"]
+    rank_name = rank_conf["name"]
+    rank_opts = rank_conf["options"]
+    rank_key = f"{rank_name}_score"
+
+    action = None
+    # 部分配置要求本题评分完整保存后才能翻页
+    nav_locked = get_profile()["require_scored_to_navigate"] and not is_question_scored(message, teacher_id)
+
+    with st.form(key=f"score_form_{qid}", clear_on_submit=False):
+        summary = stage_rule_summary()
+        if summary:
+            st.info(summary)
+
+        for group in get_schema()["groups"]:
+            gname = group["name"]
+            gdesc = group.get("desc", "")
+            need_comment = group.get("need_comment", False)
+
+            with st.expander(f"📌 {gname}", expanded=False):
+                if gdesc:
+                    st.caption(f"**指标说明：** {gdesc}")
+
+                group_skip_flags = []
+                for i in range(3):
+                    rid = order[i]
+                    if not rid or rid not in rindex:
+                        group_skip_flags.append(False)
+                        continue
+                    status = statuses[rid]
+                    group_skip_flags.append(is_group_skipped_for_rid(gname, status))
+
+                if any(group_skip_flags):
+                    st.warning("本维度对部分模型已自动跳过；界面显示“已跳过（保存为 -1）”的列无需填写。")
+
+                for sub in group["subdims"]:
+                    sname = sub["name"]
+                    sdesc = sub.get("desc", "")
+                    opts = sub.get("options", [0, 1, 2])
+                    rubric = sub.get("rubric", {})
+
+                    st.markdown(f"**🔖 {sname}**")
+                    st.markdown(f"<span style='font-size: 0.9em;'>{sdesc}</span>", unsafe_allow_html=True)
+
+                    if rubric:
+                        rubric_lines = [
+                            f"<div style='margin-bottom: 4px;'><b>{score}分</b>：{rubric[score]}</div>"
+                            for score in opts if score in rubric
+                        ]
+                        if rubric_lines:
+                            st.markdown(
+                                f"<div style='background-color: #f4f6f9; padding: 10px 15px; border-radius: 6px; "
+                                f"font-size: 0.85em; color: #2c3e50; margin-bottom: 15px; border-left: 4px solid #1f77b4;'>"
+                                f"{''.join(rubric_lines)}"
+                                f"</div>",
+                                unsafe_allow_html=True,
+                            )
+
+                    cols = st.columns(3)
+                    for i in range(3):
+                        rid = order[i]
+                        label = MODEL_LABELS[i]
+
+                        with cols[i]:
+                            st.markdown(f"**🤖 {label}**")
+
+                            if not rid or rid not in rindex:
+                                st.info("无模型输出 (免评)")
+                                continue
+
+                            status = statuses[rid]
+                            skipped = is_group_skipped_for_rid(gname, status)
+
+                            if skipped:
+                                st.info("⏭️ 已跳过（保存为 -1）")
+                                st.caption(status["reason"])
+                                continue
+
+                            sub_key = f"{gname}_{sname}_score"
+                            prev = scores_root.get(rid, {}).get(sub_key, "")
+
+                            if prev == -1 or prev == "-1":
+                                prev = float(min(opts))
+
+                            wkey = f"{qid}_{safe_key(gname)}_{safe_key(sname)}_{rid}"
+                            mean_key = f"{wkey}_mean"
+
+                            # 尚未评分时按规则预检的建议分预选，仍需人工确认后保存
+                            suggestion = get_precheck_suggestion(rindex[rid], sub_key)
+                            if suggestion is not None and prev == "":
+                                prev = suggestion["value"]
+
+                            default_mean = draft_default(qid, mean_key, expected_from_prev(prev, opts))
+                            grid = build_grid(float(min(opts)), float(max(opts)), float(PROB_STEP))
+                            default_mean = min(grid, key=lambda x: abs(x - float(default_mean)))
+                            default_idx = grid.index(default_mean)
+
+                            st.selectbox(
+                                "总分 E[S]",
+                                options=grid,
+                                index=default_idx,
+                                key=mean_key,
+                                format_func=lambda x: f"{x:.2f}",
+                                label_visibility="collapsed",
+                            )
+
+                            current_mean = float(st.session_state.get(mean_key, default_mean))
+                            probs = mean_to_probs(opts, current_mean)
+
+                            if sorted(opts) == [0, 2]:
+                                prob_str = f"P(0): {probs['0']:.2f} &nbsp;|&nbsp; P(2): {probs['2']:.2f}"
+                            else:
+                                prob_str = (
+                                    f"P(0): {probs['0']:.2f} &nbsp;|&nbsp; "
+                                    f"P(1): {probs['1']:.2f} &nbsp;|&nbsp; "
+                                    f"P(2): {probs['2']:.2f}"
+                                )
+
+                            st.markdown(
+                                f"<div style='font-size: 0.85em; color: #555; margin-top: 2px;'>{prob_str}</div>"
+                                f"<div style='font-size: 1.15em; font-weight: 700; color: #1f77b4; "
+                                f"margin-top: 4px; margin-bottom: 10px;'>👉 总分: {current_mean:.2f}</div>",
+                                unsafe_allow_html=True,
+                            )
+                            if suggestion is not None:
+                                st.caption(f"🤖 预检建议 {suggestion['value']} 分：{suggestion.get('evidence', '')}")
+
+                    st.divider()
+
+                if need_comment:
+                    st.markdown("💬 **维度整体评语（必填）**")
+                    cols_c = st.columns(3)
+                    for i in range(3):
+                        rid = order[i]
+                        label = MODEL_LABELS[i]
+                        with cols_c[i]:
+                            if not rid or rid not in rindex:
+                                continue
+
+                            status = statuses[rid]
+                            skipped = is_group_skipped_for_rid(gname, status)
+
+                            if skipped:
+                                st.info("⏭️ 已跳过（评语自动保存）")
+                                st.caption(status["reason"])
+                                continue
+
+                            ck = f"{gname}_comment"
+                            prev_c = scores_root.get(rid, {}).get(ck, "")
+                            if is_auto_skip_comment(prev_c):
+                                prev_c = ""
+
+                            wkey_c = f"{qid}_{safe_key(gname)}_comment_{rid}"
+                            st.text_area(
+                                f"{label} 评语",
+                                value=draft_default(qid, wkey_c, prev_c),
+                                key=wkey_c,
+                                height=68,
+                                label_visibility="collapsed",
+                                placeholder=f"输入 {label} 的评语...",
+                            )
+
+        with st.expander(f"🏆 {rank_name}", expanded=True):
+            st.caption(f"**指标说明：** {rank_conf.get('desc', '')}")
+            cols = st.columns(3)
+            chosen_ranks = []
+            for i in range(3):
+                rid = order[i]
+                label = MODEL_LABELS[i]
+                with cols[i]:
+                    st.markdown(f"**🤖 {label}**")
+                    if not rid:
+                        st.info("无输出 (免评)")
+                        continue
+
+                    status = statuses[rid]
+                    if is_rank_skipped_for_status(status):
+                        st.info("⏭️ 排名已跳过（保存为 -1）")
+                        st.caption(status["reason"])
+                        continue
+
+                    wkey = f"{qid}_{safe_key(rank_name)}_{rid}"
+                    prev_rank = draft_default(qid, wkey, scores_root.get(rid, {}).get(rank_key, "未评分"))
+                    if prev_rank == "-1":
+                        prev_rank = "未评分"
+                    try:
+                        rank_idx = rank_opts.index(prev_rank) if prev_rank != "" else 0
+                    except ValueError:
+                        rank_idx = 0
+
+                    val = st.selectbox("名次", rank_opts, index=rank_idx, key=wkey, label_visibility="collapsed")
+                    if rid in rindex and val not in [None, "", "未评分"]:
+                        chosen_ranks.append(val)
+
+            if len(chosen_ranks) != len(set(chosen_ranks)):
+                st.error("⚠️ 当前名次存在重复，请为不同模型选择不同名次。")
+
+        st.markdown("### ⚙️ 操作区")
+        nav1, nav2, nav3 = st.columns([1, 1.2, 1])
+
+        with nav1:
+            prev_clicked = st.form_submit_button(
+                "⬅️ 上一条",
+                use_container_width=True,
+                disabled=(prev_idx < 0) or nav_locked,
+            )
+
+        with nav2:
+            save_clicked = st.form_submit_button(
+                "💾 保存本题评分",
+                use_container_width=True,
+                type="primary",
+            )
+
+        with nav3:
+            next_clicked = st.form_submit_button(
+                "下一条 ➡️",
+                use_container_width=True,
+                disabled=(next_idx < 0) or nav_locked,
+            )
+
+        if nav_locked:
+            st.caption("🔒 本题评分项或评语尚未填写完整并保存，保存后才能切换到上一条/下一条。")
+
+        draft_clicked = st.form_submit_button(
+            "📝 暂存草稿（不提交）",
+            use_container_width=True,
+            help="仅把当前填写内容暂存为草稿，不做完整性与排名检查；重新登录后自动恢复。"
+                 "表单内的输入在点击按钮前不会发送到服务器，关闭页面或断线会丢失未暂存的内容。",
+        )
+        # 表单控件在提交前不回传，草稿只能在点击按钮时写入，需在按钮旁明确提示
+        st.caption("⚠️ 填写内容只有在点击上方任一按钮时才会保存；评分耗时较长时请随时点击“📝 暂存草稿”，以免关闭页面后丢失。")
+
+    if prev_clicked:
+        action = "prev"
+    elif save_clicked:
+        action = "save"
+    elif next_clicked:
+        action = "next"
+    elif draft_clicked:
+        action = "draft"
+
+    return action
+
+
+# =========================
+# 页面展示
+# =========================
+def panel(height: Optional[int] = None):
+    # bordered_panels 配置下使用带边框（可选固定高度）的容器，否则直接平铺
+    if not get_profile()["bordered_panels"]:
+        return nullcontext()
+    if height is None:
+        return st.container(border=True)
+    return st.container(height=height, border=True)
+
+
+def display(message: Dict[str, Any], prev_idx: int, next_idx: int):
+    user_req = message.get("user_req", {}) or {}
+
+    with panel():
+        st.markdown("##### 👩‍🏫 用户原始需求")
+        st.info(f"**提问内容：**\n\n{user_req.get('query', '（空）')}")
+
+        qtype = format_inline_value(user_req.get("type", ""))
+        knowledge = format_inline_value(user_req.get("knowledge", ""))
+        constraint = format_inline_value(user_req.get("constraint", ""))
+
+        c1, c2, c3 = st.columns(3)
+        c1.markdown(f"**🎯 题型：** `{qtype if qtype else '-'}`")
+        c2.markdown(f"**📚 知识点：** `{knowledge if knowledge else '-'}`")
+        c3.markdown(f"**⚠️ 约束内容：** `{constraint if constraint else '-'}`")
+
+    st.write("")
+    col_left, col_right = st.columns([1.1, 1], gap="large")
+
+    with col_left:
+        st.markdown("##### 📊 模型输出区域")
+        with panel(PANEL_HEIGHT):
+            render_outputs(message)
+
+    with col_right:
+        st.markdown("##### ⭐ 评分区域")
+        with panel(PANEL_HEIGHT):
+            action = render_scoring_form(message, prev_idx, next_idx)
+
+    return action
+
+
+# =========================
+# 会话状态管理（按题目回收控件 key）
+# =========================
+def question_widget_keys(message: Dict[str, Any], qid: str) -> List[str]:
+    rids = list(responses_index(message).keys())
+    keys = [f"expandall_{safe_key(qid)}", f"{qid}_{USER_QUESTION_FIELD}"]
+
+    for group in get_schema()["groups"]:
+        gname = group["name"]
+        for sub in group["subdims"]:
+            sname = sub["name"]
+            keys += [f"{qid}_{safe_key(gname)}_{safe_key(sname)}_{rid}_mean" for rid in rids]
+        if group.get("need_comment", False):
+            keys += [f"{qid}_{safe_key(gname)}_comment_{rid}" for rid in rids]
+
+    rank_name = get_schema()["rank"]["name"]
+    keys += [f"{qid}_{safe_key(rank_name)}_{rid}" for rid in rids]
+    return keys
+
+
+def get_dirty_qids() -> set:
+    if SESSION_DIRTY_KEY not in st.session_state:
+        st.session_state[SESSION_DIRTY_KEY] = set()
+    return st.session_state[SESSION_DIRTY_KEY]
+
+
+def touch_question(qid: str):
+    # 当前题目的控件已渲染，视为可能存在未写回 data 的修改
+    if SESSION_VISITED_KEY not in st.session_state:
+        st.session_state[SESSION_VISITED_KEY] = []
+    visited = st.session_state[SESSION_VISITED_KEY]
+    if qid in visited:
+        visited.remove(qid)
+    visited.append(qid)
+    get_dirty_qids().add(qid)
+
+
+def gc_session_state(data: List[Dict[str, Any]], qid_to_index: Dict[str, int], keep_qid: str):
+    visited = st.session_state.get(SESSION_VISITED_KEY) or []
+    dirty = get_dirty_qids()
+
+    i = 0
+    while len(visited) > SESSION_QID_CAPACITY and i < len(visited):
+        qid = visited[i]
+        if qid == keep_qid or qid in dirty:
+            i += 1
+            continue
+
+        visited.pop(i)
+        idx = qid_to_index.get(qid)
+        if idx is None:
+            continue
+        for k in question_widget_keys(data[idx], qid):
+            if k in st.session_state:
+                del st.session_state[k]
+
+
+# =========================
+# 同步“用户自拟题目”到 data
+# =========================
+def _sync_user_designed_question_to_data(
+    data: List[Dict[str, Any]],
+    qid_to_index: Optional[Dict[str, int]] = None,
+):
+    if qid_to_index is None:
+        qid_to_index = {item.get("q_id", f"id_{i}"): i for i, item in enumerate(data)}
+
+    for qid in get_dirty_qids():
+        idx = qid_to_index.get(qid)
+        if idx is None:
+            continue
+        wkey_ud = f"{qid}_{USER_QUESTION_FIELD}"
+        if wkey_ud in st.session_state:
+            data[idx][USER_QUESTION_FIELD] = st.session_state.get(wkey_ud, "")
+
+
+# =========================
+# 保存函数
+# =========================
+@timed()
+def persist_all(file_path: str, data: List[Dict[str, Any]], qid_to_index: Optional[Dict[str, int]] = None):
+    _sync_user_designed_question_to_data(data, qid_to_index)
+    write_jsonl_atomic(file_path, data)
+    get_dirty_qids().clear()
+    st.cache_data.clear()
+
+
+# =========================
+# 草稿（未提交的控件值）
+# =========================
+@st.cache_resource(show_spinner=False)
+def _draft_writer() -> DraftWriter:
+    # 进程内共享一个后台写入线程
+    return DraftWriter()
+
+
+def load_session_drafts(file_path: str) -> Dict[str, Any]:
+    # 每个会话（含重新登录）首次打开该数据文件时读入草稿，之后以会话内副本为准
+    if st.session_state.get(SESSION_DRAFTS_PATH_KEY) != file_path:
+        st.session_state[SESSION_DRAFTS_KEY] = _draft_writer().load(draft_path(file_path))
+        st.session_state[SESSION_DRAFTS_PATH_KEY] = file_path
+    return st.session_state[SESSION_DRAFTS_KEY]
+
+
+def draft_default(qid: str, wkey: str, default: Any) -> Any:
+    # 控件首次创建时的默认值：有草稿时优先使用草稿，其次才是已保存的分数
+    draft = (st.session_state.get(SESSION_DRAFTS_KEY) or {}).get(qid)
+    if not draft:
+        return default
+    return draft["values"].get(wkey, default)
+
+
+def save_draft(file_path: str, message: Dict[str, Any], qid: str) -> bool:
+    # 只登记快照，写盘由后台线程完成，不阻塞本次重跑
+    values = {
+        k: st.session_state[k]
+        for k in question_widget_keys(message, qid)
+        if k in st.session_state and not k.startswith("expandall_")
+    }
+    if not values:
+        return False
+    draft = {"ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "values": values}
+    load_session_drafts(file_path)[qid] = draft
+    _draft_writer().put(draft_path(file_path), qid, draft)
+    return True
+
+
+def discard_draft(file_path: str, qid: str):
+    drafts = load_session_drafts(file_path)
+    if drafts.pop(qid, None) is not None:
+        _draft_writer().put(draft_path(file_path), qid, None)
+
+
+def render_draft_notice(drafts: Dict[str, Any], qid_to_index: Dict[str, int]):
+    if not drafts:
+        return
+    qids = [q for q in drafts if q in qid_to_index]
+    shown = "、".join(qids[:5]) + ("…" if len(qids) > 5 else "")
+    st.sidebar.warning(f"📝 已恢复 {len(qids)} 道题的未提交草稿：{shown}。提交该题评分后草稿自动清除。")
+    error = _draft_writer().last_error
+    if error:
+        st.sidebar.error(f"❌ 草稿写入失败：{error}")
+
+
+# =========================
+# SCHEMA 指纹
+# =========================
+def render_schema_notice(wq: Dict[str, Any], profile: Dict[str, Any]):
+    mismatched = wq["counts"].get("schema_mismatch", 0)
+    if not mismatched:
+        return
+    others = [describe_fingerprint(fp) for fp in wq["schemas"] if fp and fp != profile["fingerprint"]]
+    st.sidebar.warning(
+        f"⚠️ {mismatched} 道题的评分来自其他评测配置（SCHEMA 指纹 {'、'.join(others)}），"
+        f"与当前配置 {describe_fingerprint(profile['fingerprint'])} 不兼容，已归入“SCHEMA 不一致”队列。"
+    )
+
+
+# =========================
+# 坏行隔离
+# =========================
+REPAIR_REPORT_KEY = "_repair_report"
+REPAIR_REPORT_ROWS = 20
+
+
+@st.cache_resource(show_spinner=False)
+def _repair_lock() -> threading.Lock:
+    return threading.Lock()
+
+
+def quarantine_bad_lines(file_path: str, mtime: float, data: List[Dict[str, Any]], bad: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # 先把坏行追加到隔离文件并落盘，再用其余题目原子改写数据文件，之后的保存不会再遇到这些行。
+    # 多个会话读到同一份损坏文件时只由第一个处理；文件已被改写则返回 None，由调用方重新加载
+    with _repair_lock():
+        if get_file_mtime(file_path) != mtime:
+            return None
+        qpath = append_quarantine(file_path, bad)
+        write_jsonl_atomic(file_path, data)
+        st.cache_data.clear()
+    return {
+        "file": file_path,
+        "quarantine": qpath,
+        "kept": len(data),
+        "bad": bad,
+        "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def render_repair_report():
+    report = st.session_state.get(REPAIR_REPORT_KEY)
+    if not report:
+        return
+    bad = report["bad"]
+    st.warning(
+        f"⚠️ 数据文件中有 {len(bad)} 行无法解析，已移至 `{report['quarantine']}`；"
+        f"其余 {report['kept']} 道题目已正常加载（{report['ts']}）。如有缺失题目请联系管理员恢复。"
+    )
+    with st.expander("🩹 修复报告", expanded=False):
+        st.dataframe(
+            [
+                {"行号": r["line"], "字节偏移": r["offset"], "长度": r["length"], "错误": r["error"], "内容": r["raw"][:80]}
+                for r in bad[:REPAIR_REPORT_ROWS]
+            ],
+            hide_index=True,
+            use_container_width=True,
+        )
+        if len(bad) > REPAIR_REPORT_ROWS:
+            st.caption(f"… 其余 {len(bad) - REPAIR_REPORT_ROWS} 行见隔离文件。")
+        if st.button("✅ 知道了", key="_repair_report_ack"):
+            del st.session_state[REPAIR_REPORT_KEY]
+            st.rerun()
+
+
+# =========================
+# 修改历史（见 history.py）
+# =========================
+def record_history(file_path: str, entries: List[Optional[Dict[str, Any]]]):
+    # 数据文件已写回后再追加历史；历史写入失败不影响已保存的评分
+    try:
+        append_entries(history_path(file_path), [e for e in entries if e])
+    except Exception as e:
+        st.warning(f"⚠️ 修改历史写入失败：{str(e)}")
+
+
+# =========================
+# 侧边栏跳转列表（服务端检索 + 分页）
+# =========================
+def jump_entry_label(wq: Dict[str, Any], i: int, current: int) -> str:
+    mark = "✅" if "scored" in wq["flags"][i] else "⬜"
+    here = "　👈 当前" if i == current else ""
+    return f"{mark} {wq['qids'][i]}{here}"
+
+
+def render_jump_list(wq: Dict[str, Any], data: List[Dict[str, Any]], file_path: str, mtime: float, idx: int):
+    total = wq["n"]
+    query = st.sidebar.text_input(
+        "筛选题目",
+        key="_search_filter",
+        placeholder="如：q_012 / 氨气 / type:单选题 / 约束:临界",
+        label_visibility="collapsed",
+    )
+    if query.strip():
+        with span("search_index", n=total):
+            index = get_search_index(file_path, mtime, data)
+            matches = search(index, data, query)
+        st.sidebar.caption(f"匹配 {len(matches)} / {total} 道题")
+    else:
+        matches = range(total)
+
+    # 检索词变化时回到第一页；未筛选时默认显示当前题目所在页
+    if st.session_state.get(JUMP_QUERY_KEY) != query or JUMP_PAGE_KEY not in st.session_state:
+        st.session_state[JUMP_QUERY_KEY] = query
+        st.session_state[JUMP_PAGE_KEY] = 0 if query.strip() else idx // JUMP_PAGE_SIZE
+
+    n_pages = max(1, -(-len(matches) // JUMP_PAGE_SIZE))
+    page = max(0, min(st.session_state[JUMP_PAGE_KEY], n_pages - 1))
+    window = list(matches[page * JUMP_PAGE_SIZE:(page + 1) * JUMP_PAGE_SIZE])
+    if not window:
+        st.sidebar.caption("没有匹配的题目。")
+        return
+
+    # 选项为题目下标，浏览器端只收到当前页的标签
+    selected = st.sidebar.selectbox(
+        "选择题目 ID 跳转",
+        options=window,
+        index=window.index(idx) if idx in window else 0,
+        format_func=lambda i: jump_entry_label(wq, i, idx),
+        label_visibility="collapsed",
+    )
+
+    if n_pages > 1:
+        c1, c2, c3 = st.sidebar.columns([1, 2, 1])
+        if c1.button("◀", key="_jump_prev", disabled=page <= 0, use_container_width=True):
+            st.session_state[JUMP_PAGE_KEY] = page - 1
+            st.rerun()
+        c2.caption(f"第 {page + 1} / {n_pages} 页")
+        if c3.button("▶", key="_jump_next", disabled=page >= n_pages - 1, use_container_width=True):
+            st.session_state[JUMP_PAGE_KEY] = page + 1
+            st.rerun()
+
+    if st.sidebar.button("🚀 跳转到该题目", use_container_width=True):
+        st.session_state.page = selected
+        st.rerun()
+
+
+# =========================
+# 调试面板
+# =========================
+def render_debug_panel():
+    with st.sidebar.expander("🛠️ 调试：运行耗时", expanded=False):
+        st.checkbox("记录每次运行的耗时分解", value=enabled_by_env(), key=PROFILE_SESSION_KEY)
+
+        last = st.session_state.get(LAST_RERUN_TIMING_KEY)
+        if not last:
+            st.caption("暂无记录，开启后从下一次运行开始统计。")
+            return
+
+        st.caption(f"上一次运行：**{last['total_ms']:.1f} ms**（{last['ts']}）")
+        rows = [
+            {
+                "span": "　" * max(r["depth"], 0) + r["name"],
+                "次数": r["calls"],
+                "总耗时(ms)": r["total_ms"],
+                "最大(ms)": round(r["max_ms"], 3),
+            }
+            for r in summarize_spans(last["spans"])
+        ]
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        st.caption(f"指标日志：`{metrics_log_path()}`")
+
+
+# =========================
+# 主程序
+# =========================
+def main():
+    if "teacher_id" not in st.session_state:
+        st.title("🎯 题目质量评测系统")
+        st.markdown("👋 欢迎！请输入您的身份编号以开始评测（例如 `T001`）：")
+        teacher_input = st.text_input("身份编号", "")
+        if st.button("开始评测", type="primary") and teacher_input.strip():
+            st.session_state.teacher_id = teacher_input.strip().upper()
+            st.rerun()
+        return
+
+    teacher_id = st.session_state.teacher_id
+    profile = get_profile()
+    file_path = resolve_data_path(profile["data_file_template"].format(teacher_id=teacher_id))
+
+    if "page" not in st.session_state:
+        st.session_state.page = 0
+
+    try:
+        mtime = get_file_mtime(file_path)
+        with span("read_jsonl_cached"):
+            data, bad_lines = read_jsonl_cached(file_path, mtime)
+    except FileNotFoundError:
+        st.error(f"❌ 未找到编号 `{teacher_id}` 对应的数据文件：`{file_path}`。请联系管理员或先转换生成。")
+        if st.button("重新输入编号"):
+            del st.session_state.teacher_id
+            st.rerun()
+        return
+    except Exception as e:
+        st.error(f"❌ 读取 JSONL 失败：{str(e)}")
+        return
+
+    if bad_lines:
+        # 隔离失败时不继续：否则之后的保存会在未备份的情况下丢掉这些行
+        try:
+            report = quarantine_bad_lines(file_path, mtime, data, bad_lines)
+        except Exception as e:
+            st.error(f"❌ 数据文件中有 {len(bad_lines)} 行无法解析，隔离坏行失败：{str(e)}")
+            return
+        if report is None:
+            st.rerun()
+        st.session_state[REPAIR_REPORT_KEY] = report
+        mtime = get_file_mtime(file_path)
+
+    with span("preassign_blind_maps"):
+        changed = preassign_blind_maps(data, teacher_id)
+    if changed:
+        try:
+            persist_all(file_path, data)
+            mtime = get_file_mtime(file_path)
+        except Exception as e:
+            st.error(f"❌ 写入盲评顺序失败：{str(e)}")
+            return
+
+    total = len(data)
+    wq = get_work_queues(file_path, mtime, data, teacher_id)
+    qid_to_index = wq["qid_to_index"]
+    drafts = load_session_drafts(file_path)
+    done = wq["counts"]["scored"]
+    rate = (done / total) * 100 if total else 0
+
+    st.sidebar.markdown("## 📊 评测进度")
+    st.sidebar.progress(rate / 100 if rate <= 100 else 1.0)
+    col_s1, col_s2 = st.sidebar.columns(2)
+    col_s1.metric("已完成", done)
+    col_s2.metric("总题目", total)
+
+    if total == 0:
+        render_repair_report()
+        st.warning(f"⚠️ 数据文件为空：`{file_path}`")
+        if st.button("重新输入编号"):
+            del st.session_state.teacher_id
+            st.rerun()
+        return
+
+    render_draft_notice(drafts, qid_to_index)
+    render_schema_notice(wq, profile)
+
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### 📋 工作队列")
+    queue_labels = dict(work_queue_defs())
+    queue = st.sidebar.selectbox(
+        "工作队列",
+        options=list(queue_labels.keys()),
+        format_func=lambda name: f"{queue_labels[name]}（{wq['counts'][name]}）",
+        key=QUEUE_SESSION_KEY,
+        label_visibility="collapsed",
+    )
+    st.sidebar.caption("“上一条 / 下一条”只在所选队列内切换。")
+
+    total_pages = len(data)
+    idx = max(0, min(st.session_state.page, total_pages - 1))
+    st.session_state.page = idx
+
+    prev_idx, next_idx = work_queue_neighbors(wq, queue, idx)
+    if not in_work_queue(wq, queue, idx):
+        first = work_queue_first(wq, queue)
+        st.sidebar.info(f"当前题目不在“{queue_labels[queue]}”队列中。")
+        if first >= 0 and st.sidebar.button("⏭️ 跳到队列第一题", use_container_width=True):
+            st.session_state.page = first
+            st.rerun()
+
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### 🧭 快速跳转")
+    render_jump_list(wq, data, file_path, mtime, idx)
+
+    render_debug_panel()
+
+    current = data[idx]
+    qid = current.get("q_id", f"id_{idx}")
+    touch_question(qid)
+    gc_session_state(data, qid_to_index, keep_qid=qid)
+
+    st.title("🎯 题目质量评估工作台")
+    subject = f" &nbsp; | &nbsp; **学科：** `{profile['subject']}`" if profile["subject"] else ""
+    st.markdown(
+        f"**身份编号：** `{teacher_id}`{subject} &nbsp; | &nbsp; **当前进度：** 第 `{idx + 1}` / `{total_pages}` 条 &nbsp; | &nbsp; **题目 ID：** `{qid}`"
+    )
+    render_repair_report()
+    if "schema_mismatch" in wq["flags"][idx]:
+        fp = annotation_fingerprint(get_teacher_annotation_readonly(current, teacher_id))
+        st.warning(f"⚠️ 本题评分来自其他评测配置（SCHEMA 指纹 {describe_fingerprint(fp)}），建议先用 migrate_schema.py 迁移；在此保存将按当前配置重新记录本题评分。")
+    st.divider()
+
+    action = display(current, prev_idx, next_idx)
+
+    if action == "draft":
+        if save_draft(file_path, current, qid):
+            st.success(f"📝 草稿已暂存，尚未提交评分。({datetime.now().strftime('%H:%M:%S')})")
+    elif action in {"save", "prev", "next"}:
+        if profile["enforce_unique_ranks"] and not ranks_unique_for_current(current, teacher_id):
+            save_draft(file_path, current, qid)
+            st.error("❌ 排名存在重复，请先修正排名后再保存或切换（已暂存为草稿）。")
+        else:
+            try:
+                before = scores_snapshot(current, teacher_id)
+                fp_before = schema_fp(current, teacher_id)
+                apply_scoring_form_to_message(current)
+                persist_all(file_path, data, qid_to_index)
+                refresh_work_queue(file_path, current, idx, teacher_id)
+                discard_draft(file_path, qid)
+                record_history(file_path, [make_entry("save", current, teacher_id, before, fp_before)])
+
+                if action == "save":
+                    st.success(f"✅ 本题评分已保存！({datetime.now().strftime('%H:%M:%S')})")
+                    st.rerun()
+                elif action in ("prev", "next"):
+                    # 保存后本题可能移出所选队列，但相邻成员不受影响
+                    target = prev_idx if action == "prev" else next_idx
+                    st.session_state.page = target if target >= 0 else idx
+                    st.rerun()
+            except Exception as e:
+                save_draft(file_path, current, qid)
+                st.error(f"❌ 保存评分失败（已暂存为草稿）：{str(e)}")
+
+    if not is_question_scored(current, teacher_id):
+        if profile["stages"]:
+            order = " → ".join([s["group"] for s in profile["stages"]] + ["其余维度"])
+            cond = STAGE_RULES[profile["stage_rule"]]["cond"]
+            st.warning(
+                f"⚠️ 当前题目尚未完成评测。评测顺序为：{order}。"
+                f"若前序阶段{cond}，后续未评维度将自动记为 -1。请先点击“保存本题评分”，再切换题目。"
+            )
+        else:
+            st.warning("⚠️ 当前题目尚未完成评测。请先点击“保存本题评分”，再切换题目。")
+    else:
+        st.success("✅ 当前题目评分已完善！")
+
+    st.markdown("---")
+
+    col_bot_left, col_bot_right = st.columns([3, 2], gap="large")
+
+    with col_bot_left:
+        st.markdown("#### 💡 附加信息录入")
+        prev_ud = current.get(USER_QUESTION_FIELD, "")
+        with st.form(key=f"user_question_form_{qid}", clear_on_submit=False):
+            wkey_ud = f"{qid}_{USER_QUESTION_FIELD}"
+            st.text_area(
+                "用户自拟题目（可选）",
+                value=draft_default(qid, wkey_ud, prev_ud),
+                key=wkey_ud,
+                height=135,
+                placeholder="✍️ 若用户能自行设计更优题目，请在此录入；也可留空。",
+                label_visibility="collapsed",
+            )
+            ud_submit = st.form_submit_button("💾 保存附加信息", use_container_width=False)
+
+        if ud_submit:
+            try:
+                persist_all(file_path, data, qid_to_index)
+                refresh_work_queue(file_path, current, idx, teacher_id)
+                st.success(f"✅ 附加信息已保存！({datetime.now().strftime('%H:%M:%S')})")
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ 保存附加信息失败：{str(e)}")
+
+    with col_bot_right:
+        st.markdown("#### ⚙️ 其他操作")
+        st.write("")
+        if st.button("🔄 刷新当前页", use_container_width=True):
+            st.cache_data.clear()
+            st.rerun()
+
+        st.write("")
+        if st.button(
+            "↩️ 撤销本题上次保存",
+            use_container_width=True,
+            disabled=undo_target(history_path(file_path), qid) is None,
+        ):
+            try:
+                undo = undo_last(current, history_path(file_path))
+                invalidate_stage_status(qid)
+                persist_all(file_path, data, qid_to_index)
+                refresh_work_queue(file_path, current, idx, teacher_id)
+                record_history(file_path, [undo])
+                # 控件仍持有撤销前的值，清掉后按恢复的分数重新渲染
+                for k in question_widget_keys(current, qid):
+                    st.session_state.pop(k, None)
+                discard_draft(file_path, qid)
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ 撤销失败：{str(e)}")
+
+        st.write("")
+        if st.button("📥 导出全部评分结果 (JSONL)", use_container_width=True):
+            try:
+                _sync_user_designed_question_to_data(data, qid_to_index)
+                jsonl_str = "\n".join(json.dumps(it, ensure_ascii=False) for it in data)
+                b64 = base64.b64encode(jsonl_str.encode("utf-8")).decode()
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"出题评分结果_{teacher_id}_{timestamp}.jsonl"
+                href = (
+                    f'<a href="data:application/json;base64,{b64}" download="{filename}" style="text-decoration:none;">'
+                    f'<div style="text-align:center; padding:8px; background-color:#f0f2f6; border-radius:4px; color:#31333F;">'
+                    f'👉 点击下载 {filename}</div></a>'
+                )
+                st.markdown(href, unsafe_allow_html=True)
+            except Exception as e:
+                st.error(f"❌ 导出失败：{str(e)}")
+
+
+def run_app(profile_name: Optional[str] = None):
+    # 优先使用 URL 参数 ?profile=<名称>，其次是入口脚本指定的配置，最后是 profiles.json 的默认配置
+    requested = st.query_params.get(PROFILE_QUERY_PARAM) or profile_name
+    try:
+        profile = set_active_profile(requested)
+    except Exception as e:
+        st.set_page_config(page_title="题目评测系统", page_icon="🎯", layout="wide")
+        st.error(f"❌ 加载评测配置失败：{str(e)}")
+        return
+
+    begin_rerun_memo()
+    st.set_page_config(page_title=profile["title"], page_icon="🎯", layout="wide")
+    st.markdown(
+        """
+        <style>
+            .block-container {
+                padding-top: 2rem !important;
+                padding-bottom: 2rem !important;
+                padding-left: 3rem;
+                padding-right: 3rem;
+            }
+            #MainMenu {visibility: hidden;}
+            footer {visibility: hidden;}
+        </style>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    begin_rerun(
+        enabled=enabled_by_env() or st.session_state.get(PROFILE_SESSION_KEY, False),
+        teacher_id=st.session_state.get("teacher_id", ""),
+        profile=profile["name"],
+    )
+    try:
+        main()
+    finally:
+        timing = end_rerun()
+        if timing is not None:
+            st.session_state[LAST_RERUN_TIMING_KEY] = timing
+
+
+if __name__ == "__main__":
+    run_app()
@@ -0,0 +1,372 @@
+import argparse
+import copy
+import json
+import os
+import re
+import sys
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from merge_annotations import iter_jsonl
+from schemas import SCHEMA_FP_FIELD, annotation_fingerprint
+
+
+# =========================
+# 全局配置
+# =========================
+# 修改历史与数据文件放在一起：data_T001.jsonl -> data_T001.jsonl.history（不会被 data_*.jsonl 匹配到）
+HISTORY_FILE_SUFFIX = ".history"
+TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# 每条记录只保存 annotations[teacher_id].scores 中发生变化的 key：
+# {"ts", "q_id", "teacher_id", "op", "before": {rid: {key: 旧值}}, "after": {rid: {key: 新值}}, "new_rids": [...]}
+# 某一侧缺少该 key 表示该侧不存在此 key；op 为 save / api / undo / restore / migrate（migrate_schema.py），
+# undo 另含 undo_of（被撤销记录的偏移）。每条记录另含 schema_fp_before（修改前的 SCHEMA 指纹，"" 为没有指纹），
+# 撤回时随评分一并恢复；早期记录没有该字段，撤回时不改指纹
+OPS = ("save", "api", "undo", "restore", "migrate")
+
+# 记录的前几个字段顺序固定，建索引时只解析行首，无需 json.loads 整行
+HEAD_RE = re.compile(rb'^\{"ts": "([^"]*)", "q_id": "((?:[^"\\]|\\.)*)", "teacher_id": "(?:[^"\\]|\\.)*", "op": "(\w+)"(?:, "undo_of": (\d+))?')
+
+
+def history_path(data_path: str) -> str:
+    return data_path + HISTORY_FILE_SUFFIX
+
+
+def now_ts() -> str:
+    return datetime.now().strftime(TS_FORMAT)
+
+
+def parse_ts(s: str) -> str:
+    # 接受 2026-10-19、2026-10-19 08:30、2026-10-19T08:30:00 等写法，统一成记录中的格式以便直接比较
+    return datetime.fromisoformat(s.strip()).strftime(TS_FORMAT)
+
+
+# =========================
+# 增量
+# =========================
+# 本模块由 engine 导入（界面保存时记录历史），因此不反向依赖 engine
+def teacher_scores(message: Dict[str, Any], teacher_id: str) -> Dict[str, Any]:
+    t_ann = (message.get("annotations") or {}).get(teacher_id)
+    scores = t_ann.get("scores") if isinstance(t_ann, dict) else None
+    return scores if isinstance(scores, dict) else {}
+
+
+def scores_snapshot(message: Dict[str, Any], teacher_id: str) -> Dict[str, Any]:
+    return copy.deepcopy(teacher_scores(message, teacher_id))
+
+
+def schema_fp(message: Dict[str, Any], teacher_id: str) -> str:
+    return annotation_fingerprint((message.get("annotations") or {}).get(teacher_id))
+
+
+def scores_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    d_before: Dict[str, Dict[str, Any]] = {}
+    d_after: Dict[str, Dict[str, Any]] = {}
+    for rid in set(before) | set(after):
+        bm = before.get(rid) or {}
+        am = after.get(rid) or {}
+        for k in set(bm) | set(am):
+            if k in bm and k in am and bm[k] == am[k]:
+                continue
+            if k in bm:
+                d_before.setdefault(rid, {})[k] = bm[k]
+            if k in am:
+                d_after.setdefault(rid, {})[k] = am[k]
+
+    new_rids = sorted(rid for rid in after if rid not in before)
+    if not d_before and not d_after and not new_rids:
+        return None
+    return {"before": d_before, "after": d_after, "new_rids": new_rids}
+
+
+def make_entry(
+    op: str, message: Dict[str, Any], teacher_id: str, before: Dict[str, Any], schema_fp_before: str, **extra
+) -> Optional[Dict[str, Any]]:
+    # before / schema_fp_before 为修改前的 scores 快照与指纹；评分与指纹都没有变化时返回 None（不记录），
+    # 只有指纹变化时记一条空增量的记录，撤回时恢复指纹
+    delta = scores_delta(before, teacher_scores(message, teacher_id))
+    if delta is None:
+        if schema_fp(message, teacher_id) == schema_fp_before:
+            return None
+        delta = {"before": {}, "after": {}, "new_rids": []}
+    return {"ts": now_ts(), "q_id": message.get("q_id", ""), "teacher_id": teacher_id, "op": op, **extra,
+            "schema_fp_before": schema_fp_before, **delta}
+
+
+def _delta_keys(entry: Dict[str, Any]) -> List[Tuple[str, str]]:
+    keys = set()
+    for side in ("before", "after"):
+        for rid, ms in (entry.get(side) or {}).items():
+            keys.update((rid, k) for k in ms)
+    return sorted(keys)
+
+
+def revert_entry(message: Dict[str, Any], entry: Dict[str, Any], force: bool = False) -> List[str]:
+    # 把 message 中该记录涉及的 key 恢复为修改前的值；当前值与记录的修改后值不一致
+    # （记录之后又被其他途径改过）时返回冲突列表，force=False 时不做任何修改。
+    # 只改 scores 与 SCHEMA 指纹，界面中调用后需自行 invalidate_stage_status
+    teacher_id = entry["teacher_id"]
+    scores = teacher_scores(message, teacher_id)
+    before = entry.get("before") or {}
+    after = entry.get("after") or {}
+    missing = object()
+
+    keys = _delta_keys(entry)
+    conflicts = [
+        f"{rid}.{k}"
+        for rid, k in keys
+        if (scores.get(rid) or {}).get(k, missing) != after.get(rid, {}).get(k, missing)
+    ]
+    if conflicts and not force:
+        return conflicts
+
+    t_ann = message.setdefault("annotations", {}).setdefault(teacher_id, {})
+    scores_root = t_ann.setdefault("scores", {})
+    for rid, k in keys:
+        ms = scores_root.setdefault(rid, {})
+        if k in before.get(rid, {}):
+            ms[k] = copy.deepcopy(before[rid][k])
+        else:
+            ms.pop(k, None)
+    for rid in entry.get("new_rids") or []:
+        if not scores_root.get(rid):
+            scores_root.pop(rid, None)
+    if "schema_fp_before" in entry:
+        # 指纹一并恢复，评分与指纹保持一致
+        if entry["schema_fp_before"]:
+            t_ann[SCHEMA_FP_FIELD] = entry["schema_fp_before"]
+        else:
+            t_ann.pop(SCHEMA_FP_FIELD, None)
+    return conflicts
+
+
+# =========================
+# 追加写入与按 q_id 索引
+# =========================
+_index_lock = threading.Lock()
+_indexes: Dict[str, Dict[str, Any]] = {}
+
+
+def append_entries(log_path: str, entries: List[Dict[str, Any]]):
+    # 追加写：一次 write 写完整批记录（O_APPEND 保证多个进程并发追加时不会互相覆盖）
+    payload = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries if e)
+    if not payload:
+        return
+    fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, payload.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+def history_index(log_path: str) -> Dict[str, Any]:
+    # 日志只追加，索引按已读到的字节位置增量扩展；文件被替换或截断时重建。
+    # by_qid: q_id -> [(偏移, op, undo_of)]；times / offsets 按写入顺序排列
+    with _index_lock:
+        try:
+            stat = os.stat(log_path)
+        except FileNotFoundError:
+            _indexes.pop(log_path, None)
+            return {"size": 0, "ino": None, "by_qid": {}, "times": [], "offsets": []}
+
+        idx = _indexes.get(log_path)
+        if idx is None or idx["ino"] != stat.st_ino or stat.st_size < idx["size"]:
+            idx = {"size": 0, "ino": stat.st_ino, "by_qid": {}, "times": [], "offsets": []}
+            _indexes[log_path] = idx
+
+        if stat.st_size > idx["size"]:
+            pos = idx["size"]
+            with open(log_path, "rb") as f:
+                f.seek(pos)
+                for line in f:
+                    # 末尾不完整的一行（正在写入）留到下一次再读
+                    if not line.endswith(b"\n"):
+                        break
+                    m = HEAD_RE.match(line)
+                    try:
+                        if m:
+                            qid = m.group(2).decode("utf-8")
+                            if "\\" in qid:
+                                qid = json.loads(f'"{qid}"')
+                            ts, op = m.group(1).decode("utf-8"), m.group(3).decode("utf-8")
+                            undo_of = int(m.group(4)) if m.group(4) else None
+                        else:
+                            e = json.loads(line)
+                            qid, ts, op, undo_of = e["q_id"], e["ts"], e["op"], e.get("undo_of")
+                        idx["by_qid"].setdefault(qid, []).append((pos, op, undo_of))
+                        idx["times"].append(ts)
+                        idx["offsets"].append(pos)
+                    except Exception:
+                        pass
+                    pos += len(line)
+            idx["size"] = pos
+        return idx
+
+
+def read_entry(log_path: str, offset: int) -> Dict[str, Any]:
+    with open(log_path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+
+def read_entries(log_path: str, offsets: List[int]) -> List[Dict[str, Any]]:
+    out = []
+    with open(log_path, "rb") as f:
+        for off in offsets:
+            f.seek(off)
+            out.append(json.loads(f.readline()))
+    return out
+
+
+def question_history(log_path: str, qid: str) -> List[Dict[str, Any]]:
+    return read_entries(log_path, [off for off, _, _ in history_index(log_path)["by_qid"].get(qid, [])])
+
+
+# =========================
+# 撤销 / 按时间点恢复
+# =========================
+def undo_target(log_path: str, qid: str) -> Optional[int]:
+    # 从后往前找最近一条尚未被撤销的修改；撤销记录本身不可再撤销，连续撤销即逐条回退
+    undone = set()
+    for off, op, undo_of in reversed(history_index(log_path)["by_qid"].get(qid, [])):
+        if op == "undo":
+            undone.add(undo_of)
+        elif off not in undone:
+            return off
+    return None
+
+
+def undo_last(message: Dict[str, Any], log_path: str, force: bool = False) -> Dict[str, Any]:
+    # 在 message 上撤销该题最近一次修改，返回待追加的 undo 记录；调用方写回数据文件后再 append_entries
+    qid = message.get("q_id", "")
+    off = undo_target(log_path, qid)
+    if off is None:
+        raise ValueError(f"题目 {qid} 没有可撤销的修改记录")
+
+    entry = read_entry(log_path, off)
+    before = scores_snapshot(message, entry["teacher_id"])
+    fp_before = schema_fp(message, entry["teacher_id"])
+    conflicts = revert_entry(message, entry, force=force)
+    if conflicts and not force:
+        raise ValueError(f"题目 {qid} 在 {entry['ts']} 之后又被修改过（{'、'.join(conflicts[:5])}），未撤销")
+    undo = make_entry("undo", message, entry["teacher_id"], before, fp_before, undo_of=off, undo_ts=entry["ts"])
+    if undo is None:
+        # 被撤销的修改与当前值一致却没有产生变化（force 下的极端情况），仍记录以推进撤销栈
+        undo = {"ts": now_ts(), "q_id": qid, "teacher_id": entry["teacher_id"], "op": "undo", "undo_of": off,
+                "undo_ts": entry["ts"], "schema_fp_before": fp_before, "before": {}, "after": {}, "new_rids": []}
+    return undo
+
+
+def restore_to(data: List[Dict[str, Any]], log_path: str, at: str, force: bool = False) -> List[Dict[str, Any]]:
+    # 把整个文件的评分恢复到时间点 at：按写入顺序倒序撤回 at 之后的全部记录（含撤销记录）。
+    # 返回每道受影响题目一条 restore 记录（待追加）；任一冲突且未 force 时抛出 ValueError，data 不变
+    at = parse_ts(at)
+    idx = history_index(log_path)
+    offsets = [off for ts, off in zip(idx["times"], idx["offsets"]) if ts > at]
+    if not offsets:
+        return []
+
+    entries = read_entries(log_path, offsets)
+    qid_to_index = {item.get("q_id", f"id_{i}"): i for i, item in enumerate(data)}
+
+    # 先在副本上回退，全部成功后再替换，保证冲突时 data 保持原样
+    work: Dict[int, Dict[str, Any]] = {}
+    before: Dict[int, Dict[str, Tuple[Dict[str, Any], str]]] = {}
+    conflicts = []
+    for entry in reversed(entries):
+        i = qid_to_index.get(entry["q_id"])
+        if i is None:
+            continue
+        if i not in work:
+            work[i] = dict(data[i])
+            work[i]["annotations"] = copy.deepcopy(data[i].get("annotations") or {})
+        tid = entry["teacher_id"]
+        if tid not in before.setdefault(i, {}):
+            before[i][tid] = (scores_snapshot(work[i], tid), schema_fp(work[i], tid))
+        c = revert_entry(work[i], entry, force=True)
+        conflicts += [f"{entry['q_id']}:{x}" for x in c]
+
+    if conflicts and not force:
+        raise ValueError(f"共 {len(conflicts)} 处当前值与历史记录不一致（{'、'.join(conflicts[:5])}），未恢复")
+
+    out = []
+    for i, msg in work.items():
+        data[i] = msg
+        for tid, (snap, fp) in before[i].items():
+            e = make_entry("restore", msg, tid, snap, fp, restore_to=at)
+            if e is not None:
+                out.append(e)
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from engine import write_jsonl_atomic
+
+    parser = argparse.ArgumentParser(description="评分修改历史：查看、撤销单题上次保存、把整个数据文件恢复到某一时间点。")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_log = sub.add_parser("log", help="列出修改记录")
+    p_log.add_argument("data_file")
+    p_log.add_argument("--q-id", default=None, help="只看某一道题")
+    p_log.add_argument("--limit", type=int, default=50, help="最多列出最近多少条（0 为不限）")
+
+    p_undo = sub.add_parser("undo", help="撤销某道题最近一次修改")
+    p_undo.add_argument("data_file")
+    p_undo.add_argument("q_id")
+    p_undo.add_argument("--force", action="store_true", help="即使之后又被修改过也强制撤销")
+
+    p_res = sub.add_parser("restore", help="把整个数据文件的评分恢复到某一时间点")
+    p_res.add_argument("data_file")
+    p_res.add_argument("--at", required=True, help="时间点，如 2026-10-19 08:30:00")
+    p_res.add_argument("--force", action="store_true", help="存在冲突时仍然恢复")
+    p_res.add_argument("--dry-run", action="store_true", help="只报告将要恢复的题目，不写回")
+
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.data_file):
+        print(f"❌ 未找到数据文件：{args.data_file}", file=sys.stderr)
+        return 1
+    log_path = history_path(args.data_file)
+
+    if args.cmd == "log":
+        idx = history_index(log_path)
+        if args.q_id:
+            offsets = [off for off, _, _ in idx["by_qid"].get(args.q_id, [])]
+        else:
+            offsets = list(idx["offsets"])
+        if args.limit > 0:
+            offsets = offsets[-args.limit:]
+        for off, e in zip(offsets, read_entries(log_path, offsets)):
+            n = len(_delta_keys(e))
+            extra = f"  ← 撤销 {e.get('undo_ts', '')}" if e["op"] == "undo" else ""
+            print(f"{e['ts']}  @{off:<10} {e['op']:<8} {e['q_id']:<16} {e['teacher_id']:<8} {n} 个 key{extra}")
+        print(f"共 {len(idx['offsets'])} 条记录", file=sys.stderr)
+        return 0
+
+    data = list(iter_jsonl(args.data_file))
+    try:
+        if args.cmd == "undo":
+            i = next((i for i, it in enumerate(data) if it.get("q_id") == args.q_id), None)
+            if i is None:
+                print(f"❌ 未找到题目：{args.q_id}", file=sys.stderr)
+                return 1
+            new_entries = [undo_last(data[i], log_path, force=args.force)]
+        else:
+            new_entries = restore_to(data, log_path, args.at, force=args.force)
+    except ValueError as e:
+        print(f"❌ {str(e)}", file=sys.stderr)
+        return 1
+
+    if args.cmd == "restore" and args.dry_run:
+        print(f"✅ 将恢复 {len(new_entries)} 道题：{'、'.join(e['q_id'] for e in new_entries)}")
+        return 0
+    if new_entries:
+        write_jsonl_atomic(args.data_file, data)
+        append_entries(log_path, new_entries)
+    print(f"✅ 已{'撤销' if args.cmd == 'undo' else '恢复'} {len(new_entries)} 道题的评分：{'、'.join(e['q_id'] for e in new_entries)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+
+# =========================
+# 全局配置
+# =========================
+PROFILE_ENV = "AGQ_PROFILE"
+METRICS_LOG_ENV = "AGQ_METRICS_LOG"
+DEFAULT_METRICS_LOG = "metrics_spans.jsonl"
+
+# 每个 Streamlit 会话在独立线程中执行脚本，span 记录按线程隔离
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def enabled_by_env() -> bool:
+    return os.environ.get(PROFILE_ENV, "").strip().lower() not in ("", "0", "false", "no")
+
+
+def metrics_log_path() -> str:
+    return os.environ.get(METRICS_LOG_ENV, "") or DEFAULT_METRICS_LOG
+
+
+def is_enabled() -> bool:
+    return getattr(_local, "enabled", False)
+
+
+# =========================
+# span 记录
+# =========================
+def begin_rerun(enabled: bool, **context):
+    _local.enabled = bool(enabled)
+    _local.spans = []
+    _local.depth = 0
+    _local.context = context
+    _local.rerun_id = uuid.uuid4().hex[:12]
+    _local.started = time.perf_counter()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    if not is_enabled():
+        yield
+        return
+
+    depth = _local.depth
+    _local.depth = depth + 1
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _local.depth = depth
+        rec = {"name": name, "ms": round((time.perf_counter() - t0) * 1000, 3), "depth": depth}
+        if attrs:
+            rec.update(attrs)
+        _local.spans.append(rec)
+
+
+def timed(name: Optional[str] = None):
+    def deco(fn):
+        span_name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
+
+def end_rerun(log_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    if not is_enabled():
+        return None
+
+    total_ms = round((time.perf_counter() - _local.started) * 1000, 3)
+    result = {
+        "rerun_id": _local.rerun_id,
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "total_ms": total_ms,
+        "context": dict(_local.context),
+        "spans": list(_local.spans),
+    }
+    _local.enabled = False
+
+    path = log_path or metrics_log_path()
+    lines = [
+        json.dumps(
+            {"rerun_id": result["rerun_id"], "ts": result["ts"], **result["context"], **s},
+            ensure_ascii=False,
+        )
+        for s in result["spans"] + [{"name": "rerun", "ms": total_ms, "depth": -1}]
+    ]
+    try:
+        with _log_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+    except OSError:
+        # 指标日志写失败不能影响评测流程
+        pass
+    return result
+
+
+def summarize_spans(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    agg: Dict[str, Dict[str, Any]] = {}
+    for s in spans:
+        a = agg.setdefault(s["name"], {"name": s["name"], "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "depth": s["depth"]})
+        a["calls"] += 1
+        a["total_ms"] += s["ms"]
+        a["max_ms"] = max(a["max_ms"], s["ms"])
+        a["depth"] = min(a["depth"], s["depth"])
+    out = sorted(agg.values(), key=lambda a: -a["total_ms"])
+    for a in out:
+        a["total_ms"] = round(a["total_ms"], 3)
+    return out
+
+
+# =========================
+# 离线分位数统计
+# =========================
+def percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def latency_report(path: str) -> List[Dict[str, Any]]:
+    # 同一次运行中同名 span 先求和，再按运行统计分位数
+    per_rerun: Dict[str, Dict[str, float]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            by_name = per_rerun.setdefault(rec["rerun_id"], {})
+            by_name[rec["name"]] = by_name.get(rec["name"], 0.0) + float(rec["ms"])
+
+    samples: Dict[str, List[float]] = {}
+    for by_name in per_rerun.values():
+        for name, ms in by_name.items():
+            samples.setdefault(name, []).append(ms)
+
+    out = []
+    for name, vals in samples.items():
+        vals.sort()
+        out.append({
+            "name": name,
+            "n": len(vals),
+            "p50_ms": round(percentile(vals, 0.50), 3),
+            "p90_ms": round(percentile(vals, 0.90), 3),
+            "p99_ms": round(percentile(vals, 0.99), 3),
+            "max_ms": round(vals[-1], 3),
+        })
+    out.sort(key=lambda r: -r["p50_ms"])
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="按 span 名称统计指标日志中的延迟分位数。")
+    parser.add_argument("log", nargs="?", default=None, help=f"指标日志（默认：{DEFAULT_METRICS_LOG}）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    args = parser.parse_args(argv)
+
+    path = args.log or metrics_log_path()
+    if not os.path.exists(path):
+        print(f"❌ 未找到指标日志：{path}", file=sys.stderr)
+        return 1
+
+    report = latency_report(path)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"{'span':<32}{'n':>8}{'p50(ms)':>12}{'p90(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+    for r in report:
+        print(f"{r['name']:<32}{r['n']:>8}{r['p50_ms']:>12.2f}{r['p90_ms']:>12.2f}{r['p99_ms']:>12.2f}{r['max_ms']:>12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
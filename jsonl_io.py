@@ -0,0 +1,292 @@
+import gzip
+import io
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import IO, Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖：仅读写 .zst 文件时需要（pip install zstandard）
+    zstandard = None
+
+
+# =========================
+# 全局配置
+# =========================
+# 数据文件按后缀透明压缩：data_T001.jsonl / data_T001.jsonl.gz / data_T001.jsonl.zst
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+# 查找数据文件时依次尝试的后缀（未压缩优先）
+DATA_FILE_SUFFIXES = ["", ".gz", ".zst"]
+
+# 界面每次保存都整文件重写，压缩级别取偏快的一档：
+# gzip 1 级约为 6 级压缩耗时的 1/3，体积只大 20% 左右；zstd 3 级为其默认级别
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+# 并行分块解析：文件按换行边界切成字节区间，由进程池解析。
+# 小文件单进程更快（进程启动与结果回传的开销），自动模式下低于阈值不开进程池
+PARALLEL_MIN_BYTES = 64 << 20
+CHUNK_BYTES = 8 << 20
+# 每个进程最多排队的块数，限制流式读取时已解析未消费的内存
+INFLIGHT_PER_WORKER = 2
+
+# 无法解析的行移到数据文件旁的隔离文件：data_T001.jsonl -> data_T001.jsonl.quarantine（不会被 data_*.jsonl 匹配到）
+QUARANTINE_SUFFIX = ".quarantine"
+
+
+def compression_of(path: str) -> Optional[str]:
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def _require_zstd(path: str):
+    if zstandard is None:
+        raise RuntimeError(f"读写 {os.path.basename(path)} 需要安装 zstandard（pip install zstandard）")
+
+
+def open_text(path: str, mode: str = "r", compression: Optional[str] = None) -> IO[str]:
+    # 以 UTF-8 文本方式打开，按后缀流式解压 / 压缩；mode 为 "r" 或 "w"。
+    # 写临时文件（如 x.jsonl.gz.tmp）时由调用方通过 compression 指定目标文件的格式
+    if mode not in ("r", "w"):
+        raise ValueError(f"不支持的打开方式：{mode}")
+    if compression is None:
+        compression = compression_of(path)
+
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=GZIP_LEVEL)
+    if compression == "zstd":
+        _require_zstd(path)
+        if mode == "r":
+            return zstandard.open(path, "rt", encoding="utf-8")
+        return zstandard.open(path, "wt", cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL), encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def resolve_data_path(path: str) -> str:
+    # 模板给出未压缩文件名；该文件不存在时依次尝试 .gz / .zst，都不存在则原样返回
+    if compression_of(path) is not None:
+        return path
+    for suffix in DATA_FILE_SUFFIXES:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+
+# =========================
+# 容错读取 / 隔离坏行
+# =========================
+def open_binary(path: str) -> BinaryIO:
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        _require_zstd(path)
+        return zstandard.open(path, "rb")
+    return open(path, "rb")
+
+
+def _parse_lines(
+    lines: Iterable[bytes],
+    offset: int,
+    items: List[Dict[str, Any]],
+    bad: List[Dict[str, Any]],
+    linenos: Optional[List[int]] = None,
+) -> int:
+    # 逐行按字节解析，坏行（非 UTF-8、非 JSON、不是对象）跳过并记录；offset 为首行的字节偏移，
+    # 行号从 1 起算（分块解析时由调用方加上前面各块的行数）。linenos 非 None 时记录每道题的行号。
+    # 返回处理的行数
+    loads = json.loads
+    lineno = 0
+    for lineno, raw in enumerate(lines, 1):
+        try:
+            # 显式按 UTF-8 解码：json.loads(bytes) 会按开头字节猜测 UTF-16/32
+            item = loads(raw.decode("utf-8"))
+        except ValueError as e:
+            if raw.strip():
+                bad.append(_bad_line(lineno, offset, raw, str(e)))
+        else:
+            if isinstance(item, dict):
+                items.append(item)
+                if linenos is not None:
+                    linenos.append(lineno)
+            else:
+                bad.append(_bad_line(lineno, offset, raw, f"不是 JSON 对象（{type(item).__name__}）", not_object=True))
+        offset += len(raw)
+    return lineno
+
+
+def read_jsonl_tolerant(path: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # 单进程单遍读取，坏行不中断加载。返回 (题目列表, 坏行列表)；offset 为该行在（解压后）文件中的字节偏移
+    items: List[Dict[str, Any]] = []
+    bad: List[Dict[str, Any]] = []
+    with open_binary(path) as f:
+        _parse_lines(f, 0, items, bad)
+    return items, bad
+
+
+def _bad_line(lineno: int, offset: int, raw: bytes, error: str, not_object: bool = False) -> Dict[str, Any]:
+    return {
+        "line": lineno,
+        "offset": offset,
+        "length": len(raw),
+        "error": error,
+        # 是合法 JSON，只是不是对象（如数组）
+        "not_object": not_object,
+        # 原样保留；非 UTF-8 字节以 \xNN 形式记录
+        "raw": raw.rstrip(b"\r\n").decode("utf-8", errors="backslashreplace"),
+    }
+
+
+def quarantine_path(data_path: str) -> str:
+    return data_path + QUARANTINE_SUFFIX
+
+
+def append_quarantine(data_path: str, bad: List[Dict[str, Any]]) -> str:
+    # 每条坏行一条 JSON 记录，追加写入并落盘后才允许调用方改写数据文件
+    path = quarantine_path(data_path)
+    ts = datetime.now().isoformat(timespec="seconds")
+    source = os.path.basename(data_path)
+    with open(path, "a", encoding="utf-8") as f:
+        for row in bad:
+            f.write(json.dumps({"ts": ts, "file": source, **row}, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+
+# =========================
+# 并行分块解析
+# =========================
+# fn(题目列表, 各题在块内的行号) -> 归约结果；行号从 1 起算，加上块首的 line_base 即为全文件行号
+ChunkFn = Callable[[List[Dict[str, Any]], List[int]], Any]
+
+
+def split_ranges(path: str, chunk_bytes: int = CHUNK_BYTES) -> List[Tuple[int, int]]:
+    # 切成 [start, end) 字节区间，每个区间都在换行符之后结束，不会切断一行
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, "rb") as f:
+        while start < size:
+            end = start + chunk_bytes
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _parse_chunk(lines: Iterable[bytes], offset: int, fn: Optional[ChunkFn]):
+    # 返回 (fn 的结果或题目列表, 坏行（块内行号）, 行数)
+    items: List[Dict[str, Any]] = []
+    bad: List[Dict[str, Any]] = []
+    linenos: Optional[List[int]] = [] if fn is not None else None
+    n_lines = _parse_lines(lines, offset, items, bad, linenos)
+    return (fn(items, linenos) if fn is not None else items), bad, n_lines
+
+
+def _parse_range(path: str, start: int, end: int, fn: Optional[ChunkFn]):
+    # 进程池中执行。fn 在子进程内归约时只回传结果，省去整块题目的序列化开销
+    with open(path, "rb") as f:
+        f.seek(start)
+        buf = f.read(end - start)
+    return _parse_chunk(io.BytesIO(buf), start, fn)
+
+
+def parallel_workers(path: str, workers: Optional[int] = None, reduce: bool = False) -> int:
+    # workers 为 None 时自动选择。回传整块题目时父进程反序列化的耗时约为 json.loads 的 70%，
+    # 多进程几乎没有收益，只有在子进程内归约（reduce）的大文件才开进程池；
+    # 压缩文件无法按字节区间切分，一律单进程流式读取
+    if compression_of(path) is not None:
+        return 1
+    if workers is None:
+        if not reduce or os.path.getsize(path) < PARALLEL_MIN_BYTES:
+            return 1
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
+
+def _iter_chunks(path: str, fn: Optional[ChunkFn], workers: int, chunk_bytes: int) -> Iterator[Tuple[Any, List[Dict[str, Any]], int]]:
+    # 按文件顺序逐块产出 (结果, 坏行, 块首之前的行数)；坏行的行号已换算为全文件行号
+    line_base = 0
+    if workers <= 1:
+        # 单进程同样按块流式读取，内存占用与文件大小无关
+        offset = 0
+        with open_binary(path) as f:
+            while True:
+                lines = f.readlines(chunk_bytes)
+                if not lines:
+                    return
+                result, bad, n_lines = _parse_chunk(lines, offset, fn)
+                for row in bad:
+                    row["line"] += line_base
+                yield result, bad, line_base
+                line_base += n_lines
+                offset += sum(map(len, lines))
+
+    ranges = iter(split_ranges(path, chunk_bytes))
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        for start, end in ranges:
+            pending.append(pool.submit(_parse_range, path, start, end, fn))
+            if len(pending) >= workers * INFLIGHT_PER_WORKER:
+                break
+        while pending:
+            result, bad, n_lines = pending.popleft().result()
+            nxt = next(ranges, None)
+            if nxt is not None:
+                pending.append(pool.submit(_parse_range, path, nxt[0], nxt[1], fn))
+            for row in bad:
+                row["line"] += line_base
+            yield result, bad, line_base
+            line_base += n_lines
+    finally:
+        # 调用方提前停止迭代时不再等待排队中的块
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def map_jsonl_chunks(
+    path: str,
+    fn: ChunkFn,
+    workers: Optional[int] = None,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> Iterator[Tuple[Any, List[Dict[str, Any]], int]]:
+    # 各块在子进程内解析并归约，按文件顺序产出 (fn 的结果, 坏行, line_base)；
+    # fn 须可被 pickle（模块级函数或其 functools.partial）
+    return _iter_chunks(path, fn, parallel_workers(path, workers, reduce=True), chunk_bytes)
+
+
+def iter_jsonl_chunks(
+    path: str,
+    workers: Optional[int] = None,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    # 按文件顺序逐块产出 (题目列表, 坏行)
+    for items, bad, _ in _iter_chunks(path, None, parallel_workers(path, workers), chunk_bytes):
+        yield items, bad
+
+
+def read_jsonl_parallel(path: str, workers: Optional[int] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # 与 read_jsonl_tolerant 结果一致（顺序、坏行及其行号与偏移）
+    items: List[Dict[str, Any]] = []
+    bad: List[Dict[str, Any]] = []
+    for chunk, chunk_bad in iter_jsonl_chunks(path, workers=workers):
+        items.extend(chunk)
+        bad.extend(chunk_bad)
+    return items, bad
+
+
+def iter_jsonl_strict(path: str, workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    # 批处理工具用：按顺序流式产出题目，遇到坏行即报错（不做隔离）
+    for chunk, bad in iter_jsonl_chunks(path, workers=workers):
+        if bad:
+            row = bad[0]
+            raise ValueError(f"{os.path.basename(path)} 第 {row['line']} 行（字节偏移 {row['offset']}）无法解析：{row['error']}")
+        yield from chunk
@@ -0,0 +1,268 @@
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from instrumentation import percentile
+
+
+# =========================
+# 全局配置
+# =========================
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+DEFAULT_SOURCE = "data_C.jsonl"
+RERUN_TIMEOUT = 120
+SCORE_GRID_MAX = 2.0
+SCORE_GRID_STEP = 0.05
+
+
+def _quiet_streamlit():
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+
+def _rss_mb() -> float:
+    # Linux 下 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _cpu_s() -> float:
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    return ru.ru_utime + ru.ru_stime
+
+
+# =========================
+# 模拟单个教师会话
+# =========================
+def _click(at, label: str):
+    for b in at.button:
+        if label in str(b.label):
+            b.click()
+            return
+    raise RuntimeError(f"未找到按钮：{label}")
+
+
+def _timed_run(at) -> float:
+    t0 = time.perf_counter()
+    at.run(timeout=RERUN_TIMEOUT)
+    if at.exception:
+        raise RuntimeError(f"脚本异常：{at.exception[0].value}")
+    return (time.perf_counter() - t0) * 1000
+
+
+def simulate_teacher(
+    app_script: str,
+    teacher_id: str,
+    pages: int,
+    edits_per_page: int,
+    seed: int,
+    start_barrier: Optional[Any] = None,
+) -> Dict[str, Any]:
+    from streamlit.testing.v1 import AppTest
+
+    _quiet_streamlit()
+    rnd = random.Random(f"{seed}::{teacher_id}")
+    n_steps = int(round(SCORE_GRID_MAX / SCORE_GRID_STEP))
+    grid = [round(i * SCORE_GRID_STEP, 2) for i in range(1, n_steps + 1)]
+
+    rerun_ms: List[float] = []
+    save_ms: List[float] = []
+    cpu0 = _cpu_s()
+
+    if start_barrier is not None:
+        start_barrier.wait()
+    t_start = time.perf_counter()
+
+    at = AppTest.from_file(app_script, default_timeout=RERUN_TIMEOUT)
+    rerun_ms.append(_timed_run(at))
+
+    # 登录：通过 teacher_id 输入框进入
+    at.text_input[0].set_value(teacher_id)
+    _click(at, "开始评测")
+    rerun_ms.append(_timed_run(at))
+
+    for _ in range(pages):
+        boxes = [sb for sb in at.selectbox if sb.label == "总分 E[S]"]
+        for sb in rnd.sample(boxes, min(edits_per_page, len(boxes))):
+            sb.set_value(rnd.choice(grid))
+
+        _click(at, "保存本题评分")
+        save_ms.append(_timed_run(at))
+
+        _click(at, "下一条")
+        rerun_ms.append(_timed_run(at))
+
+    return {
+        "teacher_id": teacher_id,
+        "wall_s": round(time.perf_counter() - t_start, 3),
+        "cpu_s": round(_cpu_s() - cpu0, 3),
+        "rss_mb": round(_rss_mb(), 1),
+        "rerun_ms": rerun_ms,
+        "save_ms": save_ms,
+    }
+
+
+def _process_worker(args):
+    workdir, app_script, teacher_id, pages, edits, seed, barrier = args
+    os.chdir(workdir)
+    return simulate_teacher(app_script, teacher_id, pages, edits, seed, start_barrier=barrier)
+
+
+_pool_barrier = None
+
+
+def _init_pool(barrier):
+    global _pool_barrier
+    _pool_barrier = barrier
+
+
+def _pool_worker(args):
+    return _process_worker(args + (_pool_barrier,))
+
+
+# =========================
+# 汇总
+# =========================
+def _pcts(vals: List[float]) -> Dict[str, float]:
+    s = sorted(vals)
+    return {
+        "n": len(s),
+        "p50_ms": round(percentile(s, 0.50), 2),
+        "p90_ms": round(percentile(s, 0.90), 2),
+        "p99_ms": round(percentile(s, 0.99), 2),
+        "max_ms": round(s[-1], 2) if s else 0.0,
+    }
+
+
+def summarize(sessions: List[Dict[str, Any]], mode: str, wall_s: float) -> Dict[str, Any]:
+    all_rerun = [x for s in sessions for x in s["rerun_ms"]]
+    all_save = [x for s in sessions for x in s["save_ms"]]
+    return {
+        "mode": mode,
+        "sessions": len(sessions),
+        "wall_s": round(wall_s, 3),
+        "rerun": _pcts(all_rerun),
+        "save": _pcts(all_save),
+        "per_session": [
+            {
+                "teacher_id": s["teacher_id"],
+                "wall_s": s["wall_s"],
+                "cpu_s": s["cpu_s"],
+                "rss_mb": s["rss_mb"],
+                "rerun_p50_ms": _pcts(s["rerun_ms"])["p50_ms"],
+                "save_p50_ms": _pcts(s["save_ms"])["p50_ms"],
+            }
+            for s in sessions
+        ],
+    }
+
+
+# =========================
+# 入口
+# =========================
+def run_load_test(
+    source: str,
+    sessions: int,
+    pages: int,
+    edits_per_page: int = 4,
+    mode: str = "process",
+    app_script: str = APP_SCRIPT,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    # 界面按当前目录查找 data_{teacher_id}.jsonl，会话须在临时目录中运行；结束后切回原目录再删除临时目录
+    app_script = os.path.abspath(app_script)
+    prev_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="agq_loadtest_")
+    try:
+        teacher_ids = [f"LT{i:03d}" for i in range(sessions)]
+        for tid in teacher_ids:
+            shutil.copyfile(source, os.path.join(workdir, f"data_{tid}.jsonl"))
+
+        t0 = time.perf_counter()
+        if mode == "process":
+            # 每个会话一个进程：CPU / RSS 可以按会话精确归属
+            ctx = mp.get_context("spawn")
+            barrier = ctx.Manager().Barrier(sessions)
+            jobs = [(workdir, app_script, tid, pages, edits_per_page, seed) for tid in teacher_ids]
+            with ctx.Pool(processes=sessions, initializer=_init_pool, initargs=(barrier,)) as pool:
+                results = pool.map(_pool_worker, jobs)
+        else:
+            # 所有会话共享一个进程（与单个 Streamlit 服务一致，共享缓存与导入）；
+            # CPU / RSS 为整个进程的数值
+            os.chdir(workdir)
+            barrier = threading.Barrier(sessions)
+            results: List[Optional[Dict[str, Any]]] = [None] * sessions
+            errors: List[BaseException] = []
+
+            def run_one(i, tid):
+                try:
+                    results[i] = simulate_teacher(app_script, tid, pages, edits_per_page, seed, start_barrier=barrier)
+                except BaseException as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=run_one, args=(i, tid)) for i, tid in enumerate(teacher_ids)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            if errors:
+                raise errors[0]
+        return summarize(results, mode, time.perf_counter() - t0)
+    finally:
+        os.chdir(prev_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="离线模拟多名教师并发评测，统计重跑/保存延迟与资源占用。")
+    parser.add_argument("-s", "--sessions", type=int, default=4, help="并发教师会话数")
+    parser.add_argument("-p", "--pages", type=int, default=5, help="每个会话评测的题目数")
+    parser.add_argument("-e", "--edits", type=int, default=4, help="每题修改的 E[S] 下拉框数量")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="复制给每个模拟教师的数据文件")
+    parser.add_argument("--mode", choices=["process", "thread"], default="process", help="会话隔离方式")
+    parser.add_argument("--app", default=APP_SCRIPT, help="被测 Streamlit 脚本")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出完整报告")
+    args = parser.parse_args(argv)
+
+    source = os.path.abspath(args.source)
+    if not os.path.exists(source):
+        print(f"❌ 未找到数据文件：{source}", file=sys.stderr)
+        return 1
+
+    report = run_load_test(
+        source,
+        args.sessions,
+        args.pages,
+        edits_per_page=args.edits,
+        mode=args.mode,
+        app_script=os.path.abspath(args.app),
+        seed=args.seed,
+    )
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"会话数 {report['sessions']}（{report['mode']}），总耗时 {report['wall_s']:.1f}s")
+    for name in ["rerun", "save"]:
+        r = report[name]
+        print(f"  {name:<6} n={r['n']:<5} p50={r['p50_ms']:.1f}ms  p90={r['p90_ms']:.1f}ms  p99={r['p99_ms']:.1f}ms  max={r['max_ms']:.1f}ms")
+    print(f"  {'teacher':<8}{'cpu(s)':>10}{'rss(MB)':>10}{'rerun p50':>12}{'save p50':>12}")
+    for s in report["per_session"]:
+        print(f"  {s['teacher_id']:<8}{s['cpu_s']:>10.2f}{s['rss_mb']:>10.1f}{s['rerun_p50_ms']:>12.1f}{s['save_p50_ms']:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
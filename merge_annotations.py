@@ -0,0 +1,327 @@
+import argparse
+import glob
+import heapq
+import json
+import os
+import re
+import sys
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from jsonl_io import DATA_FILE_SUFFIXES, compression_of, iter_jsonl_strict, open_text, resolve_data_path
+from schemas import annotation_fingerprint
+
+
+# =========================
+# 全局配置
+# =========================
+DATA_FILE_GLOB = "data_*.jsonl"
+# 数据文件可按 .gz / .zst 压缩存放
+DATA_FILE_RE = re.compile(r"^data_(?P<teacher_id>.+?)\.jsonl(?:\.gz|\.zst)?$")
+DEFAULT_OUTPUT = "master_annotations.jsonl"
+
+# 输入文件未按合并键排序时，外部排序每个分块的记录数
+SORT_CHUNK_SIZE = 2000
+
+# 主记录直接沿用首条记录的公共字段（题目、模型输出等在各教师文件中一致）
+SHARED_FIELDS = ["q_id", "source_qid", "source_qid_base", "user_req", "responses", "_meta"]
+USER_QUESTION_FIELD = "user_designed_question"
+
+CONFLICT_POLICIES = ["keep-first", "keep-last", "error"]
+
+
+class MergeConflictError(Exception):
+    pass
+
+
+# =========================
+# 读取 / 排序
+# =========================
+def teacher_id_from_path(path: str) -> str:
+    m = DATA_FILE_RE.match(os.path.basename(path))
+    return m.group("teacher_id") if m else os.path.splitext(os.path.basename(path))[0]
+
+
+def find_data_files() -> List[str]:
+    # 同一教师同时存在未压缩与压缩文件时，与界面一致只取 resolve_data_path 选中的那一份
+    paths = set()
+    for suffix in DATA_FILE_SUFFIXES:
+        for path in glob.glob(DATA_FILE_GLOB + suffix):
+            if compression_of(path) is not None:
+                path = os.path.splitext(path)[0]
+            paths.add(resolve_data_path(path))
+    return sorted(paths)
+
+
+def merge_key(item: Dict[str, Any]) -> str:
+    # q_id 只在单个学科文件内唯一（q_001 在化学/数学中是不同题目），优先使用 source_qid
+    return str(item.get("source_qid") or item.get("q_id") or "")
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    # 单进程按 8MB 分块流式解析，按原顺序产出；遇到坏行即报错
+    return iter_jsonl_strict(path)
+
+
+def is_sorted_by_key(path: str) -> bool:
+    prev = None
+    for item in iter_jsonl(path):
+        k = merge_key(item)
+        if prev is not None and k < prev:
+            return False
+        prev = k
+    return True
+
+
+def _write_sorted_chunk(chunk: List[Tuple[str, int, Dict[str, Any]]], tmp_dir: str) -> str:
+    chunk.sort(key=lambda x: (x[0], x[1]))
+    fd, chunk_path = tempfile.mkstemp(prefix="merge_chunk_", suffix=".jsonl", dir=tmp_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for k, seq, item in chunk:
+            f.write(json.dumps([k, seq, item], ensure_ascii=False) + "\n")
+    return chunk_path
+
+
+def _iter_chunk(chunk_path: str) -> Iterator[Tuple[str, int, Dict[str, Any]]]:
+    with open(chunk_path, "r", encoding="utf-8") as f:
+        for line in f:
+            k, seq, item = json.loads(line)
+            yield k, seq, item
+
+
+def iter_sorted_records(
+    path: str,
+    chunk_size: int = SORT_CHUNK_SIZE,
+    tmp_dir: Optional[str] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    if is_sorted_by_key(path):
+        for item in iter_jsonl(path):
+            yield merge_key(item), item
+        return
+
+    # 未排序：分块排序落盘后再归并，内存仍只与分块大小相关
+    chunk_paths = []
+    try:
+        chunk = []
+        for seq, item in enumerate(iter_jsonl(path)):
+            chunk.append((merge_key(item), seq, item))
+            if len(chunk) >= chunk_size:
+                chunk_paths.append(_write_sorted_chunk(chunk, tmp_dir))
+                chunk = []
+        if chunk:
+            chunk_paths.append(_write_sorted_chunk(chunk, tmp_dir))
+
+        streams = [_iter_chunk(p) for p in chunk_paths]
+        for k, _seq, item in heapq.merge(*streams, key=lambda x: (x[0], x[1])):
+            yield k, item
+    finally:
+        for p in chunk_paths:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+# =========================
+# k 路归并
+# =========================
+def _tag_stream(
+    file_idx: int,
+    path: str,
+    chunk_size: int,
+    tmp_dir: Optional[str],
+) -> Iterator[Tuple[str, int, str, str, Dict[str, Any]]]:
+    file_teacher = teacher_id_from_path(path)
+    for k, item in iter_sorted_records(path, chunk_size=chunk_size, tmp_dir=tmp_dir):
+        yield k, file_idx, file_teacher, path, item
+
+
+def _new_master_record(item: Dict[str, Any]) -> Dict[str, Any]:
+    master = {f: item[f] for f in SHARED_FIELDS if f in item}
+    master["annotations"] = {}
+    master[f"{USER_QUESTION_FIELD}s"] = {}
+    master["teachers"] = []
+    return master
+
+
+def _merge_into_master(
+    master: Dict[str, Any],
+    sources: Dict[str, str],
+    item: Dict[str, Any],
+    file_teacher: str,
+    path: str,
+    key: str,
+    on_conflict: str,
+    conflicts: List[Dict[str, Any]],
+    schemas: Dict[str, int],
+    schema_fp: str = "",
+):
+    if file_teacher not in master["teachers"]:
+        master["teachers"].append(file_teacher)
+
+    ud = item.get(USER_QUESTION_FIELD)
+    if isinstance(ud, str) and ud.strip():
+        master[f"{USER_QUESTION_FIELD}s"][file_teacher] = ud
+
+    ann = item.get("annotations")
+    if not isinstance(ann, dict):
+        return
+
+    for teacher_id, t_ann in ann.items():
+        # 按 SCHEMA 指纹分流：只比较一个字符串；指定 schema_fp 时丢弃其他配置的评分（没有指纹的旧数据保留）
+        fp = annotation_fingerprint(t_ann)
+        schemas[fp] = schemas.get(fp, 0) + 1
+        if schema_fp and fp and fp != schema_fp:
+            continue
+
+        if teacher_id not in master["annotations"]:
+            master["annotations"][teacher_id] = t_ann
+            sources[teacher_id] = path
+            continue
+
+        if master["annotations"][teacher_id] == t_ann:
+            continue
+
+        conflict = {
+            "key": key,
+            "q_id": master.get("q_id"),
+            "teacher_id": teacher_id,
+            "files": [sources[teacher_id], path],
+        }
+        conflicts.append(conflict)
+
+        if on_conflict == "error":
+            raise MergeConflictError(
+                f"教师 {teacher_id} 在题目 {key} 上存在冲突的标注：{sources[teacher_id]} vs {path}"
+            )
+        if on_conflict == "keep-last":
+            master["annotations"][teacher_id] = t_ann
+            sources[teacher_id] = path
+
+
+def merge_teacher_files(
+    paths: List[str],
+    out_path: str,
+    on_conflict: str = "keep-first",
+    chunk_size: int = SORT_CHUNK_SIZE,
+    schema_fp: str = "",
+) -> Dict[str, Any]:
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"未知的冲突处理策略：{on_conflict}")
+
+    out_dir = os.path.dirname(out_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    conflicts: List[Dict[str, Any]] = []
+    schemas: Dict[str, int] = {}
+    written = 0
+    tmp = out_path + ".tmp"
+
+    with tempfile.TemporaryDirectory(prefix="merge_annotations_") as tmp_dir:
+        streams = [
+            _tag_stream(file_idx, path, chunk_size, tmp_dir)
+            for file_idx, path in enumerate(paths)
+        ]
+
+        try:
+            with open_text(tmp, "w", compression=compression_of(out_path)) as f:
+                master = None
+                master_key = None
+                sources: Dict[str, str] = {}
+
+                # heapq.merge 同时只持有每路一条记录，内存上界为 k 条
+                for k, _file_idx, file_teacher, path, item in heapq.merge(
+                    *streams, key=lambda x: (x[0], x[1])
+                ):
+                    if master is None or k != master_key:
+                        if master is not None:
+                            f.write(json.dumps(master, ensure_ascii=False) + "\n")
+                            written += 1
+                        master = _new_master_record(item)
+                        master_key = k
+                        sources = {}
+
+                    _merge_into_master(master, sources, item, file_teacher, path, k, on_conflict, conflicts, schemas, schema_fp)
+
+                if master is not None:
+                    f.write(json.dumps(master, ensure_ascii=False) + "\n")
+                    written += 1
+            os.replace(tmp, out_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    return {
+        "files": len(paths),
+        "records": written,
+        "conflicts": conflicts,
+        # SCHEMA 指纹 -> 教师评分数（"" 为没有指纹的旧数据）
+        "schemas": schemas,
+        "dropped": sum(n for fp, n in schemas.items() if schema_fp and fp and fp != schema_fp),
+    }
+
+
+# =========================
+# 命令行
+# =========================
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="流式 k 路归并全部教师标注文件，生成一题一条的主数据集。")
+    parser.add_argument("inputs", nargs="*", help=f"输入文件（默认：当前目录下的 {DATA_FILE_GLOB}，含 .gz / .zst 压缩文件）")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"输出文件（默认：{DEFAULT_OUTPUT}）")
+    parser.add_argument(
+        "--on-conflict",
+        choices=CONFLICT_POLICIES,
+        default="keep-first",
+        help="同一教师在同一题目上存在不同标注时的处理方式",
+    )
+    parser.add_argument("--conflicts-out", default="", help="冲突明细输出路径（JSONL，可选）")
+    parser.add_argument("--chunk-size", type=int, default=SORT_CHUNK_SIZE, help="未排序输入外部排序的分块大小")
+    parser.add_argument("--schema", default="", help="只合并该评测配置（或 SCHEMA 指纹）的评分，其余配置的评分丢弃；没有指纹的旧数据保留")
+    args = parser.parse_args(argv)
+
+    schema_fp = args.schema
+    if schema_fp:
+        # 只在需要时加载评测配置（engine 依赖 streamlit）
+        from engine import load_profiles
+
+        profiles = load_profiles()["profiles"]
+        if schema_fp in profiles:
+            schema_fp = profiles[schema_fp]["fingerprint"]
+
+    paths = args.inputs or find_data_files()
+    out_abs = os.path.abspath(args.output)
+    paths = [p for p in paths if os.path.abspath(p) != out_abs]
+    if not paths:
+        print("❌ 未找到任何教师数据文件。", file=sys.stderr)
+        return 1
+
+    try:
+        report = merge_teacher_files(
+            paths, args.output, on_conflict=args.on_conflict, chunk_size=args.chunk_size, schema_fp=schema_fp
+        )
+    except MergeConflictError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    if args.conflicts_out:
+        with open(args.conflicts_out, "w", encoding="utf-8") as f:
+            for c in report["conflicts"]:
+                f.write(json.dumps(c, ensure_ascii=False) + "\n")
+
+    print(f"✅ 已合并 {report['files']} 个文件，共 {report['records']} 道题目 → {args.output}")
+    stamped = [fp for fp in report["schemas"] if fp]
+    if len(stamped) > 1:
+        mix = "，".join(f"{fp or '无指纹'} {n}" for fp, n in sorted(report["schemas"].items(), key=lambda x: -x[1]))
+        print(f"⚠️ 输入混合了多套 SCHEMA 的评分（{mix}）", file=sys.stderr)
+    if report["dropped"]:
+        print(f"⚠️ 已丢弃 {report['dropped']} 条其他 SCHEMA 的评分（--schema {args.schema}）", file=sys.stderr)
+    if report["conflicts"]:
+        print(f"⚠️ 检测到 {len(report['conflicts'])} 处冲突的重复教师标注（策略：{args.on_conflict}）", file=sys.stderr)
+        for c in report["conflicts"][:20]:
+            print(f"   - {c['key']} / {c['teacher_id']}: {c['files'][0]} vs {c['files'][1]}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+from engine import (
+    encode_subdim_score,
+    get_profile,
+    is_auto_skip_comment,
+    set_group_skipped,
+    set_rank_skipped,
+    subdim_expected,
+    use_profile,
+)
+from history import history_path, make_entry, scores_snapshot
+from jsonl_io import compression_of, open_text
+from merge_annotations import DATA_FILE_GLOB, find_data_files, iter_jsonl
+from schemas import SCHEMA_FP_FIELD, annotation_fingerprint
+from validate_data import GROUP_SCORE_TOL
+
+
+# =========================
+# 全局配置
+# =========================
+# 迁移统计项 -> 说明
+MIGRATION_STATS = {
+    "dropped_keys": "丢弃目标 SCHEMA 中不存在的 key",
+    "reencoded": "按目标选项重新编码的二级维度",
+    "group_changed": "一级维度均分变化",
+    "skip_added": "按目标规则新记为 -1 的一级维度",
+    "skip_cleared": "解除 -1、需要重新评分的一级维度",
+    "missing_subdims": "目标 SCHEMA 新增、需要补评的二级维度",
+    "rank_skip_added": "新记为 -1 的排名",
+    "rank_skip_cleared": "解除 -1 的排名",
+    "stamped": "补写 SCHEMA 指纹的旧评分",
+    "already_target": "已是目标 SCHEMA、跳过的评分",
+    "foreign_schema": "SCHEMA 指纹与 --from 不符、跳过的评分",
+}
+
+SKIP_VALUES = (-1, "-1")
+
+
+# =========================
+# 预编译迁移规则
+# =========================
+def compile_migration(src: Dict[str, Any], dst: Dict[str, Any]) -> Callable[[Dict[str, Any], str, Dict[str, int]], None]:
+    # 按源 / 目标评测配置一次性展开 key 映射与目标阶段规则，返回逐条评分（scores_root[rid]）的迁移函数。
+    # 分数 key 统一为 {一级维度}_{二级维度}_score，两套 SCHEMA 同名维度直接对应；
+    # 须在 use_profile(目标配置) 内调用（set_rank_skipped 按当前配置取排名 key）
+    src_opts = {
+        f"{g['name']}_{sub['name']}_score": sorted(sub.get("options", [0, 1, 2]))
+        for g in src["schema"]["groups"]
+        for sub in g["subdims"]
+    }
+    groups = [
+        (
+            g,
+            f"{g['name']}_score",
+            f"{g['name']}_comment",
+            [(f"{g['name']}_{sub['name']}_score", sorted(sub.get("options", [0, 1, 2]))) for sub in g["subdims"]],
+        )
+        for g in dst["schema"]["groups"]
+    ]
+    dst_keys = {key for _, gkey, ckey, subs in groups for key in [gkey, ckey] + [k for k, _ in subs]}
+    src_keys = set(src_opts) | {
+        f"{g['name']}_{suffix}" for g in src["schema"]["groups"] for suffix in ("score", "comment")
+    }
+    drop_keys = sorted(src_keys - dst_keys)
+    new_keys = [(gkey, [k for k, _ in subs if k not in src_opts]) for _, gkey, _, subs in groups]
+
+    src_rank_key = f"{src['schema']['rank']['name']}_score"
+    rank_key = f"{dst['schema']['rank']['name']}_score"
+    stages = dst["compiled_stages"]
+
+    def migrate(scores_root: Dict[str, Any], rid: str, stats: Dict[str, int]):
+        ms = scores_root[rid]
+        before = {gkey: ms.get(gkey) for _, gkey, _, _ in groups}
+        rank_before = ms.get(src_rank_key)
+
+        for key in drop_keys:
+            if ms.pop(key, None) is not None:
+                stats["dropped_keys"] += 1
+        if src_rank_key != rank_key and src_rank_key in ms:
+            ms[rank_key] = ms.pop(src_rank_key)
+
+        # 源规则写入的 -1 一律清除，由目标规则重新判定；自动评语在最终未跳过时才清除
+        for g, gkey, ckey, subs in groups:
+            for key, opts in subs:
+                v = ms.get(key)
+                if v in SKIP_VALUES:
+                    del ms[key]
+                elif key in src_opts and src_opts[key] != opts:
+                    ev = subdim_expected(v, src_opts[key])
+                    if ev is not None:
+                        ms[key] = encode_subdim_score(opts, max(min(ev, max(opts)), min(opts)))
+                        stats["reencoded"] += 1
+            if ms.get(gkey) in SKIP_VALUES:
+                del ms[gkey]
+        if ms.get(rank_key) in SKIP_VALUES:
+            del ms[rank_key]
+
+        # 与 apply_scores_to_message 相同：一级维度分为已填写二级维度期望分的均值；
+        # 原值与重算均值之差在校验容差内（只是舍入方式不同）时保留原值，不产生无意义的改动
+        for g, gkey, ckey, subs in groups:
+            evs = [ev for ev in (subdim_expected(ms.get(key), opts) for key, opts in subs) if ev is not None]
+            if not evs:
+                ms.pop(gkey, None)
+                continue
+            mean = sum(evs) / len(evs)
+            old = ms.get(gkey)
+            if not (isinstance(old, (int, float)) and not isinstance(old, bool) and abs(old - mean) <= GROUP_SCORE_TOL):
+                ms[gkey] = round(mean, 2)
+
+        for stage in stages:
+            if stage["failed"](ms):
+                status = stage["status"]
+                for g, _, _, _ in groups:
+                    if g["name"] in status["skip_groups"]:
+                        set_group_skipped(scores_root, rid, g, reason=status["skip_comment"])
+                set_rank_skipped(scores_root, rid)
+                break
+
+        for _, gkey, ckey, _ in groups:
+            old, new = before[gkey], ms.get(gkey)
+            if new not in SKIP_VALUES and is_auto_skip_comment(ms.get(ckey)):
+                del ms[ckey]
+            if old in SKIP_VALUES and new not in SKIP_VALUES:
+                stats["skip_cleared"] += 1
+            elif new in SKIP_VALUES and old not in SKIP_VALUES:
+                stats["skip_added"] += 1
+            elif old != new and old is not None and new is not None:
+                stats["group_changed"] += 1
+        for gkey, keys in new_keys:
+            if keys and ms.get(gkey) not in SKIP_VALUES:
+                stats["missing_subdims"] += sum(1 for k in keys if ms.get(k) is None)
+        rank_after = ms.get(rank_key)
+        if rank_before in SKIP_VALUES and rank_after not in SKIP_VALUES:
+            stats["rank_skip_cleared"] += 1
+        elif rank_after in SKIP_VALUES and rank_before not in SKIP_VALUES:
+            stats["rank_skip_added"] += 1
+
+    return migrate
+
+
+# =========================
+# 流式迁移
+# =========================
+def migrate_file(
+    path: str,
+    src_name: str,
+    dst_name: str,
+    out_path: Optional[str] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    # 单遍流式：逐题迁移全部教师的评分，写入临时文件后原子替换；内存占用与文件大小无关。
+    # 原地改写时，每道有变化的题目记一条 op=migrate 的修改历史，可用 history.py undo / restore 回退。
+    # 按各教师评分的 SCHEMA 指纹分流：已是目标指纹的不动，指纹属于其他配置的跳过，没有指纹的旧数据按 --from 处理
+    out_path = out_path or path
+    in_place = os.path.abspath(out_path) == os.path.abspath(path)
+    tmp = out_path + ".tmp"
+    hist_tmp = history_path(out_path) + ".tmp"
+    stats = {k: 0 for k in MIGRATION_STATS}
+    records = scores = changed = 0
+
+    with use_profile(dst_name) as dst:
+        src = get_profile(src_name)
+        migrate = compile_migration(src, dst)
+        f = hist = None
+        try:
+            if not dry_run:
+                f = open_text(tmp, "w", compression=compression_of(out_path))
+                if in_place:
+                    hist = open(hist_tmp, "w", encoding="utf-8")
+            for item in iter_jsonl(path):
+                records += 1
+                item_changed = False
+                for tid, t_ann in (item.get("annotations") or {}).items():
+                    scores_root = t_ann.get("scores") if isinstance(t_ann, dict) else None
+                    if not isinstance(scores_root, dict):
+                        continue
+                    fp = annotation_fingerprint(t_ann)
+                    if fp == dst["fingerprint"]:
+                        stats["already_target"] += 1
+                        continue
+                    if fp and fp != src["fingerprint"]:
+                        stats["foreign_schema"] += 1
+                        continue
+                    t_ann[SCHEMA_FP_FIELD] = dst["fingerprint"]
+                    item_changed = True
+                    if not fp:
+                        stats["stamped"] += 1
+                    before = scores_snapshot(item, tid)
+                    for rid in list(scores_root):
+                        if isinstance(scores_root[rid], dict):
+                            migrate(scores_root, rid, stats)
+                            scores += 1
+                    # 指纹已改为目标配置，make_entry 总会返回记录（评分无变化时为空增量，撤回时恢复指纹）
+                    entry = make_entry("migrate", item, tid, before, fp, from_profile=src_name, to_profile=dst_name)
+                    if not (entry["before"] or entry["after"] or entry["new_rids"]):
+                        # 评分没有实际变化时原样写回（保持 key 顺序），只更新指纹
+                        t_ann["scores"] = before
+                    if hist is not None:
+                        hist.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                changed += item_changed
+                if f is not None:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+            if f is not None:
+                f.close()
+                os.replace(tmp, out_path)
+            if hist is not None:
+                # 数据文件替换后再追加历史，与界面保存的顺序一致
+                hist.close()
+                with open(hist_tmp, "rb") as src_f, open(history_path(out_path), "ab") as dst_f:
+                    shutil.copyfileobj(src_f, dst_f)
+        finally:
+            for h in (f, hist):
+                if h is not None and not h.closed:
+                    h.close()
+            for p in (tmp, hist_tmp):
+                if os.path.exists(p):
+                    os.remove(p)
+
+    return {"file": path, "out": out_path, "records": records, "scores": scores, "changed": changed, **stats}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="在评测配置之间迁移已有评分（维度映射、重算一级维度均分、按目标阶段规则重写 -1）。")
+    parser.add_argument("inputs", nargs="*", help=f"输入文件（默认：当前目录下的 {DATA_FILE_GLOB}，含 .gz / .zst 压缩文件）")
+    parser.add_argument("--from", dest="src", required=True, help="数据当前所用的评测配置（如 ap2）")
+    parser.add_argument("--to", dest="dst", required=True, help="目标评测配置（如 app、appv263）")
+    parser.add_argument("-o", "--out-dir", default=None, help="输出目录（默认原地改写并记录修改历史）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写回文件")
+    args = parser.parse_args(argv)
+
+    paths = args.inputs or find_data_files()
+    if not paths:
+        print("❌ 未找到任何数据文件。", file=sys.stderr)
+        return 1
+    try:
+        get_profile(args.src)
+        get_profile(args.dst)
+    except Exception as e:
+        print(f"❌ 加载评测配置失败：{str(e)}", file=sys.stderr)
+        return 1
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    for path in paths:
+        out_path = os.path.join(args.out_dir, os.path.basename(path)) if args.out_dir else None
+        try:
+            r = migrate_file(path, args.src, args.dst, out_path=out_path, dry_run=args.dry_run)
+        except Exception as e:
+            print(f"❌ {path}: 迁移失败：{str(e)}", file=sys.stderr)
+            return 1
+        details = "，".join(f"{MIGRATION_STATS[k]} {r[k]}" for k in MIGRATION_STATS if r[k])
+        verb = "将迁移" if args.dry_run else "已迁移"
+        print(f"✅ {path}: {r['records']} 道题，{verb} {r['changed']} 道（{r['scores']} 条评分）{('；' + details) if details else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from engine import get_schema, use_profile
+from jsonl_io import compression_of, iter_jsonl_strict, open_text
+
+
+# =========================
+# 全局配置
+# =========================
+MESSAGE_FIELDS = (
+    "q_id",
+    "source_qid",
+    "source_qid_base",
+    "user_req",
+    "responses",
+    "annotations",
+    "user_designed_question",
+    "_meta",
+)
+RESPONSE_FIELDS = ("response_id", "model_id", "text")
+ANNOTATION_FIELDS = ("blind_map", "scores")
+
+
+def subdim_options() -> Dict[str, Tuple[int, ...]]:
+    # 二级维度分数 key -> 升序选项（来自当前评测配置的 SCHEMA）
+    return {
+        f"{g['name']}_{sub['name']}_score": tuple(sorted(sub.get("options", [0, 1, 2])))
+        for g in get_schema()["groups"]
+        for sub in g["subdims"]
+    }
+
+
+# 分数取值落在固定网格上、key 顺序也高度重复，加载时共享同一对象以降低内存。
+# 共享表只在一次加载内有效（由 iter_messages 等创建），加载结束即随之释放
+def _intern(table: Dict[Any, Any], obj, key: Any = None):
+    return table.setdefault(obj if key is None else key, obj)
+
+
+def _merge_ordered(key_order: Tuple[str, ...], values: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    # 按原始 key 顺序写回，保证 JSON 往返一致；原记录没有的已知字段仅在非空时追加
+    out: Dict[str, Any] = {}
+    for k in key_order:
+        if k in values:
+            out[k] = values[k]
+        elif k in extra:
+            out[k] = extra[k]
+    for k, v in values.items():
+        if k not in out and v not in (None, "", {}, []):
+            out[k] = v
+    for k, v in extra.items():
+        if k not in out:
+            out[k] = v
+    return out
+
+
+# =========================
+# 数据模型
+# =========================
+@dataclass(slots=True, frozen=True)
+class SubdimScore:
+    # kind: probs 概率字典 / array 概率数组 / mean 期望分 / skip 跳过(-1) / raw 无法识别，原样保留
+    options: Tuple[int, ...]
+    kind: str
+    values: Tuple[float, ...] = ()
+    raw: Any = None
+
+    @classmethod
+    def from_json(cls, v: Any, options: Tuple[int, ...], interned: Dict[Any, Any]) -> "SubdimScore":
+        # 可识别的取值不可变且被共享；raw 取值原样保留，不共享
+        if v == -1 or v == "-1":
+            # -1 / -1.0 / "-1" 相等但写回不同，按类型分别共享
+            skip = cls(options, "skip", raw=v)
+            return _intern(interned, skip, (skip, type(v)))
+        if isinstance(v, dict):
+            if list(v) == [str(o) for o in options] and all(type(x) is float for x in v.values()):
+                return _intern(interned, cls(options, "probs", tuple(v.values())))
+        elif isinstance(v, list):
+            if len(v) == len(options) and all(type(x) is float for x in v):
+                return _intern(interned, cls(options, "array", tuple(v)))
+        elif type(v) is float:
+            return _intern(interned, cls(options, "mean", (v,)))
+        return cls(options, "raw", raw=v)
+
+    def to_json(self) -> Any:
+        if self.kind == "probs":
+            return {str(o): p for o, p in zip(self.options, self.values)}
+        if self.kind == "array":
+            return list(self.values)
+        if self.kind == "mean":
+            return self.values[0]
+        return self.raw
+
+    @property
+    def skipped(self) -> bool:
+        return self.kind == "skip"
+
+    def expected(self) -> Optional[float]:
+        if self.kind in ("probs", "array"):
+            return float(sum(o * p for o, p in zip(self.options, self.values)))
+        if self.kind == "mean":
+            return self.values[0]
+        if self.kind == "skip":
+            return -1.0
+        return None
+
+
+@dataclass(slots=True)
+class Response:
+    response_id: str
+    model_id: str = ""
+    text: str = ""
+    extra: Dict[str, Any] = field(default_factory=dict)
+    key_order: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], interned: Dict[Any, Any]) -> "Response":
+        return cls(
+            response_id=d.get("response_id", ""),
+            model_id=d.get("model_id", ""),
+            text=d.get("text", ""),
+            extra={k: v for k, v in d.items() if k not in RESPONSE_FIELDS},
+            key_order=_intern(interned, tuple(d)),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = {"response_id": self.response_id, "model_id": self.model_id, "text": self.text}
+        return _merge_ordered(self.key_order, values, self.extra)
+
+
+@dataclass(slots=True)
+class TeacherAnnotation:
+    blind_map: Dict[str, str] = field(default_factory=dict)
+    # rid -> {分数 key: 值}；二级维度分数为 SubdimScore，其余（一级总分、评语、排名）保持原值
+    scores: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    extra: Dict[str, Any] = field(default_factory=dict)
+    key_order: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], subdims: Dict[str, Tuple[int, ...]], interned: Dict[Any, Any]) -> "TeacherAnnotation":
+        scores = {}
+        for rid, ms in (d.get("scores") or {}).items():
+            scores[rid] = {
+                sys.intern(k): SubdimScore.from_json(v, subdims[k], interned) if k in subdims else v
+                for k, v in ms.items()
+            }
+        return cls(
+            blind_map=dict(d.get("blind_map") or {}),
+            scores=scores,
+            extra={k: v for k, v in d.items() if k not in ANNOTATION_FIELDS},
+            key_order=_intern(interned, tuple(d)),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        scores = {
+            rid: {k: v.to_json() if isinstance(v, SubdimScore) else v for k, v in ms.items()}
+            for rid, ms in self.scores.items()
+        }
+        values = {"blind_map": self.blind_map, "scores": scores}
+        return _merge_ordered(self.key_order, values, self.extra)
+
+
+@dataclass(slots=True)
+class Message:
+    q_id: str
+    source_qid: Optional[str] = None
+    source_qid_base: Optional[str] = None
+    user_req: Dict[str, Any] = field(default_factory=dict)
+    responses: List[Response] = field(default_factory=list)
+    annotations: Dict[str, TeacherAnnotation] = field(default_factory=dict)
+    user_designed_question: str = ""
+    meta: Dict[str, Any] = field(default_factory=dict)
+    extra: Dict[str, Any] = field(default_factory=dict)
+    key_order: Tuple[str, ...] = ()
+    # 加载时预建，responses 变化后调用 reindex()
+    response_index: Dict[str, Response] = field(default_factory=dict, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.reindex()
+
+    def reindex(self):
+        self.response_index = {r.response_id: r for r in self.responses if r.response_id}
+
+    @classmethod
+    def from_dict(
+        cls,
+        d: Dict[str, Any],
+        subdims: Optional[Dict[str, Tuple[int, ...]]] = None,
+        interned: Optional[Dict[Any, Any]] = None,
+    ) -> "Message":
+        # interned 为本次加载的共享表；单独构造一条时不与其他记录共享
+        subdims = subdim_options() if subdims is None else subdims
+        interned = {} if interned is None else interned
+        return cls(
+            q_id=d.get("q_id", ""),
+            source_qid=d.get("source_qid"),
+            source_qid_base=d.get("source_qid_base"),
+            user_req=d.get("user_req", {}),
+            responses=[Response.from_dict(r, interned) for r in (d.get("responses") or [])],
+            annotations={tid: TeacherAnnotation.from_dict(a, subdims, interned) for tid, a in (d.get("annotations") or {}).items()},
+            user_designed_question=d.get("user_designed_question", ""),
+            meta=d.get("_meta", {}),
+            extra={k: v for k, v in d.items() if k not in MESSAGE_FIELDS},
+            key_order=_intern(interned, tuple(d)),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = {
+            "q_id": self.q_id,
+            "source_qid": self.source_qid,
+            "source_qid_base": self.source_qid_base,
+            "user_req": self.user_req,
+            "responses": [r.to_dict() for r in self.responses],
+            "annotations": {tid: a.to_dict() for tid, a in self.annotations.items()},
+            "user_designed_question": self.user_designed_question,
+            "_meta": self.meta,
+        }
+        return _merge_ordered(self.key_order, values, self.extra)
+
+    def annotation(self, teacher_id: str) -> TeacherAnnotation:
+        if teacher_id not in self.annotations:
+            self.annotations[teacher_id] = TeacherAnnotation()
+        return self.annotations[teacher_id]
+
+
+# =========================
+# 读写
+# =========================
+def iter_messages(path: str) -> Iterator[Message]:
+    subdims = subdim_options()
+    interned: Dict[Any, Any] = {}
+    for d in iter_jsonl_strict(path):
+        yield Message.from_dict(d, subdims, interned)
+
+
+def load_messages(path: str) -> List[Message]:
+    return list(iter_messages(path))
+
+
+def dump_messages(path: str, messages: List[Message]):
+    dir_name = os.path.dirname(path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+
+    tmp = path + ".tmp"
+    with open_text(tmp, "w", compression=compression_of(path)) as f:
+        for m in messages:
+            f.write(json.dumps(m.to_dict(), ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+# =========================
+# 往返校验 / 内存对比
+# =========================
+def check_file(path: str) -> Dict[str, Any]:
+    mismatched = 0
+    records = 0
+    with open_text(path, "r") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    subdims = subdim_options()
+    interned: Dict[Any, Any] = {}
+    for line in lines:
+        d = json.loads(line)
+        if json.dumps(Message.from_dict(d, subdims, interned).to_dict(), ensure_ascii=False) != json.dumps(d, ensure_ascii=False):
+            mismatched += 1
+        records += 1
+
+    tracemalloc.start()
+    dicts = [json.loads(line) for line in lines]
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    del dicts
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    interned = {}
+    models = [Message.from_dict(json.loads(line), subdims, interned) for line in lines]
+    model_bytes = tracemalloc.get_traced_memory()[0]
+    del models
+    tracemalloc.stop()
+
+    return {"records": records, "mismatched": mismatched, "dict_bytes": dict_bytes, "model_bytes": model_bytes}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="校验数据文件与类型化模型之间的 JSON 往返，并对比内存占用。")
+    parser.add_argument("inputs", nargs="+")
+    parser.add_argument("--profile", default=None, help="评测配置名称（profiles.json，默认使用其默认配置）")
+    args = parser.parse_args(argv)
+
+    failed = False
+    with use_profile(args.profile):
+        for path in args.inputs:
+            r = check_file(path)
+            failed = failed or r["mismatched"] > 0
+            flag = "✅" if r["mismatched"] == 0 else "❌"
+            print(
+                f"{flag} {path}: {r['records']} 条，往返不一致 {r['mismatched']} 条；"
+                f"内存 dict {r['dict_bytes'] / 1024 / 1024:.1f} MB → 模型 {r['model_bytes'] / 1024 / 1024:.1f} MB"
+            )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
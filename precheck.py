@@ -0,0 +1,382 @@
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from engine import (
+    MODEL_LABELS,
+    PRECHECK_FIELD,
+    read_saved_blind_order,
+    split_qa,
+    write_jsonl_atomic,
+)
+from merge_annotations import iter_jsonl, teacher_id_from_path
+
+
+# =========================
+# 全局配置
+# =========================
+# 规则有调整时递增，已有旧版本建议的回答会被重新预检
+PRECHECK_VERSION = 2
+DEFAULT_CHUNK_SIZE = 32
+# 预检期间数据文件被界面 / API 保存改写时，重新读取并套用已算好的建议的次数
+WRITE_RETRIES = 3
+
+THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+QUESTION_TAG_RE = re.compile(r"<题目>")
+# 不少回答先照抄输出模板（<题目>...<解析>...<答案>... 或 <题目>...</题目>）再给出真正的题目：
+# 先去掉只有省略号的段内容，再去掉紧跟下一个标签的空段，只留下有实际内容的段
+PLACEHOLDER_RE = re.compile(r"<(题目|解析|答案)>[ \t]*(?:\.{3,}|…+)[ \t]*(?:</\1>|(?=\n|<|$))")
+EMPTY_SECTION_RE = re.compile(r"<(?:题目|解析|答案)>\s*(?=<(?:题目|解析|答案)>)")
+REFUSAL_RE = re.compile(r"<无法生成>")
+OPTION_RE = re.compile(r"(?m)^\s*(?:<选项>\s*)?([A-H])\s*[\.．、:：]")
+BLANK_RE = re.compile(r"_{2,}|＿{2,}")
+MULTI_CHOICE_RE = re.compile(r"多选|不定项")
+# 小问编号可以独占一行，也可以紧跟在上一句的句末标点之后（“……？（1）……（2）……”）
+SUBQ_PAREN_RE = re.compile(r"(?:^|\n|<小问>|[。？！；：?!;:])\s*[（(]\s*(\d+)\s*[)）]")
+SUBQ_CIRCLED_RE = re.compile(r"[①②③④⑤⑥⑦⑧⑨⑩]")
+SUBQ_DOT_RE = re.compile(r"(?m)^\s*(\d+)\s*[\.．、]")
+
+CN_NUMS = {"一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10}
+REQ_COUNT_RE = re.compile(r"(\d+|[一两二三四五六七八九十])\s*道")
+REQ_SUBQ_RE = re.compile(r"(\d+|[一两二三四五六七八九十])\s*个?小问")
+
+
+def _num(s: str) -> int:
+    return int(s) if s.isdigit() else CN_NUMS.get(s, 0)
+
+
+# =========================
+# 特征提取（每个回答只解析一次，供各规则共用）
+# =========================
+def extract_features(user_req: Dict[str, Any], text: str) -> Dict[str, Any]:
+    t = THINK_RE.sub("", (text or "").replace("\r\n", "\n"))
+    t = EMPTY_SECTION_RE.sub("", PLACEHOLDER_RE.sub(r"<\1>", t))
+    question = split_qa(t)["题目"]
+    query = user_req.get("query", "") or ""
+
+    m_count = REQ_COUNT_RE.search(query)
+    m_subq = REQ_SUBQ_RE.search(query)
+    subq = max(
+        len(set(SUBQ_PAREN_RE.findall(question))),
+        len(set(SUBQ_CIRCLED_RE.findall(question))),
+        len(set(SUBQ_DOT_RE.findall(question))),
+    )
+    return {
+        "type": (user_req.get("type") or "").strip(),
+        "refused": bool(REFUSAL_RE.search(t)),
+        "has_question": bool(question.strip()),
+        "question_blocks": len(QUESTION_TAG_RE.findall(t)) or (1 if question.strip() else 0),
+        "options": sorted(set(OPTION_RE.findall(question))),
+        "blanks": len(BLANK_RE.findall(question)),
+        "multi_choice_hint": bool(MULTI_CHOICE_RE.search(question)),
+        "subquestions": subq,
+        "requested_count": _num(m_count.group(1)) if m_count else 1,
+        "requested_subquestions": _num(m_subq.group(1)) if m_subq else None,
+    }
+
+
+# =========================
+# 预检规则
+# =========================
+# 分数 key -> 规则；规则接收特征，返回 (建议分, 证据) 或 None（无法判断，不给建议）
+PRECHECK_RULES: Dict[str, Callable[[Dict[str, Any]], Optional[Tuple[int, str]]]] = {}
+
+
+def precheck_rule(group: str, subdim: str):
+    def deco(fn):
+        PRECHECK_RULES[f"{group}_{subdim}_score"] = fn
+        return fn
+
+    return deco
+
+
+@precheck_rule("题型匹配度", "题型与结构规范")
+def rule_type_structure(f: Dict[str, Any]) -> Optional[Tuple[int, str]]:
+    if f["refused"]:
+        return 0, "模型输出 <无法生成>"
+    if not f["has_question"]:
+        return 0, "未检测到题目段"
+
+    n_opts = len(f["options"])
+    opts = "、".join(f["options"])
+    if f["type"] == "单选题":
+        if n_opts == 0:
+            return 0, "要求单选题，但未检测到 A/B/C/D 选项"
+        if f["multi_choice_hint"]:
+            return 1, f"要求单选题，题干出现“多选/不定项”（选项 {opts}）"
+        if n_opts != 4:
+            return 1, f"要求单选题，检测到 {n_opts} 个选项（{opts}），非 4 个"
+        return 2, f"单选题，检测到 4 个选项（{opts}）"
+    if f["type"] == "多选题":
+        if n_opts == 0:
+            return 0, "要求多选题，但未检测到选项"
+        if n_opts < 4:
+            return 1, f"要求多选题，仅检测到 {n_opts} 个选项（{opts}）"
+        return 2, f"多选题，检测到 {n_opts} 个选项（{opts}）"
+    if f["type"] == "填空题":
+        if n_opts >= 2:
+            return 0, f"要求填空题，但检测到选项（{opts}），疑似选择题"
+        if f["blanks"] == 0:
+            return 1, "要求填空题，未检测到填空标识（____）"
+        return 2, f"填空题，检测到 {f['blanks']} 处填空标识"
+    if f["type"] == "解答题":
+        if n_opts >= 2:
+            return 0, f"要求解答题，但检测到选项（{opts}），疑似选择题"
+        if f["blanks"] > 0 and f["subquestions"] == 0:
+            return 1, f"要求解答题，检测到 {f['blanks']} 处填空标识，疑似填空题"
+        return 2, "解答题，未检测到选项或填空标识"
+    return None
+
+
+@precheck_rule("题型匹配度", "数量匹配度")
+def rule_quantity(f: Dict[str, Any]) -> Optional[Tuple[int, str]]:
+    if f["refused"] or not f["has_question"]:
+        return 0, "未生成题目"
+    if f["question_blocks"] != f["requested_count"]:
+        return 0, f"要求 {f['requested_count']} 道题，检测到 {f['question_blocks']} 个 <题目> 段"
+    want = f["requested_subquestions"]
+    if want:
+        if f["subquestions"] != want:
+            return 0, f"要求 {want} 小问，检测到 {f['subquestions']} 小问"
+        return 2, f"{f['requested_count']} 道题、{want} 小问，与要求一致"
+    return 2, f"{f['requested_count']} 道题，与要求一致"
+
+
+def precheck_response(user_req: Dict[str, Any], text: str) -> Dict[str, Any]:
+    f = extract_features(user_req, text)
+    suggestions = {}
+    for key, rule in PRECHECK_RULES.items():
+        r = rule(f)
+        if r is not None:
+            suggestions[key] = {"value": r[0], "evidence": r[1]}
+    return {"version": PRECHECK_VERSION, "suggestions": suggestions}
+
+
+def precheck_message(payload: Tuple[Dict[str, Any], List[Tuple[str, str]]]) -> List[Tuple[str, Dict[str, Any]]]:
+    # 进程池的工作单元：一道题的全部待检回答
+    user_req, responses = payload
+    return [(rid, precheck_response(user_req, text)) for rid, text in responses]
+
+
+# =========================
+# 批量预检
+# =========================
+def _needs_check(r: Dict[str, Any], force: bool) -> bool:
+    if force:
+        return True
+    pc = r.get(PRECHECK_FIELD)
+    return not isinstance(pc, dict) or pc.get("version") != PRECHECK_VERSION
+
+
+def precheck_items(
+    items: List[Dict[str, Any]],
+    workers: Optional[int] = None,
+    force: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    # 结果写回 responses[i]["precheck"]；workers=1 时在当前进程内执行
+    jobs = []
+    payloads = []
+    for i, item in enumerate(items):
+        pending = [
+            (r.get("response_id"), r.get("text", ""))
+            for r in (item.get("responses") or [])
+            if r.get("response_id") and _needs_check(r, force)
+        ]
+        if pending:
+            jobs.append(i)
+            payloads.append((item.get("user_req") or {}, pending))
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 and len(payloads) > 1 else None
+    if pool is None:
+        results = map(precheck_message, payloads)
+    else:
+        results = pool.map(precheck_message, payloads, chunksize=chunk_size)
+
+    checked = 0
+    zeros: Dict[str, int] = {key: 0 for key in PRECHECK_RULES}
+    try:
+        for i, res in zip(jobs, results):
+            by_rid = dict(res)
+            for r in items[i].get("responses") or []:
+                pc = by_rid.get(r.get("response_id"))
+                if pc is None:
+                    continue
+                r[PRECHECK_FIELD] = pc
+                checked += 1
+                for key, s in pc["suggestions"].items():
+                    if s["value"] == 0:
+                        zeros[key] += 1
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return {"questions": len(items), "checked": checked, "zeros": zeros}
+
+
+def _file_stamp(path: str) -> Tuple[int, int]:
+    st_ = os.stat(path)
+    return st_.st_mtime_ns, st_.st_size
+
+
+def precheck_file(path: str, workers: Optional[int] = None, force: bool = False) -> Dict[str, Any]:
+    # 教师可能在预检期间保存评分：写回前确认文件未变；变了则重新读取最新内容，
+    # 按 (q_id, response_id) 套用已算好的建议后再确认，不覆盖期间保存的评分
+    stamp = _file_stamp(path)
+    items = list(iter_jsonl(path))
+    stats = precheck_items(items, workers=workers, force=force)
+    if not stats["checked"]:
+        return stats
+
+    for _ in range(WRITE_RETRIES):
+        if _file_stamp(path) == stamp:
+            write_jsonl_atomic(path, items)
+            return stats
+        computed = {
+            (item.get("q_id"), r.get("response_id")): r[PRECHECK_FIELD]
+            for item in items
+            for r in item.get("responses") or []
+            if PRECHECK_FIELD in r
+        }
+        stamp = _file_stamp(path)
+        items = list(iter_jsonl(path))
+        for item in items:
+            for r in item.get("responses") or []:
+                pc = computed.get((item.get("q_id"), r.get("response_id")))
+                if pc is not None:
+                    r[PRECHECK_FIELD] = pc
+    raise RuntimeError(f"{os.path.basename(path)} 在预检期间持续被改写，未写回建议分，请稍后重试")
+
+
+def triage_rows(path: str, max_value: int = 0) -> List[Dict[str, Any]]:
+    # 列出建议分不高于 max_value 的回答（默认仅列出建议 0 分，即明显的第一阶段失败）；
+    # 已写入盲评顺序时附带该教师看到的标签（模型 A/B/C）
+    teacher_id = teacher_id_from_path(path).upper()
+    rows = []
+    for item in iter_jsonl(path):
+        qid = item.get("q_id", "")
+        order = read_saved_blind_order(item, teacher_id) or []
+        labels = {rid: lbl for lbl, rid in zip(MODEL_LABELS, order) if rid}
+        for r in item.get("responses") or []:
+            pc = r.get(PRECHECK_FIELD) or {}
+            for key, s in (pc.get("suggestions") or {}).items():
+                if s["value"] <= max_value:
+                    rows.append({
+                        "q_id": qid,
+                        "response_id": r.get("response_id", ""),
+                        "label": labels.get(r.get("response_id"), ""),
+                        "key": key,
+                        "value": s["value"],
+                        "evidence": s["evidence"],
+                    })
+    return rows
+
+
+# =========================
+# 回归样例（precheck.py selftest）
+# =========================
+# 取自随附数据中的真实回答（节选）：(说明, user_req, 回答文本, {分数 key: 期望建议分})
+TYPE_KEY = "题型匹配度_题型与结构规范_score"
+COUNT_KEY = "题型匹配度_数量匹配度_score"
+SELFTEST_CASES = [
+    (
+        "先照抄 <题目>...<解析>...<答案>... 模板，再给出 4 个选项的单选题（data_C8144 q_005 qwen2.5-7b）",
+        {"query": "我是化学家教，需要一道初中的融合（金属资源现状及保护措施，焰色反应（沪教），常见合金）3个知识点的单选题。", "type": "单选题"},
+        "<题目>...\n<解析>...\n<答案>...\n\n<题目>\n为减少环境污染，工厂决定采用新型合金材料代替部分纯金属。"
+        "若要求该合金的熔点不低于1000℃，密度不超过8 g/cm³，下列哪种合金最符合要求？\n"
+        "A. 铝青铜（熔点约1070℃，密度约8.79 g/cm³）\nB. 硅铝合金（熔点约650℃，密度约2.7 g/cm³）\n"
+        "C. 镍铬合金（熔点约1455℃，密度约8.5 g/cm³）\nD. 铜镍合金（熔点约1085℃，密度约8.8 g/cm³）\n\n"
+        "<解析>\n综合考虑熔点和密度的要求，最佳选择是C.\n\n<答案>\nC",
+        {TYPE_KEY: 2, COUNT_KEY: 2},
+    ),
+    (
+        "<题目>...</题目> 占位后题干不在标签内，小问编号紧跟句末标点（data_C8144 q_029 llama3.1-8b）",
+        {"query": "我是化学教研员，需要一道初中的融合（实验室制取氧气的装置连接顺序，离子、物质的共存问题）2个知识点的3小问解答题。", "type": "解答题"},
+        "<题目>...</题目>\n\n我们学校化学实验室的老师正在指导学生在实验室中制取氧气的装置。\n\n"
+        "实验室的老师要求学生设计一个合适的氧气制取装置，并且要描述氧气制取装置中的离子和物质的共存情况。"
+        "（1）氧气制取装置的连接顺序是哪些？（2）在氧气制取装置中，哪些离子和物质可以共存？"
+        "（3）在实验室中，氧气导管和氧化物玻璃管之间需要连接一个导管的原因是什么？\n\n"
+        "<解析>...</解析>\n\n对问题的分析与求解：首先，我们需要分析氧气制取装置的连接顺序。\n\n"
+        "<答案>...</答案>\n\n（1）水玻璃瓶 -> 氧气导管\n（2）水和钠氧化物\n（3）防止氧气向外泄漏",
+        {TYPE_KEY: 2, COUNT_KEY: 2},
+    ),
+    (
+        "只有占位的 <题目>...，其后直接是解析（data_C q_069 qwen2.5-7b）",
+        {"query": "我是初中学生，化学的融合（根据化合价大小排序求化学式，常见元素名称及符号）2个知识点没掌握，求单选题。", "type": "单选题"},
+        "<题目>...\n<解析>题干给出了几种元素及其化合价，要求根据化合价大小排序求化学式。\n"
+        "A. 氧（O）-2\nB. 钾（K）+1\nC. 硫（S）+4, +6\nD. 氯（Cl）-1\n因此，正确答案是KClO4。\n<答案>A",
+        {TYPE_KEY: 0, COUNT_KEY: 0},
+    ),
+]
+
+
+def run_selftest() -> List[str]:
+    # 返回不符合期望的样例说明；空列表表示全部通过
+    failures = []
+    for desc, user_req, text, expected in SELFTEST_CASES:
+        got = precheck_response(user_req, text)["suggestions"]
+        for key, want in expected.items():
+            s = got.get(key)
+            if s is None or s["value"] != want:
+                failures.append(f"{desc}：{key} 期望 {want}，实际 {s['value'] if s else '无建议'}（{s['evidence'] if s else ''}）")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="第一阶段（题型匹配度）规则预检：批量生成建议分与证据，并列出明显不合格的回答。")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="预检数据文件并写回建议分（原地改写）")
+    p_run.add_argument("inputs", nargs="+")
+    p_run.add_argument("-j", "--workers", type=int, default=None, help="进程数（默认 CPU 核数，1 为单进程）")
+    p_run.add_argument("--force", action="store_true", help="忽略已有建议，全部重新预检")
+
+    p_tri = sub.add_parser("triage", help="列出建议分偏低的回答")
+    p_tri.add_argument("inputs", nargs="+")
+    p_tri.add_argument("--max-value", type=int, default=0, help="列出建议分不高于该值的条目")
+    p_tri.add_argument("--json", action="store_true")
+
+    sub.add_parser("selftest", help="运行内置的回归样例（取自真实回答）")
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "selftest":
+        failures = run_selftest()
+        for msg in failures:
+            print(f"❌ {msg}", file=sys.stderr)
+        if failures:
+            return 1
+        print(f"✅ {len(SELFTEST_CASES)} 个回归样例全部通过")
+        return 0
+
+    if args.cmd == "run":
+        for path in args.inputs:
+            if not os.path.exists(path):
+                print(f"❌ 未找到数据文件：{path}", file=sys.stderr)
+                return 1
+            try:
+                r = precheck_file(path, workers=args.workers, force=args.force)
+            except Exception as e:
+                print(f"❌ {path}: 预检失败：{str(e)}", file=sys.stderr)
+                return 1
+            zeros = "，".join(f"{k} 建议 0 分 {n} 条" for k, n in r["zeros"].items())
+            print(f"✅ {path}: {r['questions']} 道题，预检 {r['checked']} 个回答；{zeros}")
+        return 0
+
+    rows = [dict(file=os.path.basename(path), **row) for path in args.inputs for row in triage_rows(path, args.max_value)]
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return 0
+    for row in rows:
+        label = f"[{row['label']}] " if row["label"] else ""
+        print(f"{row['file']}  {row['q_id']}  {label}{row['response_id']}  {row['key']}={row['value']}  {row['evidence']}")
+    print(f"共 {len(rows)} 条", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,364 @@
+import hashlib
+import json
+from typing import Any, Dict, List
+
+
+# =========================
+# 评分 SCHEMA 定义
+# =========================
+# 各评测配置（profiles.json）通过 "schema" 字段引用这里的基础定义，
+# 再按配置调整一级维度顺序与说明文字。
+
+# 三阶段评测（题型匹配度 → 题目准确性 → 其余维度）
+SCHEMA_STAGED = {
+    "groups": [
+        {
+            "name": "题型匹配度",
+            "desc": "第一阶段：主要考察题目类型是否与用户选择的题型一致，且符合题型格式规范与标准要求。若该阶段任一二级维度得分为 0，则后续维度自动记为 -1。",
+            "need_comment": True,
+            "subdims": [
+                {
+                    "name": "题型与结构规范",
+                    "desc": "题目类型是否与用户要求一致，且题干、设问等信息是否齐全。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "题目类型与用户要求完全不符（例如，要求选择题，生成了填空题），或格式严重错误，题干、选项、设问等关键信息缺失或混乱，无法构成一道完整的题目。",
+                        1: "题目类型与用户要求部分相符（例如，要求单项选择题，生成了多选题），或格式基本完整，但存在明显不规范之处（例如，选择题选项编号错误，非特殊要求下选项非4个；填空题缺少标识；进度条）。",
+                        2: "题目类型与用户要求完全一致，且格式完全规范，题干、设问等元素齐全，排版合理，结构完整。",
+                    },
+                },
+                {
+                    "name": "数量匹配度",
+                    "desc": "题目数量是否与用户要求的一致。",
+                    "options": [0, 2],
+                    "rubric": {
+                        0: "题目数量和用户要求的不一致。",
+                        2: "题目数量和用户要求的完全一致。",
+                    },
+                },
+            ],
+        },
+        {
+            "name": "题目准确性",
+            "desc": "第二阶段：主要考察题目表达是否清晰、指向明确、术语规范，确保学生能理解题意且题目可正常作答。若该阶段任一二级维度得分为 0，则后续第三阶段维度自动记为 -1。",
+            "need_comment": True,
+            "subdims": [
+                {
+                    "name": "表述严谨性",
+                    "desc": "题目用词、语法是否规范，没有语病、错别字，语句通顺流畅。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "语言表达存在严重问题，如大量错别字、严重语病或逻辑混乱，导致题意无法理解。",
+                        1: "语言基本流畅，但存在少量错别字、语病或表述不清晰之处，造成歧义，轻微影响题意理解。",
+                        2: "语言流畅、准确、规范，无错别字和语病，题意清晰明确。",
+                    },
+                },
+                {
+                    "name": "信息充分性",
+                    "desc": "题干提供的已知条件与约束是否足以在目标学段的常规知识范围内建立可解的求解闭环，推导出所需量（允许隐含条件与可推导的中间量；不要求所有中间量必须显式给出）。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "关键条件/变量定义/约束缺失，导致在该学段的常规知识与题干信息下无法形成可执行的求解路径（需要额外外部信息或任意假设才能继续），或题意关键对象/量的含义不明，无法开展计算/推理。",
+                        1: "基本可建立求解思路，但存在必要条件表达不清或约束不完整（例如单位/取值范围/边界条件/对象定义/前提关系模糊），导致求解过程需要补充“合理默认假设”或存在明显歧义；在补充常见约定后通常可继续解题。",
+                        2: "题干信息与约束充分且自洽，关键对象与变量定义清晰，条件链条闭合；仅依赖题干信息与目标学段常规知识即可推导出解题所需量（中间量可由已知推导获得），不存在阻断推理的核心遗漏。",
+                    },
+                },
+                {
+                    "name": "答案确定性",
+                    "desc": "基于上述信息充分性，判断是否有确定的答案。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "题目存在逻辑矛盾导致无解；或者解空间过于发散，存在多个互相冲突但均合理的答案（如单选题有多个正确选项、填空题限制条件不足导致答案不唯一）。",
+                        1: "题目存在预期的最优解，但区分度不够显著。",
+                        2: "题目逻辑收敛，具有唯一确定的标准答案或有限的正确答案集合。",
+                    },
+                },
+            ],
+        },
+        {
+            "name": "知识点匹配度",
+            "desc": "第三阶段：主要衡量模型生成题目是否能够准确识别并体现用户输入的知识点，确保所生成的题目符合用户指定的知识点。",
+            "need_comment": True,
+            "subdims": [
+                {
+                    "name": "知识点满足度",
+                    "desc": "评估题目是否将用户指定的知识点集合（kp_req）作为核心考查内容。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "题目内容完全不包含 kp_req 中的概念、定义或公式。或 kp_req 仅作为无关紧要的装饰性词汇出现，与解题逻辑没有任何关联。",
+                        1: "题目涉及了 kp_req ，但仅作为题目的部分信息、前置铺垫、辅助条件或解题过程中一个简单的中间步骤出现，移除后不影响核心考察意图。",
+                        2: "题目主要考查 kp_req ，是解题的关键路径或核心瓶颈。题目指向该知识点，或者解题过程中主要依赖于该知识点。",
+                    },
+                },
+                {
+                    "name": "核心知识点对齐度",
+                    "desc": "题目核心知识点预测集合（kp_pred）与用户指定集合（kp_req）的语义/层级相关程度。需要忽视 kp_req 在题干中的直接出现，独立评估题目的核心考点；若无法完全判断，可给出大致分数，并在评分理由中写出你认为的核心知识点是什么，数量尽量与最上方要求知识点数量一致，并按优先级排序。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "kp_pred 与 kp_req 的知识体系位置明显不一致，属于不同方向的知识点；知识点路径明显不同。",
+                        1: "kp_pred 与 kp_req 有一定关联或部分对齐，但存在明显偏差：可能只对齐到较泛的上位概念、或只覆盖了部分用户知识点、或题目核心更偏向相邻但不同的知识点；整体对齐不够充分。",
+                        2: "kp_pred 与 kp_req 在体系中高度贴合：多数用户知识点都能在 kp_pred 中找到直接或紧邻的对应，且对应关系合理（同一路径/同一父亲节点知识点），对应相似度大于0.8；说明题目核心考点与用户指定知识点对齐良好。",
+                    },
+                },
+                {
+                    "name": "学段契合度",
+                    "desc": "题目所涉及的知识点是否都符合用户指定的学段范围。",
+                    "options": [0, 2],
+                    "rubric": {
+                        0: "超出用户学段所需掌握的知识范围。",
+                        2: "符合用户学段所掌握的知识范围。",
+                    },
+                },
+            ],
+        },
+        {
+            "name": "解析准确性",
+            "desc": "第三阶段：主要考察解析的正确性、严谨性与详细程度。",
+            "need_comment": True,
+            "subdims": [
+                {
+                    "name": "解析质量",
+                    "desc": "解析内容是否表述清晰、流畅，解析思路严谨，充分展示分析过程和思考路径。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "解析过程混乱，逻辑不清，步骤缺失；或解析过程中存在明显的计算错误、原理引用错误或逻辑推理错误。或存在对题目或答案修正的描述。",
+                        1: "解析过程基本完整，但逻辑跳跃，关键步骤解释不足；或解析过程大体正确，但存在个别计算疏忽、笔误或不够严谨的推理。",
+                        2: "解析过程步骤清晰，逻辑连贯，重点突出；且每一步计算、推理和原理引用都准确无误，逻辑严谨。",
+                    },
+                },
+                {
+                    "name": "独立求解一致性",
+                    "desc": "验证“仅基于题目独立求解得到的答案”与“出题模型给出的参考答案”是否一致/等价。只比较最终答案，允许等价形式（分数/小数等价、单位换算、表达式等价、同一选项的等价表述）。",
+                    "options": [0, 2],
+                    "rubric": {
+                        0: "两者不一致，且无法合理解释为等价答案。",
+                        2: "两者一致或可证明等价（含单位换算/表达式等价/数值容差内一致/选项一致）。",
+                    },
+                },
+            ],
+        },
+        {
+            "name": "素养导向性",
+            "desc": "第三阶段：主要考察生成题目是否设置具体情景（文化生活/学科应用等）并服务于解题，体现素养导向。",
+            "need_comment": True,
+            "subdims": [
+                {
+                    "name": "情景真实性与关联性",
+                    "desc": "设计的情景是否与生活实际、社会热点和科学发展前沿相关，并且能够与知识点相联系。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "题目没有情景设计，仅有抽象化知识点运用。",
+                        1: "题目情景与现实有一定关联，但较为牵强或模式化，缺乏新意。",
+                        2: "题目情景设计巧妙，与生活实际、社会热点或科学前沿紧密联系，真实可信，能激发学生兴趣。",
+                    },
+                },
+                {
+                    "name": "学科融合与应用",
+                    "desc": "是否融合了两门以上的学科知识与方法，且主要考察内容与用户指定学科一致。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "题目仅考察单一学科的孤立知识点，没有体现学科间的联系。考察核心不符合用户指定学科。",
+                        1: "题目尝试进行学科融合，但融合方式较为生硬，或只是简单地将不同学科概念并列，没有体现深度应用。",
+                        2: "题目自然地融合了多学科知识与方法来解决一个综合性问题，且考察的核心仍符合用户指定学科，体现了知识的综合应用能力。",
+                    },
+                },
+                {
+                    "name": "高阶素养培养",
+                    "desc": "是否引导学生进行质疑、反思和评价；是否要求学生通过分析、建模、推理等方式解决问题。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "题目仅考察对知识的简单记忆和复述，不涉及复杂分析、推理等高阶思维能力。",
+                        1: "题目要求学生进行简单的分析或应用，但引导性不足，未能有效激发深度思考、质疑或反思。",
+                        2: "题目能有效引导学生运用分析、建模、推理、评价等高阶思维方式解决复杂问题，或对问题进行开放性探究和批判性反思。",
+                    },
+                },
+            ],
+        },
+        {
+            "name": "约束满足",
+            "desc": "主要考察模型输出是否满足用户指令与系统要求的约束（如题型格式、选项数量、必须包含答案/解析等）。",
+            "need_comment": True,
+            "subdims": [
+                {
+                    "name": "约束满足度",
+                    "desc": "输出是否整体满足约束要求（格式/要素/限制条件等）。",
+                    "options": [0, 1, 2],
+                    "rubric": {
+                        0: "多项关键约束未满足（结构/要素缺失或明显违背要求）。",
+                        1: "大部分约束满足，但存在1~2处不符合或遗漏。",
+                        2: "约束满足完整，无明显违背或遗漏。",
+                    },
+                },
+            ],
+        },
+    ],
+    "rank": {
+        "name": "模型回答质量排名",
+        "desc": "第1名/第2名/第3名（每个模型各自选择一个名次）。若前序阶段被判定终止，则排名自动记为 -1。",
+        "options": ["未评分", "1", "2", "3"],
+    },
+}
+
+
+# 早期版本（知识点匹配度在前，无阶段控制）
+SCHEMA_AP2 = {
+    "groups": [
+        {
+            "name": "知识点匹配度",
+            "desc": "主要衡量模型生成题目是否能够准确识别并体现用户输入的知识点，确保所生成的题目符合用户指定的知识点。",
+            "need_comment": True,
+            "subdims": [
+                {"name": "知识点满足度", "desc": "评估题目是否将用户指定的知识点集合（kp_req）作为核心考查内容。",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "题目内容完全不包含 kp_req 中的概念、定义或公式。或仅作为装饰词，与解题无关。",
+                            1: "题目涉及了 kp_req ，但仅作为题目的部分信息，移除后不影响解题",
+                            2: "题目主要考查 kp_req ，是解题的关键路径或核心瓶颈。"}},
+                {"name": "核心知识点对齐度",
+                 "desc": "题目核心知识点预测集合（kp_pred）与用户指定集合（kp_req）的语义/层级相关程度。",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "kp_pred 与 kp_req 属于不同类型的知识点。",
+                            1: "kp_pred 与 kp_req 有一定关联或部分对齐。",
+                            2: "kp_pred 与 kp_req 相对应程度较高，对齐良好。"}},
+                {"name": "学段契合度", "desc": "题目所涉及的知识点是否都符合用户指定的学段范围。",
+                 "options": [0, 2],
+                 "rubric": {0: "明显超纲/学段不匹配", 2: "学段完全匹配"}},
+            ],
+        },
+        {
+            "name": "题型匹配度",
+            "desc": "主要考察题目类型是否与用户选择的题型一致，且符合题型格式规范与标准要求。",
+            "need_comment": True,
+            "subdims": [
+                {"name": "题型与结构规范", "desc": "题目类型是否与用户要求一致，且题干、设问等信息是否齐全",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "题目类型与用户要求完全不符，或格式严重错误，关键信息缺失/混乱，无法构成完整题目",
+                            1: "题型部分相符或格式基本完整但存在明显不规范之处（如选项数量/编号错误、填空无明显空等）",
+                            2: "题型与用户要求完全一致，格式规范，结构完整，题干/设问等要素齐全"}},
+                {"name": "数量匹配度", "desc": "生成题目数量是否与用户要求一致（如要求1题/多题）",
+                 "options": [0, 2],
+                 "rubric": {0: "数量不匹配", 2: "数量完全匹配"}},
+            ],
+        },
+        {
+            "name": "题目准确性",
+            "desc": "主要考察题目表达是否清晰、指向明确、术语规范，确保学生能理解题意且题目可正常作答。",
+            "need_comment": True,
+            "subdims": [
+                {"name": "表述严谨性", "desc": "题目用词、语法是否规范，没有语病、错别字，语句通顺流畅。",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "表达混乱/大量错误/歧义严重。",
+                            1: "语言基本流畅，但存在少量错别字、语病或表述不清晰之处，轻微影响题意理解。",
+                            2: "表述严谨清晰、符号术语规范，题意清晰明确。"}},
+                {"name": "信息充分性",
+                 "desc": "题干提供的已知条件与约束是否足以在目标学段的常规知识范围内建立可解的求解闭环。",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "关键条件/变量定义/约束缺失，导致无法正常解题。",
+                            1: "基本可建立求解思路，但存在必要条件表达不清或约束不完整，存在较为明显歧义。",
+                            2: "题干信息与约束充分且自洽，关键对象与变量定义清晰，条件链条闭合，能完成正确解题。"}},
+                {"name": "答案确定性", "desc": "评估在信息完备的前提下，题目是否存在客观、唯一的正确答案。",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "题目存在逻辑矛盾导致无解；或者解空间过于发散，存在多个互相冲突但均合理的答案。",
+                            1: "题目存在预期的最优解，但区分度不够显著。",
+                            2: "题目逻辑收敛，具有唯一确定的标准答案或有限的正确答案集合。"}},
+            ],
+        },
+        {
+            "name": "解析准确性",
+            "desc": "主要考察解析的正确性、严谨性与详细程度，且解析内容与目标学段相适配。",
+            "need_comment": True,
+            "subdims": [
+                {"name": "解析质量", "desc": "解析是否清晰、流畅、思路严谨，充分展示分析过程和思考路径",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "解析混乱/关键步骤缺失/明显错误；或在解析中存在对题目答案的修正描述。",
+                            1: "基本正确但较简略或有跳步/不够严谨",
+                            2: "思路清晰、推导严谨、步骤完整"}},
+                {"name": "独立求解一致性",
+                 "desc": "验证“仅基于题目独立求解得到的答案”与“出题模型给出的参考答案”是否一致/等价。",
+                 "options": [0, 2],
+                 "rubric": {0: "两者不一致，且无法合理解释为等价答案。",
+                            2: "两者一致或可证明等价（含单位换算/表达式等价/数值容差内一致/选项一致）。"}},
+                {"name": "学段适配性", "desc": "解析过程所用的词语和方式是否符合该学段学生的认知",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "知识、方法或语言风格完全不符合指定学段认知水平。或存在对题目或答案修正的描述。",
+                            1: "方法基本符合但表达过于专业/晦涩，不利于理解。",
+                            2: "知识、方法和表述贴合学段认知，易于理解学习。"}},
+            ],
+        },
+        {
+            "name": "素养导向性",
+            "desc": "主要考察生成题目是否设置具体情景（文化生活/学科应用等）并服务于解题，体现素养导向。",
+            "need_comment": True,
+            "subdims": [
+                {"name": "情景真实性与关联性", "desc": "情景是否与生活实际、社会热点和科学发展前沿相关",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "无情景或情景与解题无关",
+                            1: "与现实有一定关联但牵强/模式化，缺乏新意",
+                            2: "情景真实可信，与现实/热点/前沿紧密联系，能激发兴趣"}},
+                {"name": "学科融合与应用", "desc": "是否体现应用/跨情境（可选跨学科），且不偏离用户指定学科与考点",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "题目仅考察单一学科的孤立知识点。",
+                            1: "题目尝试进行学科融合，但融合方式较为生硬。",
+                            2: "应用/融合自然，且聚焦目标学科与知识点"}},
+                {"name": "高阶素养培养", "desc": "是否引导学生质疑、反思、评价；是否要求通过分析、建模、推理等方式解决问题",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "仅考察简单记忆/复述，几乎不体现高阶能力",
+                            1: "有一定分析或应用，但深度一般",
+                            2: "高阶素养导向明确，促进分析、建模、推理、评价等高阶思维"}},
+            ],
+        },
+        {
+            "name": "约束满足",
+            "desc": "主要考察模型输出是否满足用户指令与系统要求的约束（如题型格式、选项数量、必须包含答案/解析等）。",
+            "need_comment": True,
+            "subdims": [
+                {"name": "约束满足度", "desc": "输出是否整体满足约束要求（格式/要素/限制条件等）",
+                 "options": [0, 1, 2],
+                 "rubric": {0: "多项关键约束未满足（结构/要素缺失或明显违背要求）",
+                            1: "大部分约束满足，但存在1~2处不符合或遗漏",
+                            2: "约束满足完整，无明显违背或遗漏"}},
+            ],
+        },
+    ],
+    "rank": {
+        "name": "模型回答质量排名",
+        "desc": "第1名/第2名/第3名（每个模型各自选择一个名次）",
+        "options": ["未评分", "1", "2", "3"],
+    },
+}
+
+
+SCHEMAS = {
+    "staged": SCHEMA_STAGED,
+    "ap2": SCHEMA_AP2,
+}
+
+
+# =========================
+# SCHEMA 指纹
+# =========================
+# 每条教师标注记录产生它的 SCHEMA 指纹：annotations[teacher_id]["schema_fp"]。
+# 读取方只需比较一个字符串即可判断评分 key / 选项 / 阶段规则是否兼容，无需逐字段检查
+SCHEMA_FP_FIELD = "schema_fp"
+SCHEMA_FP_LENGTH = 12
+
+
+def schema_fingerprint(groups: List[Dict[str, Any]], rank: Dict[str, Any], stage_rule: str, stages: List[Dict[str, Any]]) -> str:
+    # 只取决定存储格式与 -1 判定的部分：维度名、二级维度名与选项、排名选项、阶段规则。
+    # 说明文字、评分细则、维度显示顺序不影响已有评分，修改后指纹不变
+    canon = {
+        "groups": sorted(
+            [g["name"], sorted([sub["name"], sorted(sub.get("options", [0, 1, 2]))] for sub in g["subdims"])]
+            for g in groups
+        ),
+        "rank": [rank["name"], list(rank.get("options") or [])],
+        "stage_rule": stage_rule,
+        "stages": [[stage["group"], sorted(stage.get("skip_groups") or [])] for stage in stages],
+    }
+    raw = json.dumps(canon, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:SCHEMA_FP_LENGTH]
+
+
+def annotation_fingerprint(t_ann: Any) -> str:
+    # 旧数据没有指纹时返回空字符串（视为未知，不按不兼容处理）
+    fp = t_ann.get(SCHEMA_FP_FIELD) if isinstance(t_ann, dict) else None
+    return fp if isinstance(fp, str) else ""
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from engine import (
+    SCORE_ENCODINGS,
+    get_schema,
+    recode_message_scores,
+    subdim_expected,
+    use_profile,
+)
+from jsonl_io import compression_of, open_text
+from merge_annotations import iter_jsonl
+
+
+# =========================
+# 批量转换存储形式
+# =========================
+def recode_file(path: str, encoding: str, out_path: Optional[str] = None) -> Dict[str, Any]:
+    # 逐行流式转换，先写临时文件再原子替换
+    out_path = out_path or path
+    tmp = out_path + ".tmp"
+    records = 0
+    changed = 0
+    with open_text(tmp, "w", compression=compression_of(out_path)) as f:
+        for item in iter_jsonl(path):
+            changed += recode_message_scores(item, encoding)
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            records += 1
+
+    size_before = os.path.getsize(path)
+    os.replace(tmp, out_path)
+    return {
+        "records": records,
+        "changed": changed,
+        "bytes_before": size_before,
+        "bytes_after": os.path.getsize(out_path),
+    }
+
+
+# =========================
+# 数组化期望分计算
+# =========================
+def subdim_columns() -> List[Tuple[str, List[float]]]:
+    return [
+        (f"{g['name']}_{sub['name']}_score", sorted(float(o) for o in sub.get("options", [0, 1, 2])))
+        for g in get_schema()["groups"]
+        for sub in g["subdims"]
+    ]
+
+
+def expected_matrix(items: List[Dict[str, Any]], teacher_id: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+    # 每行对应 (题目, 教师, 回答)，每列一个二级维度；缺失为 NaN，跳过为 -1。
+    # 各列先收集为 [行数, 选项数] 的概率矩阵，期望分即矩阵与选项向量的乘积
+    columns = subdim_columns()
+    rows: List[Dict[str, Any]] = []
+    for item in items:
+        for tid, t_ann in (item.get("annotations") or {}).items():
+            if teacher_id and tid != teacher_id:
+                continue
+            rows.extend((t_ann.get("scores") or {}).values())
+
+    out = np.full((len(rows), len(columns)), np.nan)
+    for j, (key, opts) in enumerate(columns):
+        keys = [str(int(o)) if o.is_integer() else str(o) for o in opts]
+        prob_idx, prob_rows = [], []
+        val_idx, vals = [], []
+        for i, ms in enumerate(rows):
+            v = ms.get(key)
+            if v is None or v == "":
+                continue
+            if isinstance(v, dict):
+                prob_idx.append(i)
+                prob_rows.append([v.get(k, 0.0) for k in keys])
+            elif isinstance(v, list):
+                if len(v) == len(opts):
+                    prob_idx.append(i)
+                    prob_rows.append(v)
+            else:
+                ev = -1.0 if v == -1 or v == "-1" else subdim_expected(v, opts)
+                if ev is not None:
+                    val_idx.append(i)
+                    vals.append(ev)
+        if prob_idx:
+            out[prob_idx, j] = np.asarray(prob_rows, dtype=float) @ np.asarray(opts)
+        if val_idx:
+            out[val_idx, j] = vals
+    return [key for key, _ in columns], out
+
+
+def subdim_means(items: List[Dict[str, Any]], teacher_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    names, mat = expected_matrix(items, teacher_id)
+    valid = ~np.isnan(mat) & (mat >= 0)
+    counts = valid.sum(axis=0)
+    sums = np.where(valid, mat, 0.0).sum(axis=0)
+    return {
+        name: {"n": int(n), "mean": round(float(s / n), 4) if n else None}
+        for name, n, s in zip(names, counts, sums)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="二级维度分数存储形式转换与数组化统计。")
+    parser.add_argument("--profile", default=None, help="评测配置名称（profiles.json，默认使用其默认配置）")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_rec = sub.add_parser("recode", help="转换数据文件中的分数存储形式（原地改写）")
+    p_rec.add_argument("inputs", nargs="+")
+    p_rec.add_argument("--encoding", choices=SCORE_ENCODINGS, required=True)
+
+    p_stats = sub.add_parser("stats", help="统计各二级维度的平均期望分")
+    p_stats.add_argument("inputs", nargs="+")
+    p_stats.add_argument("--teacher-id", default=None)
+    p_stats.add_argument("--json", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    with use_profile(args.profile):
+        if args.cmd == "recode":
+            for path in args.inputs:
+                r = recode_file(path, args.encoding)
+                ratio = r["bytes_after"] / r["bytes_before"] if r["bytes_before"] else 1.0
+                print(
+                    f"✅ {path}: {r['records']} 条，转换 {r['changed']} 个分数，"
+                    f"{r['bytes_before'] / 1024:.0f} KB → {r['bytes_after'] / 1024:.0f} KB（{ratio:.0%}）"
+                )
+            return 0
+
+        items = [item for path in args.inputs for item in iter_jsonl(path)]
+        stats = subdim_means(items, args.teacher_id.upper() if args.teacher_id else None)
+
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return 0
+    for name, r in stats.items():
+        mean = f"{r['mean']:.3f}" if r["mean"] is not None else "-"
+        print(f"{name:<40}{r['n']:>8}{mean:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
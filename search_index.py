@@ -0,0 +1,231 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# =========================
+# 全局配置
+# =========================
+# 可检索字段：题目 ID、user_req 的四个字段 + 全部模型回答文本
+SEARCH_FIELDS = ["q_id", "query", "type", "knowledge", "constraint", "text"]
+USER_REQ_FIELDS = ["query", "type", "knowledge", "constraint"]
+
+# 检索词可加字段前缀，如 type:单选题、知识点:氨气
+FIELD_ALIASES = {
+    "id": "q_id",
+    "q_id": "q_id",
+    "题号": "q_id",
+    "query": "query",
+    "需求": "query",
+    "type": "type",
+    "题型": "type",
+    "knowledge": "knowledge",
+    "知识点": "knowledge",
+    "constraint": "constraint",
+    "约束": "constraint",
+    "text": "text",
+    "回答": "text",
+}
+
+# 中文按字符二元组切分；检索词长于二元组时先求倒排交集，再对候选做子串确认。
+# 二元组按 (前一字符 << 21 | 后一字符) 编码，再与题目下标拼成一个 uint64 排序去重；
+# 每段文本末尾补 \x00，保证每个字符都是某个二元组的首字符，单字检索也能直接查倒排
+NGRAM = 2
+CP_BITS = np.uint64(21)
+DOC_BITS = np.uint64(22)
+DOC_MASK = np.uint64((1 << 22) - 1)
+# 每批处理的字符数上限，控制构建时的峰值内存
+CHUNK_CHARS = 1 << 22
+RESULT_CACHE_SIZE = 64
+
+TERM_RE = re.compile(r"(?:(\S+?)[:：])?(\S+)")
+
+
+# =========================
+# 切分
+# =========================
+def field_texts(item: Dict[str, Any]) -> Dict[str, str]:
+    req = item.get("user_req") or {}
+    out = {"q_id": str(item.get("q_id") or "")}
+    out.update({f: str(req.get(f) or "") for f in USER_REQ_FIELDS})
+    out["text"] = "\n".join(r.get("text", "") or "" for r in (item.get("responses") or []))
+    return out
+
+
+def gram_codes(s: str) -> np.ndarray:
+    # 字符串的全部二元组编码（未去重）
+    cp = np.frombuffer(s.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    return (cp[:-1] << CP_BITS) | cp[1:]
+
+
+def content_signature(data: List[Dict[str, Any]]) -> int:
+    # 仅覆盖被索引的内容；保存评分只改 annotations，签名不变，索引可直接复用
+    return hash(tuple(
+        (
+            item.get("q_id", ""),
+            tuple(str((item.get("user_req") or {}).get(f) or "") for f in USER_REQ_FIELDS),
+            tuple(r.get("text", "") for r in (item.get("responses") or [])),
+        )
+        for item in data
+    ))
+
+
+# =========================
+# 构建
+# =========================
+def _chunk_keys(texts: List[str], base: int) -> np.ndarray:
+    # 一批题目的 (二元组, 题目下标) 键，已排序去重；每段文本以 \x00 结尾，不产生跨题的二元组。
+    # 先逐段转小写再计长度：部分字符小写后变长（如 İ → i̇），否则之后的二元组会错位到别的题目
+    texts = [t.lower() for t in texts]
+    cp = np.frombuffer(("\x00".join(texts) + "\x00").encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    lens = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    doc = np.repeat(np.arange(base, base + len(texts), dtype=np.uint64), lens + 1)[:len(cp) - 1]
+    a, b = cp[:-1], cp[1:]
+    keys = (((a << CP_BITS) | b) << DOC_BITS | doc)[a != 0]
+    return _dedupe_sorted(np.sort(keys))
+
+
+def _dedupe_sorted(a: np.ndarray) -> np.ndarray:
+    if len(a) < 2:
+        return a
+    keep = np.empty(len(a), dtype=bool)
+    keep[0] = True
+    np.not_equal(a[1:], a[:-1], out=keep[1:])
+    return a[keep]
+
+
+def build_postings(texts: List[str]) -> Dict[str, Any]:
+    # 倒排表以 CSR 形式存放：grams 为升序的二元组编码，postings[indptr[g]:indptr[g + 1]] 为升序的题目下标
+    parts = []
+    start = size = 0
+    for i, t in enumerate(texts):
+        size += len(t) + 1
+        if size >= CHUNK_CHARS:
+            parts.append(_chunk_keys(texts[start:i + 1], start))
+            start, size = i + 1, 0
+    if start < len(texts):
+        parts.append(_chunk_keys(texts[start:], start))
+
+    keys = np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.uint64)
+    grams = keys >> DOC_BITS
+    postings = (keys & DOC_MASK).astype(np.uint32)
+    if len(grams):
+        first = np.empty(len(grams), dtype=bool)
+        first[0] = True
+        np.not_equal(grams[1:], grams[:-1], out=first[1:])
+        starts = np.flatnonzero(first)
+    else:
+        starts = np.zeros(0, dtype=np.int64)
+    return {
+        "grams": grams[starts],
+        "indptr": np.append(starts, len(grams)),
+        "postings": postings,
+    }
+
+
+def build_index(data: List[Dict[str, Any]], signature: Optional[int] = None) -> Dict[str, Any]:
+    per_field: Dict[str, List[str]] = {f: [] for f in SEARCH_FIELDS}
+    for item in data:
+        for f, t in field_texts(item).items():
+            per_field[f].append(t)
+
+    return {
+        "n": len(data),
+        "qids": [item.get("q_id", f"id_{i}") for i, item in enumerate(data)],
+        "fields": {f: build_postings(texts) for f, texts in per_field.items()},
+        "signature": content_signature(data) if signature is None else signature,
+        "results": {},
+    }
+
+
+# =========================
+# 查询
+# =========================
+def parse_query(query: str) -> List[Tuple[Optional[str], str]]:
+    # 空格分隔的多个词取交集；未知前缀视为检索词的一部分
+    terms = []
+    for m in TERM_RE.finditer(query or ""):
+        prefix, term = m.group(1), m.group(2)
+        field = FIELD_ALIASES.get(prefix.lower()) if prefix else None
+        if prefix and field is None:
+            term = m.group(0)
+        terms.append((field, term.lower()))
+    return terms
+
+
+def _candidates(fp: Dict[str, Any], term: str) -> np.ndarray:
+    # 返回包含检索词全部二元组的题目下标；单字检索词取以该字开头的全部二元组（在 grams 中连续）
+    if len(term) < NGRAM:
+        c = np.uint64(ord(term))
+        lo, hi = np.searchsorted(fp["grams"], [c << CP_BITS, (c + np.uint64(1)) << CP_BITS])
+        return np.unique(fp["postings"][fp["indptr"][lo]:fp["indptr"][hi]])
+    codes = np.unique(gram_codes(term))
+    pos = np.searchsorted(fp["grams"], codes)
+    if (pos >= len(fp["grams"])).any() or (fp["grams"][np.minimum(pos, len(fp["grams"]) - 1)] != codes).any():
+        return np.zeros(0, dtype=np.uint32)
+    arrays = [fp["postings"][fp["indptr"][g]:fp["indptr"][g + 1]] for g in pos]
+    arrays.sort(key=len)
+    cand = arrays[0]
+    for a in arrays[1:]:
+        if not len(cand):
+            break
+        cand = np.intersect1d(cand, a, assume_unique=True)
+    return cand
+
+
+def _field_contains(item: Dict[str, Any], field: str, term: str) -> bool:
+    # 检索词不含大小写字母时无需对原文 lower()，直接在原文上做子串判断
+    uncased = term == term.upper()
+    if field == "q_id":
+        t = str(item.get("q_id") or "")
+        return term in (t if uncased else t.lower())
+    if field == "text":
+        for r in item.get("responses") or []:
+            t = r.get("text", "") or ""
+            if term in (t if uncased else t.lower()):
+                return True
+        return False
+    t = str((item.get("user_req") or {}).get(field) or "")
+    return term in (t if uncased else t.lower())
+
+
+def _match_term(index: Dict[str, Any], data: List[Dict[str, Any]], field: Optional[str], term: str, within: Optional[np.ndarray]) -> np.ndarray:
+    hits = []
+    for f in [field] if field else SEARCH_FIELDS:
+        cand = _candidates(index["fields"][f], term)
+        if within is not None:
+            cand = np.intersect1d(cand, within, assume_unique=True)
+        if len(term) > NGRAM:
+            cand = np.fromiter((i for i in cand if _field_contains(data[i], f, term)), dtype=np.uint32)
+        hits.append(cand)
+    if len(hits) == 1:
+        return hits[0]
+    return np.unique(np.concatenate(hits))
+
+
+def search(index: Dict[str, Any], data: List[Dict[str, Any]], query: str) -> List[int]:
+    # 返回命中题目在 data 中的下标（升序）；data 须与建索引时内容一致
+    terms = parse_query(query)
+    if not terms:
+        return list(range(index["n"]))
+
+    # 同一筛选词在每次重跑时都会查询，按检索词缓存结果（索引本身只读，多个会话共享）
+    key = tuple(terms)
+    cache = index["results"]
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+
+    result: Optional[np.ndarray] = None
+    # 先算最长的词（候选最少），后续词只在已有结果内确认
+    for field, term in sorted(terms, key=lambda x: -len(x[1])):
+        result = _match_term(index, data, field, term, result)
+        if not len(result):
+            break
+
+    out = [int(i) for i in result]
+    if len(cache) >= RESULT_CACHE_SIZE:
+        cache.clear()
+    cache[key] = out
+    return out
@@ -0,0 +1,263 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+from typing import Any, Dict, List, Optional
+
+from engine import (
+    MODEL_LABELS,
+    PROB_STEP,
+    balanced_latin_square,
+    SCORE_ENCODINGS,
+    build_grid,
+    encode_subdim_score,
+    evaluate_stage_status,
+    get_group_by_name,
+    get_schema,
+    latin_square_order,
+    set_group_skipped,
+    set_rank_skipped,
+    use_profile,
+)
+from jsonl_io import COMPRESSION_SUFFIXES, open_text
+
+
+# =========================
+# 全局配置
+# =========================
+# 真实数据中回答长度（字符数）的对数均值/标准差，约合平均 1.2K 字符、中位数 ~800
+TEXT_LEN_LOG_MU = 6.7
+TEXT_LEN_LOG_SIGMA = 0.95
+TEXT_LEN_MIN = 40
+TEXT_LEN_MAX = 12000
+
+MODELS = ["deepseek-v3.2", "gemma-3-27b", "glm-z1-9b", "qwen3-max", "gpt-4.1-mini", "llama3.1-8b"]
+SUBJECTS = {"C": "chemistry", "M": "math", "P": "physics"}
+SUBJECT_NAMES = {"C": "化学", "M": "数学", "P": "物理"}
+QTYPES = ["单选题", "多选题", "填空题", "解答题", "判断题"]
+KNOWLEDGE = ["氨气的检验", "消毒水有关问题", "分数乘除混合运算", "弹簧测力计的使用", "一元二次方程", "浮力", "化学平衡", "函数的单调性"]
+CONSTRAINTS = [
+    "",
+    "临界与切换点设置：将核心量或结论锁定在端点/极值/临界态/条件切换点，迫使进行分类讨论。",
+    "情境真实：以生活实际或科技前沿为背景。",
+    "多步推理：至少需要三步推导才能得到答案。",
+]
+
+SENTENCES = [
+    "已知某溶液中含有一定量的溶质，",
+    "根据题意，设未知量为 $x$，",
+    "由能量守恒可得",
+    "因为绝对值和平方都是非负数，所以必须同时为零，",
+    "将上述结果代入原式，",
+    "实验中用湿润的红色石蕊试纸检验，若变蓝则说明氨气过量。",
+    "综上所述，满足条件的取值范围为",
+    "当弹簧测力计倒置使用时，示数包含了外壳的重力，",
+    "下列说法正确的是",
+]
+FORMULAS = [
+    "$a^2 + b^2 = c^2$",
+    "$$F = k \\Delta x$$",
+    "\\(\\frac{1}{2}mv^2\\)",
+    "$$\\begin{cases} 2x + 3y = 12 \\\\ 5x - y = 13 \\end{cases}$$",
+    "$NH_3 + HCl = NH_4Cl$",
+    "\\[ \\rho g V_{排} \\]",
+]
+COMMENTS = ["整体较好", "题型基本符合要求", "解析略有跳步", "情景设计较为牵强", "答案唯一，表述清晰"]
+
+
+# =========================
+# 文本生成
+# =========================
+def _sample_len(rnd: random.Random) -> int:
+    n = int(math.exp(rnd.gauss(TEXT_LEN_LOG_MU, TEXT_LEN_LOG_SIGMA)))
+    return max(TEXT_LEN_MIN, min(TEXT_LEN_MAX, n))
+
+
+def _filler(rnd: random.Random, n_chars: int) -> str:
+    out = []
+    size = 0
+    while size < n_chars:
+        piece = rnd.choice(FORMULAS) if rnd.random() < 0.25 else rnd.choice(SENTENCES)
+        if rnd.random() < 0.15:
+            piece += "\n"
+        out.append(piece)
+        size += len(piece)
+    return "".join(out)
+
+
+def make_response_text(rnd: random.Random) -> str:
+    total = _sample_len(rnd)
+    q_len = max(20, int(total * 0.35))
+    a_len = max(10, int(total * 0.5))
+    ans = rnd.choice(["A", "B", "C", "D", "$x = 3$"])
+
+    style = rnd.random()
+    if style < 0.7:
+        return f"<题目>\n{_filler(rnd, q_len)}\nA. 选项一\nB. 选项二\nC. 选项三\nD. 选项四\n</题目>\n<解析>\n{_filler(rnd, a_len)}\n</解析>\n<答案>{ans}</答案>"
+    if style < 0.9:
+        return f"【题目】{_filler(rnd, q_len)}\n【解析】{_filler(rnd, a_len)}\n【答案】{ans}"
+    return _filler(rnd, total)
+
+
+# =========================
+# 标注生成
+# =========================
+def _random_scores(
+    rnd: random.Random,
+    rids: List[str],
+    completeness: float,
+    encoding: Optional[str] = None,
+) -> Dict[str, Any]:
+    scores_root: Dict[str, Any] = {}
+    schema = get_schema()
+    rank_name = schema["rank"]["name"]
+    groups = schema["groups"]
+    n_groups = len(groups) if completeness >= 1.0 else rnd.randint(1, len(groups) - 1)
+
+    for rid in rids:
+        ms = scores_root.setdefault(rid, {})
+        for group in groups[:n_groups]:
+            gname = group["name"]
+            sub_means = []
+            for sub in group["subdims"]:
+                opts = sub.get("options", [0, 1, 2])
+                grid = build_grid(float(min(opts)), float(max(opts)), float(PROB_STEP))
+                # 偏向高分，少量 0 分触发阶段跳过
+                mean = 0.0 if rnd.random() < 0.04 else rnd.choice(grid[len(grid) // 3:])
+                ms[f"{gname}_{sub['name']}_score"] = encode_subdim_score(opts, mean, encoding)
+                sub_means.append(mean)
+            ms[f"{gname}_score"] = round(sum(sub_means) / len(sub_means), 2)
+            if group.get("need_comment", False):
+                ms[f"{gname}_comment"] = rnd.choice(COMMENTS)
+
+    ranks = [str(i + 1) for i in range(len(rids))]
+    rnd.shuffle(ranks)
+    for rid, rank in zip(rids, ranks):
+        ms = scores_root[rid]
+        if n_groups == len(groups):
+            ms[f"{rank_name}_score"] = rank
+
+        status = evaluate_stage_status(ms)
+        if status["failed_group"] is not None:
+            for gname in status["skip_groups"]:
+                set_group_skipped(scores_root, rid, get_group_by_name(gname))
+            set_rank_skipped(scores_root, rid)
+    return scores_root
+
+
+def make_message(
+    rnd: random.Random,
+    idx: int,
+    subject_code: str,
+    teacher_id: str,
+    scored_ratio: float,
+    partial_ratio: float,
+    encoding: Optional[str] = None,
+) -> Dict[str, Any]:
+    qid = f"q_{idx + 1:06d}"
+    models = rnd.sample(MODELS, 3)
+    responses = [
+        {"response_id": f"{qid}_{m}", "model_id": m, "text": make_response_text(rnd)}
+        for m in models
+    ]
+    qtype = rnd.choice(QTYPES)
+    knowledge = "，".join(rnd.sample(KNOWLEDGE, rnd.randint(1, 3)))
+    constraint = rnd.choice(CONSTRAINTS)
+    source_qid = f"{subject_code.lower()}{idx:06d}_L{rnd.randint(1, 3)}"
+
+    message = {
+        "q_id": qid,
+        "source_qid": source_qid,
+        "source_qid_base": source_qid.split("_")[0],
+        "user_req": {
+            "query": f"帮我出个题，{SUBJECT_NAMES[subject_code]}，{knowledge}，{qtype}。\n\n{constraint}",
+            "type": qtype,
+            "knowledge": f"（{knowledge}）",
+            "constraint": constraint,
+        },
+        "responses": responses,
+        "annotations": {},
+        "user_designed_question": "",
+        "_meta": {
+            "subject": SUBJECTS[subject_code],
+            "strong_model": models[0],
+            "medium_model": models[1],
+            "weak_model": models[2],
+            "source_qid": source_qid,
+        },
+    }
+
+    r = rnd.random()
+    if r < scored_ratio + partial_ratio:
+        rids = [x["response_id"] for x in responses]
+        order = latin_square_order(rids, balanced_latin_square(3)[idx % 6])
+        message["annotations"][teacher_id] = {
+            "blind_map": {lbl: rid for lbl, rid in zip(MODEL_LABELS, order)},
+            "scores": _random_scores(rnd, rids, 1.0 if r < scored_ratio else 0.5, encoding),
+        }
+    return message
+
+
+def generate_file(
+    path: str,
+    n: int,
+    teacher_id: str,
+    subject_code: str = "C",
+    scored_ratio: float = 0.3,
+    partial_ratio: float = 0.2,
+    seed: int = 0,
+    encoding: Optional[str] = None,
+) -> int:
+    rnd = random.Random(f"{seed}::{teacher_id}")
+    dir_name = os.path.dirname(path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+
+    size = 0
+    with open_text(path, "w") as f:
+        for i in range(n):
+            line = json.dumps(
+                make_message(rnd, i, subject_code, teacher_id, scored_ratio, partial_ratio, encoding),
+                ensure_ascii=False,
+            ) + "\n"
+            f.write(line)
+            size += len(line.encode("utf-8"))
+    return size
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="生成合成的大规模 data_*.jsonl 教师数据文件。")
+    parser.add_argument("-n", "--questions", type=int, default=10000, help="每个文件的题目数")
+    parser.add_argument("-t", "--teachers", nargs="+", default=["S0001"], help="教师编号（每个编号生成一个文件）")
+    parser.add_argument("--subject", choices=sorted(SUBJECTS), default="C", help="学科代码")
+    parser.add_argument("--scored-ratio", type=float, default=0.3, help="已完整评分的题目比例")
+    parser.add_argument("--partial-ratio", type=float, default=0.2, help="部分评分的题目比例")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", default=None, help="评测配置名称（profiles.json，默认使用其默认配置）")
+    parser.add_argument("--encoding", choices=SCORE_ENCODINGS, default=None, help="二级维度分数存储形式（默认取评测配置）")
+    parser.add_argument("--compress", choices=sorted(COMPRESSION_SUFFIXES), default=None, help="直接生成压缩文件（如 .gz）")
+    parser.add_argument("-o", "--out-dir", default="synthetic_data", help="输出目录")
+    args = parser.parse_args(argv)
+
+    for tid in args.teachers:
+        tid = tid.upper()
+        path = os.path.join(args.out_dir, f"data_{tid}.jsonl" + (args.compress or ""))
+        with use_profile(args.profile):
+            size = generate_file(
+                path,
+                args.questions,
+                tid,
+                subject_code=args.subject,
+                scored_ratio=args.scored_ratio,
+                partial_ratio=args.partial_ratio,
+                seed=args.seed,
+                encoding=args.encoding,
+            )
+        print(f"✅ {path}: {args.questions} 道题目，{size / 1024 / 1024:.1f} MB（未压缩）" if args.compress else f"✅ {path}: {args.questions} 道题目，{size / 1024 / 1024:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import argparse
+import functools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from engine import (
+    MODEL_LABELS,
+    describe_fingerprint,
+    get_profile,
+    score_filled,
+    subdim_expected,
+    use_profile,
+)
+from jsonl_io import map_jsonl_chunks
+from merge_annotations import DATA_FILE_GLOB, find_data_files
+from schemas import annotation_fingerprint
+
+
+# =========================
+# 全局配置
+# =========================
+# 问题代码 -> 说明
+ISSUE_CODES = {
+    "invalid_json": "无法解析的 JSON 行",
+    "missing_q_id": "缺少 q_id",
+    "duplicate_q_id": "q_id 在文件内重复",
+    "bad_annotations": "annotations / scores 结构不是对象",
+    "schema_mismatch": "评分来自其他评测配置（SCHEMA 指纹不同，未逐项检查）",
+    "blind_map_bad_label": "blind_map 含未知标签",
+    "blind_map_missing_rid": "blind_map 指向不存在的 response_id",
+    "blind_map_duplicate_rid": "blind_map 中同一回答出现多次",
+    "unknown_response": "scores 中含不存在的 response_id",
+    "bad_score": "二级维度分数无法识别（score_filled 不通过）",
+    "group_score_mismatch": "一级维度总分与二级维度期望分均值不一致",
+    "stage_not_skipped": "阶段判定终止，但后续维度或排名未记为 -1",
+    "unexpected_skip": "阶段未终止，却有维度或排名记为 -1",
+    "duplicate_rank": "未跳过的回答之间排名重复",
+}
+
+GROUP_SCORE_TOL = 0.011
+EMPTY_RANKS = (None, "", "未评分")
+
+
+# =========================
+# 预编译检查
+# =========================
+def compile_validator(profile: Dict[str, Any]) -> Callable[[Dict[str, Any]], List[Tuple[str, str, str, str]]]:
+    # 按评测配置一次性展开全部 key、选项与阶段规则，返回逐题检查函数；
+    # 结果为 (teacher_id, response_id, 问题代码, 详情) 列表
+    schema = profile["schema"]
+    groups = [
+        (
+            g["name"],
+            f"{g['name']}_score",
+            [(f"{g['name']}_{sub['name']}_score", sub.get("options", [0, 1, 2])) for sub in g["subdims"]],
+        )
+        for g in schema["groups"]
+    ]
+    group_by_name = {gname: (gkey, subs) for gname, gkey, subs in groups}
+    rank_key = f"{schema['rank']['name']}_score"
+    stages = profile["compiled_stages"]
+    fingerprint = profile["fingerprint"]
+    labels = set(MODEL_LABELS)
+
+    def check_scores(tid: str, rid: str, ms: Dict[str, Any], issues: list) -> bool:
+        # 返回该回答的排名是否因阶段终止而跳过
+        for gname, gkey, subs in groups:
+            evs = []
+            for key, opts in subs:
+                v = ms.get(key)
+                if v is None or v == "" or v == -1 or v == "-1":
+                    continue
+                if not score_filled(v, opts):
+                    issues.append((tid, rid, "bad_score", f"{key}={json.dumps(v, ensure_ascii=False)}"))
+                    continue
+                evs.append(subdim_expected(v, opts))
+            gv = ms.get(gkey)
+            if evs and len(evs) == len(subs) and isinstance(gv, (int, float)) and gv != -1:
+                mean = sum(evs) / len(evs)
+                if abs(gv - mean) > GROUP_SCORE_TOL:
+                    issues.append((tid, rid, "group_score_mismatch", f"{gkey}={gv}，均值 {mean:.2f}"))
+
+        failed = None
+        for stage in stages:
+            if stage["failed"](ms):
+                failed = stage["status"]
+                break
+
+        skipped = failed["skip_groups"] if failed else ()
+        not_skipped = []
+        for gname in skipped:
+            gkey, subs = group_by_name[gname]
+            if any(ms.get(k) not in (-1, "-1") for k in [gkey] + [k for k, _ in subs]):
+                not_skipped.append(gname)
+        if failed and ms.get(rank_key) not in (-1, "-1"):
+            not_skipped.append("排名")
+        if not_skipped:
+            issues.append((tid, rid, "stage_not_skipped", f"{failed['failed_group']} 终止；{'、'.join(not_skipped)}"))
+
+        extra_skips = [
+            gname
+            for gname, gkey, subs in groups
+            if gname not in skipped
+            and (ms.get(gkey) in (-1, "-1") or any(ms.get(k) in (-1, "-1") for k, _ in subs))
+        ]
+        if not failed and ms.get(rank_key) in (-1, "-1"):
+            extra_skips.append("排名")
+        if extra_skips:
+            issues.append((tid, rid, "unexpected_skip", "、".join(extra_skips)))
+        return failed is not None
+
+    def validate_message(item: Dict[str, Any]) -> List[Tuple[str, str, str, str]]:
+        issues: List[Tuple[str, str, str, str]] = []
+        rids = {r.get("response_id") for r in (item.get("responses") or []) if r.get("response_id")}
+
+        annotations = item.get("annotations") or {}
+        if not isinstance(annotations, dict):
+            return [("", "", "bad_annotations", "annotations")]
+
+        for tid, t_ann in annotations.items():
+            if not isinstance(t_ann, dict):
+                issues.append((tid, "", "bad_annotations", "annotations[teacher]"))
+                continue
+
+            blind_map = t_ann.get("blind_map") or {}
+            seen = set()
+            for lbl, rid in blind_map.items():
+                if lbl not in labels:
+                    issues.append((tid, "", "blind_map_bad_label", lbl))
+                if rid is None:
+                    continue
+                if rid not in rids:
+                    issues.append((tid, str(rid), "blind_map_missing_rid", f"{lbl} → {rid}"))
+                elif rid in seen:
+                    issues.append((tid, rid, "blind_map_duplicate_rid", lbl))
+                seen.add(rid)
+
+            # 指纹不同的评分按其他配置的 key 与阶段规则写入，逐项检查只会得到大量误报
+            fp = annotation_fingerprint(t_ann)
+            if fp and fp != fingerprint:
+                issues.append((tid, "", "schema_mismatch", describe_fingerprint(fp)))
+                continue
+
+            scores = t_ann.get("scores") or {}
+            if not isinstance(scores, dict):
+                issues.append((tid, "", "bad_annotations", "scores"))
+                continue
+
+            ranks: Dict[Any, List[str]] = {}
+            for rid, ms in scores.items():
+                if rid not in rids:
+                    issues.append((tid, rid, "unknown_response", ""))
+                    continue
+                if not isinstance(ms, dict):
+                    issues.append((tid, rid, "bad_annotations", f"scores[{rid}]"))
+                    continue
+                rank_skipped = check_scores(tid, rid, ms, issues)
+                rank = ms.get(rank_key)
+                if not rank_skipped and rank not in EMPTY_RANKS and rank not in (-1, "-1"):
+                    ranks.setdefault(str(rank), []).append(rid)
+
+            for rank, dup in ranks.items():
+                if len(dup) > 1:
+                    issues.append((tid, "、".join(dup), "duplicate_rank", f"排名 {rank}"))
+        return issues
+
+    return validate_message
+
+
+# =========================
+# 流式校验
+# =========================
+def validate_chunk(profile_name: Optional[str], items: List[Dict[str, Any]], linenos: List[int]) -> Dict[str, Any]:
+    # 在子进程内校验一块题目，只回传问题、q_id 与各 SCHEMA 指纹的评分数（行号为块内行号）；
+    # 跨块的 q_id 重复由调用方统一判断
+    with use_profile(profile_name) as profile:
+        validate_message = compile_validator(profile)
+        qids: List[Tuple[int, str]] = []
+        rows: List[Tuple[int, str, str, str, str, str]] = []
+        schemas: Dict[str, int] = {}
+        for lineno, item in zip(linenos, items):
+            annotations = item.get("annotations")
+            if isinstance(annotations, dict):
+                for t_ann in annotations.values():
+                    fp = annotation_fingerprint(t_ann)
+                    schemas[fp] = schemas.get(fp, 0) + 1
+            qid = item.get("q_id")
+            if not qid:
+                rows.append((lineno, "", "", "", "missing_q_id", ""))
+            else:
+                qids.append((lineno, qid))
+            for tid, rid, code, detail in validate_message(item):
+                rows.append((lineno, qid or "", tid, rid, code, detail))
+    return {"records": len(items), "qids": qids, "rows": rows, "schemas": schemas}
+
+
+def validate_file(path: str, profile_name: Optional[str] = None, workers: Optional[int] = None) -> Dict[str, Any]:
+    # 大文件按字节区间分块，由进程池并行解析与校验（见 jsonl_io.map_jsonl_chunks）
+    with use_profile(profile_name) as profile:
+        records = 0
+        rows: List[Dict[str, Any]] = []
+        seen_qids: Dict[str, int] = {}
+        schemas: Dict[str, int] = {}
+
+        def add(lineno, qid, tid, rid, code, detail):
+            rows.append({
+                "line": lineno,
+                "q_id": qid,
+                "teacher_id": tid,
+                "response_id": rid,
+                "code": code,
+                "detail": detail,
+            })
+
+        fn = functools.partial(validate_chunk, profile["name"])
+        for result, bad, line_base in map_jsonl_chunks(path, fn, workers=workers):
+            records += result["records"] + len(bad)
+            for fp, n in result["schemas"].items():
+                schemas[fp] = schemas.get(fp, 0) + n
+            chunk_rows = [
+                (row["line"], "", "", "", "missing_q_id", "") if row["not_object"] else (row["line"], "", "", "", "invalid_json", row["error"])
+                for row in bad
+            ]
+            for lineno, qid in result["qids"]:
+                lineno += line_base
+                if qid in seen_qids:
+                    chunk_rows.append((lineno, qid, "", "", "duplicate_q_id", f"首次出现于第 {seen_qids[qid]} 行"))
+                else:
+                    seen_qids[qid] = lineno
+            for lineno, *rest in result["rows"]:
+                chunk_rows.append((lineno + line_base, *rest))
+            # 同一行内：格式问题（坏行 / q_id）在前，逐题问题在后
+            for row in sorted(chunk_rows, key=lambda r: r[0]):
+                add(*row)
+
+    return {
+        "file": path,
+        "profile": profile["name"],
+        "fingerprint": profile["fingerprint"],
+        "records": records,
+        # SCHEMA 指纹 -> 教师评分数（"" 为没有指纹的旧数据）
+        "schemas": schemas,
+        "issues": rows,
+    }
+
+
+def _validate_job(args):
+    return validate_file(*args)
+
+
+def validate_files(paths: List[str], profile_name: Optional[str] = None, workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    # 文件之间相互独立，多个文件时按文件分发到进程池（文件内不再分块并行）；单个文件时在文件内分块并行
+    if len(paths) <= 1:
+        return [validate_file(p, profile_name, workers) for p in paths]
+    jobs = [(p, profile_name, 1) for p in paths]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [_validate_job(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_validate_job, jobs))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="校验标注数据文件的结构一致性，按文件与题目输出问题清单。")
+    parser.add_argument("inputs", nargs="*", help=f"输入文件（默认：当前目录下的 {DATA_FILE_GLOB}，含 .gz / .zst 压缩文件）")
+    parser.add_argument("--profile", default=None, help="评测配置名称（profiles.json，默认使用其默认配置）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程数（默认：多个文件按 CPU 核数分发；单个大文件按 CPU 核数分块并行；1 为单进程）")
+    parser.add_argument("--max-rows", type=int, default=50, help="每个文件最多列出的问题条数（0 为不限）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出完整报告")
+    args = parser.parse_args(argv)
+
+    paths = args.inputs or find_data_files()
+    if not paths:
+        print("❌ 未找到任何数据文件。", file=sys.stderr)
+        return 1
+    try:
+        get_profile(args.profile)
+    except Exception as e:
+        print(f"❌ 加载评测配置失败：{str(e)}", file=sys.stderr)
+        return 1
+
+    reports = validate_files(paths, args.profile, args.workers)
+    failed = any(r["issues"] for r in reports)
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return 1 if failed else 0
+
+    for r in reports:
+        issues = r["issues"]
+        name = os.path.basename(r["file"])
+        stamped = {fp: n for fp, n in r["schemas"].items() if fp}
+        if len(stamped) > 1 or any(fp != r["fingerprint"] for fp in stamped):
+            mix = "，".join(f"{describe_fingerprint(fp) if fp else '无指纹'} {n}" for fp, n in sorted(r["schemas"].items(), key=lambda x: -x[1]))
+            print(f"⚠️ {name}: 含其他评测配置的评分（SCHEMA 指纹 {mix}）；当前配置 {describe_fingerprint(r['fingerprint'])}")
+        if not issues:
+            print(f"✅ {name}: {r['records']} 条，未发现问题")
+            continue
+
+        n_qids = len({row["q_id"] for row in issues})
+        counts: Dict[str, int] = {}
+        for row in issues:
+            counts[row["code"]] = counts.get(row["code"], 0) + 1
+        summary = "，".join(f"{code} {n}" for code, n in sorted(counts.items(), key=lambda x: -x[1]))
+        print(f"❌ {name}: {r['records']} 条，{n_qids} 道题共 {len(issues)} 个问题（{summary}）")
+
+        shown = issues if args.max_rows <= 0 else issues[:args.max_rows]
+        for row in shown:
+            who = "/".join(x for x in [row["teacher_id"], row["response_id"]] if x)
+            detail = f"  {row['detail']}" if row["detail"] else ""
+            print(f"   L{row['line']:<6} {row['q_id']:<16} {who:<36} {ISSUE_CODES[row['code']]}{detail}")
+        if len(shown) < len(issues):
+            print(f"   … 其余 {len(issues) - len(shown)} 条略（--max-rows 0 或 --json 查看全部）")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())